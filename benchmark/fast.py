@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""App.__call__ with the webob Request and Response against App(fast=True),
+for a handler returning a string, one reading a query param and one returning
+json.
+
+python benchmark/fast.py
+"""
+
+import timeit
+
+from webob import Request
+
+from solo.web.app import App
+from solo.web.util import jsonify
+
+
+class HelloRoot(object):
+
+    def index(self):
+        return "Hello World!"
+
+    def page(self, page='1'):
+        return page
+
+    @jsonify
+    def json(self):
+        return {'hello': 'world'}
+
+
+def make_app(fast):
+    app = App(fast=fast)
+    ctl = HelloRoot()
+    route = app.route()
+    route.connect('index', '/', controller=ctl, action='index')
+    route.connect('page', '/page', controller=ctl, action='page')
+    route.connect('json', '/json', controller=ctl, action='json')
+    return app
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def main():
+    number = 5000
+    print '%10s %14s %14s' % ('path', 'webob(us)', 'fast(us)')
+    for path in ('/', '/page?page=2', '/json'):
+        environ = Request.blank(path).environ
+        row = []
+        for fast in (False, True):
+            app = make_app(fast)
+            call = lambda: app(environ.copy(), start_response)
+            call()
+            row.append(min(timeit.repeat(call, number=number, repeat=5)) / number * 1e6)
+        print '%10s %14.2f %14.2f' % ((path, ) + tuple(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""App.__call__ overhead with 0, 1 and 10 hooks, HookMap.run against the
+frozen hook chains.
+
+python benchmark/hooks.py
+"""
+
+import timeit
+from functools import partial
+
+from webob import Request
+
+from solo.web.app import App
+
+
+class HelloRoot(object):
+
+    def index(self):
+        return "Hello World!"
+
+
+class HelloApp(App):
+
+    def initialize(self):
+        self.route().connect('index', '/', controller=HelloRoot(), action='index')
+
+
+class UnfrozenApp(HelloApp):
+
+    def freeze(self):
+        # run every point through HookMap.run as before
+        self.chains = dict((point, partial(self.hooks.run, point)) for point in self.hookpoints)
+
+
+def hook():
+    pass
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def main():
+    environ = Request.blank('/').environ
+    number = 5000
+    print '%6s %14s %14s' % ('hooks', 'run(us)', 'frozen(us)')
+    for count in (0, 1, 10):
+        row = []
+        for cls in (UnfrozenApp, HelloApp):
+            app = cls()
+            for i in range(count):
+                app.attach('before_handler', hook)
+            call = lambda: app(environ.copy(), start_response)
+            call()
+            row.append(min(timeit.repeat(call, number=number, repeat=5)) / number * 1e6)
+        print '%6d %14.2f %14.2f' % ((count, ) + tuple(row))
+
+    # the hook dispatch alone: every hookpoint of one request
+    print
+    print '%6s %14s %14s' % ('hooks', 'run(us)', 'frozen(us)')
+    number = 100000
+    for count in (0, 1, 10):
+        app = HelloApp()
+        for i in range(count):
+            app.attach('before_handler', hook)
+        app.freeze()
+        points = app.hookpoints
+        chains = [app.chains[point] for point in points]
+        run = app.hooks.run
+
+        def unfrozen():
+            for point in points:
+                run(point)
+
+        def frozen():
+            for chain in chains:
+                chain()
+
+        row = [min(timeit.repeat(f, number=number, repeat=5)) / number * 1e6 for f in (unfrozen, frozen)]
+        print '%6d %14.2f %14.2f' % ((count, ) + tuple(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""App.__call__ without and with metrics, with no hooks and with a
+before_handler hook, then the cost of one counter, gauge and histogram sample.
+
+python benchmark/metrics.py
+"""
+
+import timeit
+from functools import partial
+
+from webob import Request
+
+from solo.web.app import App
+from solo.web.metrics import Registry
+
+
+class HelloRoot(object):
+
+    def index(self):
+        return "Hello World!"
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def main():
+    environ = Request.blank('/').environ
+    number = 20000
+    print '%6s %14s %14s %14s' % ('hooks', 'off(us)', 'metrics(us)', 'cost(us)')
+    for count in (0, 1):
+        calls = []
+        for metrics in (None, True):
+            app = App(metrics=metrics)
+            app.route().connect('index', '/', controller=HelloRoot(), action='index')
+            for i in range(count):
+                app.attach('before_handler', lambda: None)
+            call = partial(lambda app: app(environ.copy(), start_response), app)
+            call()
+            calls.append(call)
+        # interleaved, so both see the same machine load
+        row = [float('inf')] * 2
+        for i in range(15):
+            for j, call in enumerate(calls):
+                row[j] = min(row[j], timeit.timeit(call, number=number) / number * 1e6)
+        print '%6d %14.2f %14.2f %14.2f' % (count, row[0], row[1], row[1] - row[0])
+
+    registry = Registry()
+    counter = registry.counter('c', 'c', ('route', 'status')).labels('index', '2xx')
+    gauge = registry.gauge('g', 'g')
+    histogram = registry.histogram('h', 'h', ('route', ))
+    number = 100000
+    print
+    print '%10s %14s' % ('sample', 'time(us)')
+    for name, f in [('counter', lambda: counter.inc()),
+                    ('gauge', lambda: gauge.inc()),
+                    ('histogram', lambda: histogram.labels('index').observe(0.003))]:
+        print '%10s %14.3f' % (name, min(timeit.repeat(f, number=number, repeat=5)) / number * 1e6)
+
+
+if __name__ == '__main__':
+    main()
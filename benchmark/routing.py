@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""Route lookup cost of routes.Mapper against the compiled router.
+
+python benchmark/routing.py
+"""
+
+import timeit
+
+from solo.web.dispatcher import RoutesDispatcher
+
+
+class Root(object):
+
+    def index(self):
+        return 'index'
+
+
+def build(size, compiled):
+    dispatcher = RoutesDispatcher(compiled=compiled)
+    ctl = Root()
+    for i in range(size // 2):
+        dispatcher.connect('static%d' % i, '/static/%d/index' % i, controller=ctl, action='index',
+                           conditions=dict(method=['GET']))
+        dispatcher.connect('user%d' % i, '/user%d/:id/posts' % i, controller=ctl, action='index',
+                           conditions=dict(method=['GET', 'POST']))
+    return dispatcher
+
+
+def lookup(dispatcher):
+    if dispatcher.router is not None:
+        return dispatcher.router.match
+    return dispatcher.mapper.match
+
+
+def main():
+    environ = {'REQUEST_METHOD': 'GET'}
+    number = 2000
+    print '%8s %10s %14s %14s %14s' % ('routes', 'mode', 'static(us)', 'param(us)', 'miss(us)')
+    for size in (10, 100, 1000, 10000):
+        last = size // 2 - 1
+        for compiled in (False, True):
+            match = lookup(build(size, compiled))
+            match('/', environ)  # build the regexps / compile the table
+            row = []
+            for url in ('/static/%d/index' % last, '/user%d/7/posts' % last, '/not/found'):
+                seconds = timeit.timeit(lambda: match(url, environ), number=number)
+                row.append(seconds / number * 1e6)
+            print '%8d %10s %14.2f %14.2f %14.2f' % ((size, 'compiled' if compiled else 'mapper') + tuple(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@ The module provides some unitily tools like json serialize and parse functions .
 """
 
 from functools import wraps
+from collections import OrderedDict
 
 import datetime
 import decimal
@@ -51,3 +52,49 @@ json_decode = json.loads
 def json_encode(value, ensure_ascii=True, default=as_json):
     """Returns the json serialize stream"""
     return json.dumps(value, default=default, ensure_ascii=ensure_ascii)
+
+
+class LRUCache(object):
+    """A size bounded least recently used mapping with hit and miss counters.
+
+    It is not locked: the gevent greenlets never switch inside its methods.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        data = self._data
+        data.pop(key, None)
+        data[key] = value
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses}
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
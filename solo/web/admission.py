@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The admission control of the requests.
+
+.. code-block:: python
+
+    app = App(admission=AdmissionControl(limit=200, max_queue=100, queue_timeout=0.5,
+                                         adaptive=True, target_latency=0.2))
+    route.connect('report', '/report', controller=ctl, action='report', max_in_flight=4)
+
+A request over the limits waits in a bounded queue for at most
+``queue_timeout`` seconds, else it gets a 503 with ``Retry-After``.
+"""
+
+from collections import deque
+from time import time
+
+from gevent.event import Event
+from webob import exc
+
+from solo.web.ctx import serving
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+class Limiter(object):
+
+    """An in flight limit with a bounded wait queue.
+
+    When ``adaptive`` is True the limit follows the observed latency, AIMD
+    style: it grows by one after a limit's worth of requests faster than
+    ``target_latency`` and shrinks by ``backoff`` on a slower one, at most
+    once per ``target_latency`` seconds, between ``min_limit`` and
+    ``max_limit``.
+    """
+
+    def __init__(self, limit, max_queue=0, queue_timeout=0.1, adaptive=False,
+                 target_latency=0.1, min_limit=1, max_limit=None, backoff=0.9):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit * 10
+        self.backoff = backoff
+        self.in_flight = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.successes = 0
+        self.last_drop = 0
+
+    def acquire(self):
+        """Returns whether the request got a slot, it waits in the queue
+        when there is room."""
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        event = Event()
+        self.waiters.append(event)
+        try:
+            granted = event.wait(self.queue_timeout)
+        except BaseException:
+            # a deadline Timeout or a kill while queued
+            if event.is_set():
+                self.release(None)
+            else:
+                self.waiters.remove(event)
+            raise
+        if granted:
+            # release handed its slot over
+            self.admitted += 1
+            return True
+        self.waiters.remove(event)
+        self.timeouts += 1
+        self.rejected += 1
+        return False
+
+    def release(self, latency):
+        self.in_flight -= 1
+        if self.adaptive and latency is not None:
+            self.adapt(latency)
+        waiters = self.waiters
+        while waiters and self.in_flight < self.limit:
+            self.in_flight += 1
+            waiters.popleft().set()
+
+    def adapt(self, latency):
+        if latency <= self.target_latency:
+            self.successes += 1
+            if self.successes >= self.limit:
+                self.successes = 0
+                self.limit = min(self.limit + 1, self.max_limit)
+        else:
+            now = time()
+            if now - self.last_drop >= self.target_latency:
+                self.last_drop = now
+                self.successes = 0
+                self.limit = max(int(self.limit * self.backoff), self.min_limit)
+
+    def stats(self):
+        return {'limit': self.limit, 'in_flight': self.in_flight, 'queued': len(self.waiters),
+                'admitted': self.admitted, 'rejected': self.rejected, 'timeouts': self.timeouts}
+
+
+class AdmissionControl(object):
+
+    """The global limiter of an App and the limiters of its routes.
+
+    ``limit`` is the global in flight limit, None for no global limit. The
+    other arguments go to each :class:`Limiter`, a route limiter starts at and
+    never grows over the ``max_in_flight`` of the route.
+    """
+
+    def __init__(self, limit=None, retry_after=1, **options):
+        self.retry_after = retry_after
+        self.options = options
+        self.limiter = Limiter(limit, **options) if limit else None
+        # (route name, action) => Limiter
+        self.routes = {}
+
+    def admit(self, key=None, limit=None):
+        """Take a slot of the global limiter, or of the route limiter when
+        the key is given, raise a 503 when the request is shed."""
+        if key is None:
+            limiter = self.limiter
+            if limiter is None:
+                return
+        else:
+            limiter = self.routes.get(key)
+            if limiter is None:
+                options = dict(self.options, max_limit=limit)
+                limiter = self.routes[key] = Limiter(limit, **options)
+
+        if not limiter.acquire():
+            retry_after = str(self.retry_after)
+            serving.response.headers['Retry-After'] = retry_after
+            raise exc.HTTPServiceUnavailable('The server is overloaded',
+                                             headers={'Retry-After': retry_after})
+        try:
+            serving.admitted.append((limiter, time()))
+        except AttributeError:
+            serving.admitted = [(limiter, time())]
+
+    def release(self):
+        """Give the slots of the request back."""
+        admitted = serving.pop('admitted')
+        if admitted:
+            now = time()
+            for limiter, started in admitted:
+                limiter.release(now - started)
+
+    def stats(self):
+        stats = self.limiter.stats() if self.limiter is not None else {}
+        stats['routes'] = dict(('%s.%s' % key, limiter.stats()) for key, limiter in self.routes.items())
+        return stats
@@ -20,15 +20,99 @@ from webob import exc
 from webob import Request, Response
 
 import logging
+from fnmatch import fnmatchcase
+from functools import partial
 from sys import exc_info
+from time import time
+
+from gevent import Timeout
 
 from solo.web.ctx import serving
-from solo.web.hook import HookMap
+from solo.web.hook import HookMap, Hook
 from solo.web.dispatcher import RoutesDispatcher
+from solo.web.fast import FastRequest, FastResponse
+from solo.web.etag import conditional
+from solo.web.compress import Compressor
+from solo.web.admission import AdmissionControl
+from solo.web.batch import BATCH_KEY
+from solo.web.metrics import Metrics
+from solo.web.trace import TRACE_KEY, nophase
+from solo.web.tasks import TaskQueue, submit_deferred
+from solo.template import template_vars
 
 LOGGER = logging.getLogger('solo.web')
 
 
+def url_for(name, **params):
+    """The url_for template global, builds the URL path with the App serving
+    the request, prefixed by the SCRIPT_NAME the App is mounted on"""
+    return serving.request.script_name + serving.app.url_for(name, **params)
+
+
+template_vars['url_for'] = url_for
+
+
+def set_body(response, body):
+    """Set the value a handler returned as the response body.
+
+    A ``str`` or unicode goes into the body, a ``bytearray`` or
+    ``memoryview`` is sent as it is without a copy. Any other iterable, like
+    a generator of byte chunks, becomes the ``app_iter`` without a
+    Content-Length, so the server sends it chunked. Returns True for such a
+    stream.
+    """
+    if type(body) is str:
+        response.body = body
+    elif isinstance(body, unicode):
+        response.text = body
+    elif isinstance(body, bytearray):
+        response.app_iter = [body]
+        response.content_length = len(body)
+    elif isinstance(body, memoryview):
+        response.app_iter = [body]
+        response.content_length = len(body) * body.itemsize
+    elif hasattr(body, '__iter__') and not isinstance(body, dict):
+        response.app_iter = body
+        response.content_length = None
+        return True
+    elif body:
+        response.text = body
+    return False
+
+
+class RequestIter(object):
+
+    """Wraps a streamed app_iter, the request context stays loaded until the
+    server closes it."""
+
+    __slots__ = ('app_iter', 'iterator', 'on_close')
+
+    def __init__(self, app_iter, on_close):
+        self.app_iter = app_iter
+        self.iterator = iter(app_iter)
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            raise
+        except Exception:
+            LOGGER.exception('Error in the streamed body')
+            raise
+
+    __next__ = next  # py3
+
+    def close(self):
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.app_iter.close()
+        finally:
+            self.on_close()
+
 
 class App(object):
 
@@ -37,14 +121,51 @@ class App(object):
                 'on_end_resource', 'on_end_request',
                 'before_error_response', 'after_error_response']
 
+    # raised when a request exceeds its deadline, HTTPServiceUnavailable fits too
+    deadline_error = exc.HTTPGatewayTimeout
 
-    def __init__(self, name='Lilac', encoding='utf8', debug=False, dispatcher=None):
+
+    def __init__(self, name='Lilac', encoding='utf8', debug=False, dispatcher=None, fast=False, etag=False,
+                 compress=None, deadline=None, admission=None, metrics=None, profiler=None,
+                 tracer=None, watchdog=None, tasks=None):
         self.dispatcher = dispatcher or RoutesDispatcher()
         self.name = name
         self.error_pages = {}
         self.encoding = encoding
         self.debug = debug
+        # serve with the lazy FastRequest and FastResponse, see solo.web.fast
+        self.fast = fast
+        # set the ETag of the dynamic responses, see solo.web.etag
+        self.etag = etag
+        # the Compressor of the responses, True for the default one
+        self.compressor = Compressor() if compress is True else compress or None
+        # the seconds a request may take, a route deadline overrides it
+        self.deadline = deadline
+        # the in flight limits of the App and its routes
+        self.admission = admission or AdmissionControl()
+        # the request Metrics, True for a new one
+        self.metrics = Metrics() if metrics is True else metrics or None
+        # the solo.web.profiler.Profiler of a fraction of the requests
+        self.profiler = profiler
+        # the solo.web.trace.Tracer of the request phases
+        self.tracer = tracer
+        # the solo.web.watchdog.HubWatchdog of the gevent hub, started here
+        self.watchdog = watchdog
+        if watchdog is not None:
+            if self.metrics is not None:
+                watchdog.register(self.metrics.registry)
+            watchdog.start()
+        # the TaskQueue of the deferred tasks, its workers start on the first task
+        self.tasks = tasks or TaskQueue()
+        if self.metrics is not None:
+            self.tasks.register(self.metrics.registry)
         self.hooks = HookMap()
+        # hookpoint => compiled hook chain, see freeze
+        self.chains = None
+        # (hookpoint, Hook, route names, route path prefixes) of the route hooks
+        self.scoped_hooks = []
+        # route name => the compiled hook chains of the route
+        self.route_chains = {}
         self.error_response = self._error_response
         self.initialize()
 
@@ -54,10 +175,84 @@ class App(object):
     def route(self):
         return self.dispatcher
 
-    def attach(self, point, callback, failsafe=None, priority=None, **kwargs):
+    def url_for(self, name, **params):
+        """Returns the URL path of the named route, the params that are not
+        in the route path go into the query string"""
+        return self.dispatcher.url_for(name, **params)
+
+    def attach(self, point, callback, failsafe=None, priority=None, routes=None, prefix=None, **kwargs):
+        """Attach a hook to the hookpoint.
+
+        The hook runs for every request unless it is scoped with ``routes``,
+        route names or globs like ``'admin_*'``, or with ``prefix``, path
+        prefixes of the routes like ``'/static'``. The hooks of a route are
+        resolved once, not filtered per request.
+        """
         if point not in self.hookpoints:
             return
-        self.hooks.attach(point, callback, failsafe, priority, **kwargs)
+        if routes is None and prefix is None:
+            self.hooks.attach(point, callback, failsafe, priority, **kwargs)
+        else:
+            if point == 'on_start_resource':
+                raise ValueError('on_start_resource runs before the routing, it can not be scoped to routes')
+            if isinstance(routes, basestring):
+                routes = [routes]
+            if isinstance(prefix, basestring):
+                prefix = [prefix]
+            self.scoped_hooks.append((point, Hook(callback, failsafe, priority, **kwargs),
+                                      routes or [], [p.rstrip('/') for p in prefix or []]))
+        if self.chains is not None:
+            self.freeze()
+
+    def freeze(self):
+        """Compile the hooks of each hookpoint into a single callable, a point
+        without hooks becomes a no-op. The first request freezes the
+        App, attaching a hook afterwards compiles the hooks again.
+
+        The hook chains of each route connected so far are resolved too, a
+        route connected later gets them on its first request."""
+        self.chains = self.compile_hooks(self.hooks)
+        self.route_chains = {}
+        for name in getattr(self.dispatcher, 'named_routes', {}):
+            self.resolve_hooks(name)
+
+    def resolve_hooks(self, name):
+        """Compile the global and the scoped hooks of the route, returns the
+        hookpoint => callable dict of the route."""
+        route = getattr(self.dispatcher, 'named_routes', {}).get(name)
+        path = route.routepath if route is not None else None
+
+        hooks = None
+        for point, hook, names, prefixes in self.scoped_hooks:
+            if (any(fnmatchcase(name, pattern) for pattern in names)
+                    or (path is not None and any(path == p or path.startswith(p + '/')
+                                                 for p in prefixes))):
+                if hooks is None:
+                    hooks = self.hooks.copy()
+                hooks.setdefault(point, []).append(hook)
+                hooks[point].sort()
+
+        chains = self.chains if hooks is None else self.compile_hooks(hooks)
+        self.route_chains[name] = chains
+        return chains
+
+    def compile_hooks(self, hooks):
+        """Freeze the HookMap. Each hook runs in a span when the App traces
+        the requests, the chains observe their latency when it records
+        metrics."""
+        if self.tracer is not None:
+            hooks = self.tracer.instrument(hooks)
+        chains = hooks.freeze(self.hookpoints)
+        if self.metrics is not None:
+            chains = self.metrics.instrument(chains)
+        return chains
+
+    def run_hooks(self, point, chains=None):
+        if chains is None:
+            if self.chains is None:
+                self.freeze()
+            chains = self.chains
+        chains[point]()
 
     def asset(self, name, path, asset_path, default_filename=None, block_size=None):
         """Set servering Static directory"""
@@ -67,35 +262,141 @@ class App(object):
         self.dispatcher.connect(name, path + "/{path:.*?}", controller=ctl, action='asset', conditions=dict(method=["HEAD", "GET"]))
 
 
+    def controller_stats(self):
+        """Returns the instance counts and pool exhaustion of the class controllers"""
+        return self.dispatcher.controller_stats()
+
+    def invalidate(self, *tags):
+        """Drop the cached responses of the tags, returns how many were dropped"""
+        return self.dispatcher.response_cache.invalidate(*tags)
+
+    def cache_stats(self):
+        """Returns the size, hits, misses and evictions of the response cache"""
+        return self.dispatcher.response_cache.stats()
+
+    def coalesce_stats(self):
+        """Returns the in flight, leading and coalesced request counts of the
+        single flight routes"""
+        return self.dispatcher.flights.stats()
+
+    def compress_stats(self):
+        """Returns the compressed and skipped counts and bytes of the Compressor"""
+        return self.compressor.stats() if self.compressor is not None else {}
+
+    def admission_stats(self):
+        """Returns the limit, in flight, queued and rejected counts of the App
+        and of its routes"""
+        return self.admission.stats()
+
+    def hub_stats(self):
+        """Returns the counts and the lag of the hub blocks by route, and the
+        stacks of the last ones"""
+        return self.watchdog.stats() if self.watchdog is not None else {}
+
+    def task_stats(self):
+        """Returns the queued and pending counts and the outcomes of the
+        deferred tasks"""
+        return self.tasks.stats()
+
+    def shutdown(self, timeout=None):
+        """Wait for the deferred tasks to finish, returns whether they all
+        did. The WebServer calls it when it stops."""
+        return self.tasks.drain(timeout)
+
     def error_page(self, code, callback):
         if type(code) is not int:
             raise TypeError("code:%d is not int type" %(code))
         self.error_pages[str(code)] = callback
 
     def __call__(self, environ, start_response):
+        chains = self.chains
+        if chains is None:
+            self.freeze()
+            chains = self.chains
+        finished = True
+        name = None
+        profile = self.profiler.start(environ) if self.profiler is not None else None
+        trace = self.tracer.begin(environ) if self.tracer is not None else None
+        phase = trace.phase if trace is not None else nophase
         try:
             try:
-                request = Request(environ)
-                response = Response()
-                serving.load(request, response)
-                if request.charset is None:
-                    request.charset = self.encoding
-
-                self.hooks.run('on_start_resource')
-
-                path_info = environ['PATH_INFO']
-                action, handler = self.dispatcher.match(request, path_info)
-                body = None
-                self.hooks.run('before_handler')
+                if self.metrics is not None:
+                    self.metrics.start()
+                if self.fast:
+                    request = FastRequest(environ, self.encoding)
+                    response = FastResponse()
+                    serving.load(request, response, self)
+                else:
+                    request = Request(environ)
+                    response = Response()
+                    serving.load(request, response, self)
+                    if request.charset is None:
+                        request.charset = self.encoding
+
+                started = time()
+                timeout = self.start_deadline(started, self.deadline) if self.deadline else None
+                # the batch request holds the admission slot of its sub-requests
+                admit = BATCH_KEY not in environ
+                try:
+                    phase('admission')
+                    if admit:
+                        self.admission.admit()
+                    phase('on_start_resource')
+                    chains['on_start_resource']()
+
+                    phase('dispatch')
+                    path_info = environ['PATH_INFO']
+                    name, action, handler, kwargs = self.dispatcher.dispatch(request, path_info)
+                    if name is not None:
+                        chains = self.route_chains.get(name) or self.resolve_hooks(name)
+                        seconds = self.dispatcher.deadlines.get((name, action))
+                        if seconds is not None:
+                            timeout = self.start_deadline(started, seconds, timeout)
+                        limit = self.dispatcher.route_limits.get((name, action))
+                        if limit is not None and admit:
+                            self.admission.admit((name, action), limit)
+                    body = None
+                    phase('before_handler')
+                    chains['before_handler']()
+
+                    if handler:
+                        phase('handler')
+                        if self.metrics is None:
+                            body = handler(**kwargs)
+                        else:
+                            body = self.metrics.call(name, handler, kwargs)
+                except Timeout as e:
+                    if e is not timeout:
+                        raise
+                    # the handler can not swallow the Timeout in an except Exception
+                    raise self.deadline_error('The request exceeded its deadline of %gs'
+                                              % (serving.deadline - started))
+                finally:
+                    if timeout is not None:
+                        timeout.cancel()
 
                 if handler:
-                    body = handler()
-                    if type(body) is str:
-                        response.body = body
-                    elif body:
-                        response.text = body
-                    self.hooks.run('on_end_resource')
-                    return response(environ, start_response)
+                    phase('on_end_resource')
+                    stream = set_body(response, body)
+                    chains['on_end_resource']()
+                    phase('response')
+                    if self.etag and isinstance(body, basestring):
+                        conditional(request, response)
+                    if self.compressor is not None and (stream or isinstance(body, basestring)):
+                        key = (name, action)
+                        self.compressor(request, response, stream,
+                                        self.dispatcher.compress_options.get(key),
+                                        key in self.dispatcher.cache_policies or response.etag is not None)
+                    app_iter = response(environ, start_response)
+                    if stream and getattr(body, 'detached', False):
+                        # a long lived stream like the Server-Sent Events ends the request now
+                        return app_iter
+                    if stream or trace is not None or serving.get('deferred'):
+                        # the request ends once the body is sent
+                        phase('write')
+                        finished = False
+                        return RequestIter(app_iter, partial(self.end_request, chains, name))
+                    return app_iter
                 else:
                     raise exc.HTTPNotFound('Path %s Not Found' % (path_info)) 
 
@@ -103,38 +404,58 @@ class App(object):
                 serving.response.location = e.location
                 serving.response.status = e.status
                 response = serving.response
-                self.hooks.run('on_end_resource')
+                chains['on_end_resource']()
             except exc.HTTPException as e:
-                response = serving.response = self.handle_error_page(request, response, e)
+                response = serving.response = self.handle_error_page(request, response, e, chains)
             except Exception as e:
                 LOGGER.error(e)
                 self.error_response(request, response, e)
             return response(environ, start_response)
         finally:
-            try:
-                self.hooks.run('on_end_request')
-            finally:
-                serving.clear()
+            if finished:
+                self.end_request(chains, name)
+            if profile is not None:
+                self.profiler.stop(profile, name)
+
+    def start_deadline(self, started, seconds, timeout=None):
+        """Start the gevent Timeout of the request deadline, replacing the
+        running one. The deadline is kept in the request context, see
+        :func:`solo.web.ctx.remaining`. The Timeout raises itself, which
+        ``__call__`` turns into a ``deadline_error``."""
+        if timeout is not None:
+            timeout.cancel()
+        serving.deadline = deadline = started + seconds
+        return Timeout.start_new(max(deadline - time(), 0))
+
+    def end_request(self, chains, name=None):
+        """Run the on_end_request hooks and clear the request context."""
+        try:
+            chains['on_end_request']()
+        finally:
+            if self.metrics is not None:
+                self.metrics.end(name, serving.response.status_code)
+            if self.tracer is not None:
+                self.tracer.end(serving.request.environ[TRACE_KEY], name, serving.response.status_code)
+            self.admission.release()
+            self.dispatcher.release()
+            submit_deferred(self.tasks)
+            serving.clear()
 
 
-    def handle_error_page(self, request, response, exception):
+    def handle_error_page(self, request, response, exception, chains=None):
         """Handle the last unanticipated exception. (Core)"""
         try:
-            self.hooks.run("before_error_response")
+            self.run_hooks("before_error_response", chains)
             response.status = exception.status
             #response.status = exception.status
             handler = self.error_pages.get(str(exception.code), None)
             if handler:
-                body = handler()
-                if type(body) is str:
-                    response.body = body
-                elif text:
-                    response.text = body
+                set_body(response, handler())
                 return response
             else:
                 return exception
         finally:
-            self.hooks.run("after_error_response")
+            self.run_hooks("after_error_response", chains)
 
     def _error_response(self, request, response, exception):
         """Handle the unknow exception and also throw 5xx status and message to frontend"""
@@ -25,7 +25,7 @@ from os.path import (
 from webob import exc
 
 
-from solo.web.ctx import request, response
+from solo.web.ctx import request, response, serving
 
 LOGGER = logging.getLogger('asset')
 
@@ -64,7 +64,9 @@ class AssetController(object):
         response.content_type = self.get_content_type(absolute_path)
         response.conditional_response = True
         if load:
-            response.app_iter = FileIter(absolute_path, block_size=self.block_size)
+            metrics = getattr(getattr(serving, 'app', None), 'metrics', None)
+            counter = metrics.asset_bytes.inc if metrics is not None else None
+            response.app_iter = FileIter(absolute_path, block_size=self.block_size, counter=counter)
 
         last_modified, size = getmtime(absolute_path), getsize(absolute_path)
         response.last_modified = last_modified
@@ -90,7 +92,7 @@ class AssetController(object):
         if (os.path.isdir(absolute_path) and self.default_filename is not None):
 
             if not request.path_info.endswith("/"):
-                raise exc.HTTPSeeOther(location=request.path_info + "/")
+                raise exc.HTTPSeeOther(location=request.script_name + request.path_info + "/")
 
             absolute_path = os.path.join(absolute_path, self.default_filename)
 
@@ -107,14 +109,16 @@ class FileIter(object):
     ``file`` is a Python file pointer (or at least an object with a ``read``
     method that takes a size hint).
 
-    ``block_size`` is an optional block size for iteration."""
+    ``block_size`` is an optional block size for iteration, ``counter`` is
+    called with the size of each block sent."""
 
-    def __init__(self, filename, start=None, stop=None, block_size=_BLOCK_SIZE):
+    def __init__(self, filename, start=None, stop=None, block_size=_BLOCK_SIZE, counter=None):
         self.filename = filename
         self.start = start
         self.stop = stop
         self.block_size = block_size
-        self.fileiterator = FileIterator(self.filename, self.start, self.stop, self.block_size)
+        self.counter = counter
+        self.fileiterator = FileIterator(self.filename, self.start, self.stop, self.block_size, counter)
 
     def __iter__(self):
         return self
@@ -125,7 +129,7 @@ class FileIter(object):
     __next__ = next  # py3
 
     def app_iter_range(self, start, stop):
-        return self.__class__(self.filename, start, stop, self.block_size)
+        return self.__class__(self.filename, start, stop, self.block_size, self.counter)
 
     def close(self):
         self.fileiterator.close()
@@ -133,9 +137,10 @@ class FileIter(object):
 
 class FileIterator(object):
 
-    def __init__(self, filename, start, stop, block_size):
+    def __init__(self, filename, start, stop, block_size, counter=None):
         self.block_size = block_size
         self.filename = filename
+        self.counter = counter
 
         if start:
             self.fileobj.seek(start)
@@ -163,6 +168,8 @@ class FileIterator(object):
             if self.length < 0:
                 # Chop off the extra:
                 chunk = chunk[:self.length]
+        if self.counter is not None:
+            self.counter(len(chunk))
         return chunk
 
     __next__ = next  # py3 compat
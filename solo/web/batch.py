@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The batch route, several sub-requests in one round trip.
+
+.. code-block:: python
+
+    Batch(max_requests=30, concurrency=10).connect(app.route(), '/batch')
+
+The body of a ``POST /batch`` is a JSON array of sub-requests::
+
+    [{"method": "GET", "path": "/users/1"},
+     {"method": "POST", "path": "/users/1/tags", "params": {"tag": "admin"}}]
+
+Each sub-request is served by the App in its own greenlet, with its own
+request context, with the headers of the batch request like its cookies.
+The response is the JSON array of the ``status``, ``headers`` and ``body``
+of each one in order, or with ``?stream=1`` a JSON line of each one with
+its ``index`` as soon as it is done.
+
+A sub-request ends by the deadline of the batch request, a 504 entry
+otherwise. A long lived stream like the Server-Sent Events can not be in a
+batch, it gets a 400 entry.
+"""
+
+from functools import partial
+from io import BytesIO
+from time import time
+from urllib import urlencode
+
+from gevent import Timeout
+from gevent.pool import Pool
+from webob import exc
+
+from solo.util import json_decode, json_encode
+from solo.web.ctx import serving
+from solo.web.util import raw_body
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+# the environ key marking a sub-request
+BATCH_KEY = 'solo.batch'
+
+# the methods of the sub-requests whose params go into the query string
+QUERY_METHODS = ('GET', 'HEAD', 'DELETE')
+
+
+def encode_params(params):
+    pairs = []
+    for name, value in params.items():
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, unicode):
+                item = item.encode('utf8')
+            elif not isinstance(item, str):
+                item = json_encode(item) if isinstance(item, (dict, list)) else str(item)
+            pairs.append((name.encode('utf8') if isinstance(name, unicode) else name, item))
+    return urlencode(pairs)
+
+
+class Batch(object):
+
+    """The controller of the batch route.
+
+    A batch has at most ``max_requests`` sub-requests and a body of at most
+    ``max_body`` bytes, ``concurrency`` of its sub-requests are served at a
+    time.
+    """
+
+    # the headers of the batch request a sub-request does not inherit
+    dropped_headers = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH',
+                       'HTTP_IF_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_RANGE')
+
+    def __init__(self, max_requests=30, concurrency=10, max_body=1024 * 1024):
+        self.max_requests = max_requests
+        self.concurrency = concurrency
+        self.max_body = max_body
+
+    def connect(self, dispatcher, path='/batch', name='batch', **options):
+        """Connect the batch route, the options like ``deadline`` are the
+        route options of ``connect``."""
+        dispatcher.connect(name, path, controller=self, action='handle', conditions=dict(method=['POST']),
+                           **options)
+
+    @raw_body
+    def handle(self):
+        request = serving.request
+        environ = request.environ
+        if environ.get(BATCH_KEY):
+            raise exc.HTTPBadRequest('A batch can not be in a batch')
+        length = request.content_length
+        if length is None:
+            raise exc.HTTPLengthRequired()
+        if length > self.max_body:
+            raise exc.HTTPRequestEntityTooLarge('The batch is over %d bytes' % (self.max_body))
+        try:
+            specs = json_decode(request.body)
+        except ValueError:
+            raise exc.HTTPBadRequest('The batch is not JSON')
+        if not isinstance(specs, list):
+            raise exc.HTTPBadRequest('The batch is not a JSON array')
+        if len(specs) > self.max_requests:
+            raise exc.HTTPRequestEntityTooLarge('The batch has over %d requests' % (self.max_requests))
+
+        environs = [self.sub_environ(environ, spec) for spec in specs]
+        call = partial(self.call, serving.app, serving.get('deadline'))
+        pool = Pool(self.concurrency)
+        response = serving.response
+        if request.GET.get('stream') in ('1', 'true'):
+            response.content_type = 'application/x-ndjson; charset=UTF-8'
+            return self.stream(pool, call, environs)
+        response.content_type = 'application/json; charset=UTF-8'
+        try:
+            results = pool.map(call, environs)
+        except BaseException:
+            # the deadline Timeout of the batch request
+            pool.kill(block=False)
+            raise
+        return json_encode(results)
+
+    def sub_environ(self, environ, spec):
+        """Returns the WSGI environ of a sub-request."""
+        if not isinstance(spec, dict):
+            raise exc.HTTPBadRequest('A sub-request is not a JSON object')
+        method = spec.get('method', 'GET')
+        path = spec.get('path')
+        params = spec.get('params') or {}
+        headers = spec.get('headers') or {}
+        if (not isinstance(method, basestring) or not isinstance(path, basestring) or not path.startswith('/')
+                or not isinstance(params, dict) or not isinstance(headers, dict)):
+            raise exc.HTTPBadRequest('Malformed sub-request: %s' % (json_encode(spec)))
+        method = method.upper().encode('ascii', 'replace')
+        path, _, query = path.encode('utf8').partition('?')
+
+        sub = dict((key, value) for key, value in environ.items()
+                   # the middleware and solo state of the batch request stays with it
+                   if ('.' not in key or key.startswith('wsgi.')) and key not in self.dropped_headers)
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_').encode('ascii', 'replace')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            sub[key] = unicode(value).encode('utf8')
+
+        body = ''
+        if params:
+            encoded = encode_params(params)
+            if method in QUERY_METHODS:
+                query = query + '&' + encoded if query else encoded
+            else:
+                body = encoded
+                sub['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        sub.update({'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query,
+                    'CONTENT_LENGTH': str(len(body)), 'wsgi.input': BytesIO(body), BATCH_KEY: True})
+        return sub
+
+    def call(self, app, deadline, environ):
+        """Serve a sub-request by the deadline of the batch, returns its
+        result."""
+        captured = []
+
+        def start_response(status, headers, exc_info=None):
+            captured[:] = [status, headers]
+            return chunks.append
+        chunks = []
+        timeout = Timeout.start_new(max(deadline - time(), 0)) if deadline is not None else None
+        try:
+            app_iter = app(environ, start_response)
+            try:
+                if getattr(app_iter, 'detached', False):
+                    return {'status': 400, 'headers': {}, 'body': 'A stream can not be in a batch'}
+                chunks.extend(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+        except Timeout as e:
+            if e is not timeout:
+                raise
+            return {'status': 504, 'headers': {}, 'body': 'The batch exceeded its deadline'}
+        except Exception:
+            LOGGER.exception('Failed to serve the sub-request %s', environ.get('PATH_INFO'))
+            return {'status': 500, 'headers': {}, 'body': ''}
+        finally:
+            if timeout is not None:
+                timeout.cancel()
+        status, headers = captured
+        return {'status': int(status.split(' ', 1)[0]), 'headers': dict(headers),
+                'body': ''.join(chunks).decode('utf8', 'replace')}
+
+    def stream(self, pool, call, environs):
+        def indexed(item):
+            result = call(item[1])
+            result['index'] = item[0]
+            return result
+        results = pool.imap_unordered(indexed, enumerate(environs))
+        try:
+            for result in results:
+                yield json_encode(result) + '\n'
+        finally:
+            # the client is gone, or all are done
+            results.kill(block=False)
+            pool.kill(block=False)
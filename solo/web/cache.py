@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The in process response cache of the GET routes.
+
+A route is cached with ``connect(..., cache=60)``, a dict of the
+:class:`CachePolicy` arguments, or the :func:`solo.web.util.cached` decorator:
+
+.. code-block:: python
+
+    route.connect('user', '/users/{id}', controller=ctl, action='user',
+                  cache=dict(ttl=300, vary=['Accept-Language'], tags=['user:{id}']))
+
+    app.invalidate('user:42')
+"""
+
+from collections import OrderedDict
+from time import time
+
+from solo.web.ctx import serving
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+class CachePolicy(object):
+
+    """How the responses of a route are cached.
+
+    ``ttl`` is in seconds, ``vary`` names the request headers the response
+    depends on, ``tags`` are formatted with the route params, like
+    ``'user:{id}'``, and only the responses with a status in ``statuses`` are
+    kept.
+    """
+
+    __slots__ = ('ttl', 'vary', 'tags', 'statuses', 'environ_keys')
+
+    def __init__(self, ttl=60, vary=(), tags=(), statuses=(200, )):
+        if isinstance(vary, basestring):
+            vary = [vary]
+        if isinstance(tags, basestring):
+            tags = [tags]
+        self.ttl = ttl
+        self.vary = tuple(vary)
+        self.tags = tuple(tags)
+        self.statuses = frozenset(statuses)
+        self.environ_keys = tuple('HTTP_' + name.upper().replace('-', '_') for name in self.vary)
+
+    @classmethod
+    def make(cls, cache):
+        """Returns the policy of a ``connect(cache=...)`` value: a policy, a
+        dict of the policy arguments or the ttl."""
+        if cache is None or isinstance(cache, cls):
+            return cache
+        if isinstance(cache, dict):
+            return cls(**cache)
+        return cls(ttl=cache)
+
+    def key(self, name, params, environ):
+        """The cache key of a request: the route, its params, the query
+        string and the Vary headers."""
+        return (name, tuple(sorted(params.items())), environ.get('QUERY_STRING', ''),
+                tuple([environ.get(key) for key in self.environ_keys]))
+
+
+class CacheEntry(object):
+
+    """A cached response."""
+
+    __slots__ = ('status', 'headers', 'body', 'expires', 'tags', 'size')
+
+    def __init__(self, status, headers, body, expires, tags, size):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.tags = tags
+        self.size = size
+
+    def replay(self):
+        """The page handler of a cache hit, restores the status and headers
+        and returns the body."""
+        response = serving.response
+        response.status = self.status
+        for name, value in self.headers:
+            if name == 'Content-Type':
+                response.content_type = value
+            else:
+                response.headers[name] = value
+        return self.body
+
+
+def capture(response, body):
+    """Returns the headers of the response without Content-Length and
+    Set-Cookie, their size with the body and whether a cookie was set, or
+    None when the body is not a str or unicode."""
+    if type(body) is str:
+        size = len(body)
+    elif isinstance(body, unicode):
+        size = len(body.encode('utf8'))
+    else:
+        return None
+    headers = []
+    cookies = False
+    for name, value in response.headerlist:
+        if name == 'Set-Cookie':
+            cookies = True
+        elif name != 'Content-Length':
+            headers.append((name, value))
+            size += len(name) + len(value)
+    return headers, size, cookies
+
+
+class ResponseCache(object):
+
+    """A least recently used cache of responses bounded by the bytes of the
+    bodies and headers.
+
+    Its methods only move entries of its OrderedDict and count the bytes,
+    they do no I/O, so a greenlet finishes a get or a put before another
+    runs and the tag index never sees a half done eviction.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._data = OrderedDict()
+        # tag => keys of the entries
+        self._tags = {}
+
+    def get(self, key):
+        """Returns the fresh entry of the key or None."""
+        entry = self._data.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires <= time():
+            self._forget(key, entry)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data[key] = entry
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        data = self._data
+        if entry.size > self.max_bytes:
+            return
+        old = data.pop(key, None)
+        if old is not None:
+            self._forget(key, old)
+        data[key] = entry
+        self.bytes += entry.size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.bytes > self.max_bytes:
+            old_key, old = data.popitem(last=False)
+            self._forget(old_key, old)
+            self.evictions += 1
+
+    def _forget(self, key, entry):
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags):
+        """Drop the entries of the tags, returns how many were dropped."""
+        count = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                entry = self._data.pop(key, None)
+                if entry is not None:
+                    self._forget(key, entry)
+                    count += 1
+        self.invalidations += count
+        return count
+
+    def clear(self):
+        self._data.clear()
+        self._tags.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {'size': len(self._data), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'invalidations': self.invalidations}
+
+    def filler(self, key, policy, params, handler):
+        """Wraps the page handler of a cache miss, the response it makes is
+        cached when the body is a str or unicode."""
+        def fill(**kwargs):
+            body = handler(**kwargs)
+            try:
+                self.store(key, policy, params, body)
+            except Exception:
+                LOGGER.exception('Failed to cache the response of %s', key[0])
+            return body
+        return fill
+
+    def store(self, key, policy, params, body):
+        response = serving.response
+        if response.status_code not in policy.statuses:
+            return
+        captured = capture(response, body)
+        if captured is None or captured[2]:
+            # never share the cookies of a client
+            return
+        headers, size = captured[:2]
+        tags = tuple(tag.format(**params) for tag in policy.tags)
+        self.put(key, CacheEntry(response.status, headers, body,
+                                 time() + policy.ttl, tags, size))
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The gzip and deflate compression of the responses.
+
+.. code-block:: python
+
+    app = App(compress=Compressor(min_size=1024, level=6))
+    # never compress the route, or compress it from 100 bytes on
+    route.connect('raw', '/raw', controller=ctl, action='raw', compress=False)
+    route.connect('small', '/small', controller=ctl, action='small', compress=100)
+"""
+
+import zlib
+from hashlib import md5
+
+from solo.util import LRUCache
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+def negotiate(accept_encoding):
+    """Returns gzip or deflate, the one the Accept-Encoding header prefers,
+    or None."""
+    if not accept_encoding:
+        return None
+    best = None
+    best_q = 0
+    for value in accept_encoding.split(','):
+        coding, _, params = value.partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0
+        if coding == '*':
+            coding = 'gzip'
+        if coding in ('gzip', 'deflate') and q > 0 and (q > best_q or (q == best_q and coding == 'gzip')):
+            best, best_q = coding, q
+    return best
+
+
+def compressobj(encoding, level):
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+
+def compress_iter(app_iter, encoding, level):
+    """Compress the chunks of a streamed body, each chunk is flushed so the
+    client gets it right away."""
+    compressor = compressobj(encoding, level)
+    try:
+        for chunk in app_iter:
+            if chunk:
+                # bytes() of a memoryview is its repr on py2
+                if isinstance(chunk, memoryview):
+                    chunk = chunk.tobytes()
+                elif not isinstance(chunk, str):
+                    chunk = str(chunk)
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+class Compressor(object):
+
+    """Compress the responses of the clients which accept it.
+
+    A body is compressed when its content type starts with one of ``types``
+    and it has ``min_size`` bytes at least, a smaller one does not pay off.
+    The streamed bodies are compressed chunk by chunk. The compressed bytes of
+    up to ``cache_size`` cacheable bodies are kept, so the same payload is
+    not compressed twice.
+    """
+
+    default_types = ('text/', 'application/json', 'application/javascript',
+                     'application/xml', 'application/xhtml+xml', 'image/svg+xml')
+
+    def __init__(self, min_size=1024, level=6, types=None, cache_size=128, max_cache_body=1024 * 1024):
+        self.min_size = min_size
+        self.level = level
+        self.types = tuple(types or self.default_types)
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.max_cache_body = max_cache_body
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def accepts(self, content_type):
+        content_type = (content_type or '').split(';', 1)[0].strip().lower()
+        if content_type == 'text/event-stream':
+            # a zlib stream for each idle subscriber costs too much memory
+            return False
+        for prefix in self.types:
+            if content_type.startswith(prefix):
+                return True
+        return False
+
+    def __call__(self, request, response, stream, override=None, cacheable=False):
+        """Compress the response body in place.
+
+        ``override`` is the compress option the route was connected with:
+        False never compresses, True compresses any content type and a
+        number is the minimum size of the route.
+        """
+        if override is False or request.method == 'HEAD':
+            return
+        status = response.status_code
+        if status == 304:
+            etag = response.etag
+            if etag is not None and etag.endswith(('-gzip', '-deflate')):
+                # the 304 of a compressed representation varies like its 200
+                vary = response.headers.get('Vary')
+                response.headers['Vary'] = vary + ', Accept-Encoding' if vary else 'Accept-Encoding'
+            return
+        if status < 200 or status in (204, 206):
+            return
+        encoding = negotiate(request.environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return
+        if override is not True and not self.accepts(response.content_type):
+            return
+        headers = response.headers
+        if 'Content-Encoding' in headers:
+            return
+
+        if stream:
+            response.app_iter = compress_iter(response.app_iter, encoding, self.level)
+            self.compressed += 1
+        else:
+            body = response.body
+            min_size = self.min_size if override in (None, True) else override
+            if len(body) < min_size:
+                self.skipped += 1
+                return
+            data = self.compress(body, encoding, cacheable)
+            if data is None:
+                return
+            response.body = data
+
+        headers['Content-Encoding'] = encoding
+        vary = headers.get('Vary')
+        headers['Vary'] = vary + ', Accept-Encoding' if vary else 'Accept-Encoding'
+        etag = response.etag
+        if etag is not None:
+            # another representation, another strong ETag
+            response.etag = '%s-%s' % (etag, encoding)
+
+    def compress(self, body, encoding, cacheable):
+        """Returns the compressed body or None when it does not shrink."""
+        cache = self.cache if cacheable and len(body) <= self.max_cache_body else None
+        if cache is not None:
+            # the digest, a key never holds on to the body
+            key = (encoding, md5(body).digest())
+            data = cache.get(key)
+            if data is not None:
+                return data or None
+
+        compressor = compressobj(encoding, self.level)
+        data = compressor.compress(body) + compressor.flush()
+        if len(data) >= len(body):
+            self.skipped += 1
+            data = ''
+        else:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(data)
+        if cache is not None:
+            cache.put(key, data)
+        return data or None
+
+    def stats(self):
+        stats = {'compressed': self.compressed, 'skipped': self.skipped,
+                 'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out}
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
@@ -14,10 +14,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-__all__ = ['request', 'response', 'serving']
+__all__ = ['request', 'response', 'serving', 'remaining']
 
 
 import logging
+from time import time
 
 LOGGER = logging.getLogger('solo.web')
 
@@ -34,10 +35,11 @@ class GreenletServing(object):
     def __init__(self):
         object.__setattr__(self, '__local__', {})
 
-    def load(self, request, response):
+    def load(self, request, response, app=None):
         self.__local__[get_ident()] = {
             'request': request,
-            'response': response
+            'response': response,
+            'app': app
         }
 
     def __getattr__(self, name):
@@ -54,6 +56,25 @@ class GreenletServing(object):
         except KeyError:
             local[ident] = {name: value}
 
+    def get(self, name, default=None):
+        """Returns an attribute of the current greenlet, or the default."""
+        try:
+            return self.__local__[get_ident()].get(name, default)
+        except KeyError:
+            return default
+
+    def pop(self, name, default=None):
+        """Remove an attribute of the current greenlet and return it."""
+        try:
+            return self.__local__[get_ident()].pop(name, default)
+        except KeyError:
+            return default
+
+    def of(self, greenlet, name, default=None):
+        """Returns an attribute of the context of another greenlet, the hub
+        watchdog reads it from its own thread."""
+        return self.__local__.get(greenlet, {}).get(name, default)
+
     def clear(self):
         """Clear all attributes of the current greenlet."""
         del self.__local__[get_ident()]
@@ -124,3 +145,12 @@ class _ThreadLocalProxy(object):
 #   to the "serving" object)
 request = _ThreadLocalProxy('request')
 response = _ThreadLocalProxy('response')
+
+
+def remaining():
+    """Returns the seconds left before the deadline of the current request,
+    or None when it has no deadline. Pass it on to the backend calls."""
+    deadline = getattr(serving, 'deadline', None)
+    if deadline is None:
+        return None
+    return max(deadline - time(), 0)
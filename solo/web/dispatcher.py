@@ -18,6 +18,14 @@
 
 from webob import exc
 from solo.web.ctx import serving
+from solo.web.router import CompiledRouter, UrlBuilder
+from solo.web.cache import CachePolicy, ResponseCache
+from solo.web.flight import CoalescePolicy, SingleFlight
+from solo.web.etag import versioned
+from solo.web.trace import TRACE_KEY, nospan
+from solo.web.multipart import UploadLimits, is_multipart, parse_multipart, close_uploads
+from solo.util import LRUCache
+from gevent.queue import LifoQueue, Empty
 import routes
 from sys import exc_info
 
@@ -41,57 +49,425 @@ class RoutesDispatcher(object):
 
     """A Routes based dispatcher for CherryPy."""
 
-    def __init__(self, **mapper_options):
-        """Routes dispatcher"""
+    def __init__(self, compiled=False, cache_size=0, response_cache=None, upload_limits=None,
+                 **mapper_options):
+        """Routes dispatcher
+
+        When ``compiled`` is True the routes are looked up in a
+        :class:`solo.web.router.CompiledRouter` built from the mapper instead
+        of trying every route's regexp in turn.
+
+        When ``cache_size`` is set the match results are kept in a LRU cache
+        keyed by ``(REQUEST_METHOD, PATH_INFO)``, misses are never cached.
+
+        ``response_cache`` is the :class:`solo.web.cache.ResponseCache` of the
+        routes connected with a cache policy, a 64MB one by default.
+
+        ``upload_limits`` are the :class:`solo.web.multipart.UploadLimits` of
+        the request bodies, a dict of their arguments or the limits.
+        """
         self.controllers = {}
         self.mapper = routes.Mapper(**mapper_options)
         self.mapper.controller_scan = self.controllers.keys
+        self.router = CompiledRouter(self.mapper) if compiled else None
+        self.cache = LRUCache(cache_size) if cache_size else None
+        # (route name, action) => HandlerPlan
+        self.plans = {}
+        # route name => lifecycle of the class controllers
+        self.lifecycle = {}
+        # route name => the instances made of a per request controller class
+        self.instances = {}
+        # route name => route, and (route name, param names) => UrlBuilder
+        self.named_routes = {}
+        self.url_builders = {}
+        # (route name, action) => CachePolicy of the cached routes
+        self.cache_policies = {}
+        self.response_cache = response_cache or ResponseCache()
+        # (route name, action) => CoalescePolicy of the single flight routes
+        self.coalesce_policies = {}
+        self.flights = SingleFlight()
+        # (route name, action) => the compress option of the route
+        self.compress_options = {}
+        # (route name, action) => the deadline seconds of the route
+        self.deadlines = {}
+        # (route name, action) => the in flight limit of the route
+        self.route_limits = {}
+        # the request body limits, and (route name, action) => those of the route
+        self.upload_limits = UploadLimits.make(upload_limits) or UploadLimits()
+        self.route_upload_limits = {}
+
+    lifecycles = ('per_request', 'singleton', 'pooled')
+
+    def connect(self, name, route, controller, lifecycle='per_request', pool_size=8,
+                cache=None, coalesce=None, compress=None, deadline=None, max_in_flight=None,
+                upload=None, **kwargs):
+        """Connect a route to the controller.
+
+        When the controller is a class, ``lifecycle`` tells how it is
+        instantiated: ``per_request`` makes a new instance for every request,
+        ``singleton`` makes one instance right now, and ``pooled`` reuses up to
+        ``pool_size`` instances across requests.
+
+        ``cache`` caches the GET responses of the route, it is the ttl, a
+        dict of the :class:`solo.web.cache.CachePolicy` arguments or a policy.
+
+        ``coalesce`` lets the concurrent GET requests of the route share one
+        handler run, it is True, a dict of the
+        :class:`solo.web.flight.CoalescePolicy` arguments or a policy.
+
+        ``compress`` overrides the compression of the App for the route:
+        False never compresses, True compresses any content type and a number
+        is the minimum body size.
+
+        ``deadline`` is the seconds a request of the route may take, it
+        overrides the deadline of the App.
+
+        ``max_in_flight`` limits the concurrent requests of the route, see
+        :class:`solo.web.admission.AdmissionControl`.
+
+        ``upload`` overrides the request body limits of the dispatcher for
+        the route, it is a dict of the
+        :class:`solo.web.multipart.UploadLimits` arguments or the limits.
+        """
+        if lifecycle not in self.lifecycles:
+            raise ValueError('Unknown controller lifecycle: %s' % (lifecycle))
+
+        cache = CachePolicy.make(cache)
+        coalesce = CoalescePolicy.make(coalesce)
+        if 'action' in kwargs:
+            plan = self.plan(controller, kwargs['action'])
+            if plan is not None:
+                self.plans[(name, kwargs['action'])] = plan
+                cache = cache or plan.cache
+                coalesce = coalesce or plan.coalesce
+        if cache is not None:
+            self.cache_policies[(name, kwargs.get('action'))] = cache
+        if coalesce is not None:
+            self.coalesce_policies[(name, kwargs.get('action'))] = coalesce
+        if compress is not None:
+            self.compress_options[(name, kwargs.get('action'))] = compress
+        if deadline is not None:
+            self.deadlines[(name, kwargs.get('action'))] = deadline
+        if max_in_flight is not None:
+            self.route_limits[(name, kwargs.get('action'))] = max_in_flight
+        if upload is not None:
+            self.route_upload_limits[(name, kwargs.get('action'))] = UploadLimits.make(upload)
+
+        if isinstance(controller, classtype):
+            self.lifecycle[name] = lifecycle
+            if lifecycle == 'singleton':
+                controller = controller()
+            elif lifecycle == 'pooled':
+                controller = ControllerPool(controller, pool_size)
+            else:
+                self.instances.setdefault(name, 0)
+        elif lifecycle == 'pooled':
+            raise ValueError('The pooled lifecycle needs a controller class')
 
-
-    def connect(self, name, route, controller, **kwargs):
         self.controllers[name] = controller
         self.mapper.connect(name, route, controller=name, **kwargs)
+        self.named_routes[name] = self.mapper.matchlist[-1]
+        self.url_builders.clear()
+        self.url_builder(name, ())
+        if self.cache is not None:
+            self.cache.clear()
+
+    def url_builder(self, name, keys):
+        """Returns the UrlBuilder of the route for the param names, or None
+        when the route needs more params."""
+        key = (name, frozenset(keys))
+        try:
+            return self.url_builders[key]
+        except KeyError:
+            pass
+        try:
+            builder = UrlBuilder(self.named_routes[name], key[1])
+        except ValueError:
+            builder = None
+        self.url_builders[key] = builder
+        return builder
+
+    def url_for(self, name, **params):
+        """Returns the URL path of the named route built from the params.
+
+        Raise KeyError for an unknown route and ValueError when the params
+        do not fit the route.
+        """
+        try:
+            builder = self.url_builders[(name, frozenset(params))]
+        except KeyError:
+            if name not in self.named_routes:
+                raise KeyError('No route named %s' % (name))
+            builder = self.url_builder(name, params)
+        if builder is None:
+            # build it once more to raise the reason
+            UrlBuilder(self.named_routes[name], frozenset(params))
+        return builder(params)
+
+    def release(self):
+        """Give the pooled controller instance of the request back and close
+        its upload files."""
+        lease = serving.pop('controller_lease')
+        if lease is not None:
+            lease[0].release(lease[1])
+        close_uploads()
+
+    def controller_stats(self):
+        """Returns the instance counts of each class controller."""
+        stats = {}
+        for name, lifecycle in self.lifecycle.items():
+            if lifecycle == 'pooled':
+                stats[name] = self.controllers[name].stats()
+            elif lifecycle == 'singleton':
+                stats[name] = {'lifecycle': lifecycle, 'instances': 1}
+            else:
+                stats[name] = {'lifecycle': lifecycle, 'instances': self.instances[name]}
+        return stats
+
+    def plan(self, controller, action):
+        """Inspect the page handler of a route, returns its HandlerPlan."""
+        if action is not None:
+            handler = getattr(controller, action, None)
+        elif isinstance(controller, classtype):
+            # the dispatcher calls a new instance of the class
+            handler = getattr(controller, '__call__', None)
+        else:
+            handler = controller
+        if handler is None:
+            return None
+        return HandlerPlan(handler)
+
+    def lookup(self, method, path_info):
+        """Returns the routes match dict of the path, or None."""
+        cache = self.cache
+        if cache is not None:
+            key = (method, path_info)
+            result = cache.get(key)
+            if result is not None:
+                return result.copy()
+
+        environ = {'REQUEST_METHOD' : method}
+        if self.router is not None:
+            result = self.router.match(path_info, environ)
+        else:
+            result = self.mapper.match(path_info, environ)
+
+        if cache is not None and result is not None:
+            cache.put(key, result.copy())
+        return result
 
 
     def match(self, request, path_info):
         """Find the right page handler."""
+        name, action, handler, kwargs = self.dispatch(request, path_info)
+        if handler is not None:
+            handler = PageHandler(handler, **kwargs)
+        return action, handler
 
-        result = self.mapper.match(path_info, {'REQUEST_METHOD' : request.method})
+    def dispatch(self, request, path_info):
+        """Find the right page handler and bind its arguments.
+
+        Returns a tuple of route name, action, handler and the keyword
+        arguments to call the handler with, the handler is None when nothing
+        matched.
+        """
+        trace = request.environ.get(TRACE_KEY)
+        span = trace.span if trace is not None else nospan
+        with span('routing'):
+            result = self.lookup(request.method, path_info)
 
         if not result:
-            # action, handler
-            return None, None
+            return None, None, None, None
 
         request.route = result
         params = result.copy()
         params.pop('controller', None)
         params.pop('action', None)
-      
-        handler = None
-        controller = result.get('controller')
-        controller = self.controllers.get(controller, controller)
+
+        name = result.get('controller')
+        action = result.get('action')
+        policy = self.cache_policies.get((name, action))
+        if policy is not None and request.method in ('GET', 'HEAD'):
+            key = policy.key(name, params, request.environ)
+            entry = self.response_cache.get(key)
+            if entry is not None:
+                # a hit skips the controller and the param binding
+                return name, action, entry.replay, {}
+
+        controller = self.controllers.get(name, name)
         if controller:
             if isinstance(controller, classtype):
                 controller = controller()
+                if name in self.instances:
+                    self.instances[name] += 1
+            elif isinstance(controller, ControllerPool):
+                pool, controller = controller, controller.acquire()
+                serving.controller_lease = (pool, controller)
 
-        action = result.get('action')
         if action is not None:
             handler = getattr(controller, action, None)
         else:
             handler = controller
 
-        if request.method == 'GET':
-            reqparams = request.GET.mixed()
-        elif request.method != 'HEAD':
-            reqparams = request.POST.mixed()
-        else:
-            reqparams = {}
+        if handler is None:
+            return name, action, None, None
+
+        plan = self.plans.get((name, action))
+        if plan is None:
+            plan = self.plans[(name, action)] = HandlerPlan(handler)
+            if plan.cache is not None and policy is None:
+                self.cache_policies[(name, action)] = plan.cache
+            if plan.coalesce is not None:
+                self.coalesce_policies.setdefault((name, action), plan.coalesce)
+
+        with span('params'):
+            if not plan.wants_params(params):
+                # leave the query string and wsgi.input alone
+                reqparams = {}
+            elif request.method == 'GET':
+                reqparams = request.GET.mixed()
+            elif request.method != 'HEAD':
+                limits = self.route_upload_limits.get((name, action), self.upload_limits)
+                if is_multipart(request.environ):
+                    # streamed, the files are spooled to disk
+                    reqparams = parse_multipart(request, limits)
+                else:
+                    limits.check_length(request.environ)
+                    reqparams = request.POST.mixed()
+            else:
+                reqparams = {}
+
+            kwargs = plan.bind(params, reqparams)
+        if request.method in ('GET', 'HEAD'):
+            if policy is not None:
+                handler = self.response_cache.filler(key, policy, params, handler)
+            coalesce = self.coalesce_policies.get((name, action))
+            if coalesce is not None:
+                handler = self.flights.wrap(coalesce.key(name, request), coalesce, handler)
+            if plan.version is not None:
+                # checked first, a 304 is never cached nor shared
+                handler = versioned(plan.version, handler)
+        return name, action, handler, kwargs
+
+
+class ControllerPool(object):
+
+    """A bounded pool of controller instances shared by the greenlets.
+
+    The instances are made on demand up to ``size``, once all of them are in
+    use the next request waits for one to be released.
+    """
 
-        reqparams.update(params)
-        handler = PageHandler(handler, **reqparams)
+    def __init__(self, factory, size=8):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self.exhausted = 0
+        self.idle = LifoQueue()
 
-        return action, handler
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+        if self.created < self.size:
+            instance = self.factory()
+            self.created += 1
+            return instance
+        self.exhausted += 1
+        return self.idle.get()
+
+    def release(self, instance):
+        self.idle.put(instance)
+
+    def stats(self):
+        return {'lifecycle': 'pooled', 'instances': self.created, 'size': self.size,
+                'idle': self.idle.qsize(), 'exhausted': self.exhausted}
+
+
+class HandlerPlan(object):
+
+    """The arguments a page handler accepts, inspected once when the route
+    is connected.
+
+    ``bind`` picks the handler arguments from the route and request params
+    and raises the 404 or 400 that :func:`test_callable_spec` would work out
+    from a ``TypeError``, without calling ``inspect`` per request.
+
+    The request params are only parsed when the handler takes an argument the
+    route does not supply, and never for a handler marked with
+    :func:`solo.web.util.raw_body`. ``cache`` and ``coalesce`` are the
+    policies of a handler marked with :func:`solo.web.util.cached` or
+    :func:`solo.web.util.coalesce`, ``version`` is the version key of
+    :func:`solo.web.util.etag`.
+    """
 
+    __slots__ = ('args', 'required', 'defaults', 'varkw', 'raw_body', 'cache', 'coalesce', 'version')
+
+    def __init__(self, handler):
+        skip = inspect.ismethod(handler)
+        # look through decorators like ``jsonify`` to the page handler itself
+        func = getattr(handler, '__wrapped__', handler)
+        self.raw_body = bool(getattr(handler, 'raw_body', False)
+                             or getattr(func, 'raw_body', False))
+        self.cache = getattr(handler, 'response_cache', None) or getattr(func, 'response_cache', None)
+        self.coalesce = getattr(handler, 'coalesce', None) or getattr(func, 'coalesce', None)
+        self.version = getattr(handler, 'etag_version', None) or getattr(func, 'etag_version', None)
+        try:
+            (args, varargs, varkw, defaults) = inspect.getargspec(func)
+        except TypeError:
+            try:
+                (args, varargs, varkw,
+                 defaults) = inspect.getargspec(func.__call__)
+                skip = True
+            except (AttributeError, TypeError):
+                # not introspectable, hand over every param like before
+                (args, varargs, varkw, defaults) = ([], None, True, None)
+
+        if skip and args:
+            args = args[1:]
+        defaults = defaults or ()
+        self.args = frozenset(args)
+        self.required = tuple(args[:len(args) - len(defaults)])
+        self.defaults = dict(zip(args[len(args) - len(defaults):], defaults))
+        self.varkw = bool(varkw)
+
+    def wants_params(self, params):
+        """Whether the request params have to be parsed for the handler."""
+        if self.raw_body:
+            return False
+        if self.varkw:
+            return True
+        for arg in self.args:
+            if arg not in params:
+                return True
+        return False
+
+    def bind(self, params, reqparams):
+        """Returns the keyword arguments for the handler.
+
+        ``params`` are the route params, they win over the request
+        params ``reqparams``.
+        """
+        reqparams.update(params)
+        kwargs = reqparams
+
+        missing = [arg for arg in self.required if arg not in kwargs]
+        if missing:
+            raise exc.HTTPNotFound("Missing parameters: %s" % ",".join(missing))
+
+        if not self.varkw:
+            args = self.args
+            extra = [key for key in kwargs if key not in args]
+            if extra:
+                # the route params are part of the URI: 404 Not Found
+                extra_qs_params = [key for key in extra if key in params]
+                if extra_qs_params:
+                    raise exc.HTTPNotFound("Unexpected query string "
+                                           "parameters: %s" % ", ".join(extra_qs_params))
+                raise exc.HTTPBadRequest("Unexpected body parameters: "
+                                         "%s" % ", ".join(extra))
+        return kwargs
 
 
 class PageHandler(object):
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The ETag validators of the dynamic responses.
+
+``App(etag=True)`` sets a strong ETag, the md5 of the body, on the 200
+responses of the GET requests and answers a matching ``If-None-Match`` with a
+304. A page handler marked with :func:`solo.web.util.etag` supplies a cheap
+version key instead, which is checked before the handler runs.
+"""
+
+from hashlib import md5
+
+from solo.web.ctx import serving
+
+
+def matches(if_none_match, tag):
+    """Returns the tag of the If-None-Match header value which matches the
+    ETag, or the ETag of its compressed representation, or None."""
+    if not if_none_match:
+        return None
+    for value in if_none_match.split(','):
+        value = value.strip()
+        if value == '*':
+            return tag
+        if value.startswith('W/'):
+            value = value[2:]
+        value = value.strip('"')
+        if value == tag or (value.startswith(tag) and value[len(tag):] in ('-gzip', '-deflate')):
+            return value
+    return None
+
+
+def not_modified(response, tag):
+    """Turn the response into a 304 with the matched tag, the suffixed ETag
+    when the client holds the compressed representation."""
+    response.status = '304 Not Modified'
+    response.body = ''
+    # a 304 has no content, so no Content-Type
+    response.content_type = None
+    response.etag = tag
+
+
+def conditional(request, response):
+    """Set the content hash ETag of a response unless it has one, and turn
+    it into a 304 when the request already has it."""
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return
+    tag = response.etag
+    if tag is None:
+        tag = response.etag = md5(response.body).hexdigest()
+    matched = matches(request.environ.get('HTTP_IF_NONE_MATCH'), tag)
+    if matched:
+        not_modified(response, matched)
+
+
+def versioned(version, handler):
+    """Wraps the page handler of a version key, the handler is skipped when
+    the request already has the version."""
+    def run(**kwargs):
+        tag = str(version(**kwargs))
+        response = serving.response
+        response.etag = tag
+        matched = matches(serving.request.environ.get('HTTP_IF_NONE_MATCH'), tag)
+        if matched:
+            not_modified(response, matched)
+            return ''
+        return handler(**kwargs)
+    return run
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The fast path request and response of ``App(fast=True)``.
+
+:class:`FastRequest` reads the method, path, headers, cookies and query
+string lazily straight from the WSGI environ, and :class:`FastResponse`
+keeps a status, a content type and a body. Touching any other attribute turns
+them into a full webob ``Request`` or ``Response``, which then replaces them
+in the request context, so the handlers that only read a few params and
+return a string never allocate webob objects.
+"""
+
+from urlparse import parse_qsl
+from urllib import unquote
+
+from webob import Request, Response
+from webob.util import status_reasons
+from webob.headers import EnvironHeaders
+from webob.multidict import MultiDict
+
+from solo.web.ctx import serving
+
+
+def mutating(name):
+    """A Params method changing the params: it runs on the webob GET of the
+    environ, then the params are its items again."""
+    def method(self, *args, **kwargs):
+        full = Request(self.environ)
+        full.charset = self.charset
+        full = full.GET
+        result = getattr(full, name)(*args, **kwargs)
+        dict.clear(self)
+        for key, value in full.items():
+            dict.setdefault(self, key, []).append(value)
+        return result
+    method.__name__ = name
+    return method
+
+
+class Params(dict):
+
+    """The query string params, a dict of name => list of values.
+
+    The other ``MultiDict`` methods run on a ``MultiDict`` of the params, the
+    ones changing them on the webob GET of the environ, which writes the query
+    string back, so a full Request made later has the same params.
+    """
+
+    def __init__(self, environ, charset):
+        dict.__init__(self)
+        self.environ = environ
+        self.charset = charset
+
+    def get(self, name, default=None):
+        values = dict.get(self, name)
+        return values[-1] if values else default
+
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name)[-1]
+
+    def getall(self, name):
+        return dict.get(self, name, [])
+
+    def items(self):
+        return [(name, value) for name, values in dict.items(self) for value in values]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def values(self):
+        return [value for values in dict.values(self) for value in values]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def mixed(self):
+        """Returns a dict, the names with several values get a list."""
+        return dict((name, values[0] if len(values) == 1 else values[:])
+                    for name, values in dict.items(self))
+
+    def copy(self):
+        return MultiDict(self.items())
+
+    __setitem__ = mutating('__setitem__')
+    __delitem__ = mutating('__delitem__')
+    add = mutating('add')
+    extend = mutating('extend')
+    update = mutating('update')
+    setdefault = mutating('setdefault')
+    pop = mutating('pop')
+    popitem = mutating('popitem')
+    clear = mutating('clear')
+
+    def __getattr__(self, name):
+        return getattr(MultiDict(self.items()), name)
+
+
+class Headers(object):
+
+    """A read only, case insensitive view of the request headers in environ.
+
+    The other methods run on the webob ``EnvironHeaders`` of the environ.
+    """
+
+    __slots__ = ('environ', )
+
+    def __init__(self, environ):
+        self.environ = environ
+
+    @staticmethod
+    def key(name):
+        name = name.upper().replace('-', '_')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            return name
+        return 'HTTP_' + name
+
+    def get(self, name, default=None):
+        return self.environ.get(self.key(name), default)
+
+    def __getitem__(self, name):
+        return self.environ[self.key(name)]
+
+    def __contains__(self, name):
+        return self.key(name) in self.environ
+
+    def __iter__(self):
+        return iter(EnvironHeaders(self.environ))
+
+    def __getattr__(self, name):
+        return getattr(EnvironHeaders(self.environ), name)
+
+
+class FastRequest(object):
+
+    """A lazy request over the environ, see the module doc."""
+
+    __slots__ = ('environ', 'charset', 'route', '_GET', '_cookies', '_full')
+
+    def __init__(self, environ, charset='utf8'):
+        object.__setattr__(self, 'environ', environ)
+        object.__setattr__(self, 'charset', charset)
+        object.__setattr__(self, 'route', None)
+        object.__setattr__(self, '_GET', None)
+        object.__setattr__(self, '_cookies', None)
+        object.__setattr__(self, '_full', None)
+
+    @property
+    def method(self):
+        return self.environ['REQUEST_METHOD']
+
+    @property
+    def path_info(self):
+        return self.environ.get('PATH_INFO', '').decode(self.charset, 'replace')
+
+    @property
+    def script_name(self):
+        return self.environ.get('SCRIPT_NAME', '').decode(self.charset, 'replace')
+
+    @property
+    def path(self):
+        return self.script_name + self.path_info
+
+    @property
+    def query_string(self):
+        return self.environ.get('QUERY_STRING', '')
+
+    @property
+    def headers(self):
+        return Headers(self.environ)
+
+    @property
+    def GET(self):
+        params = self._GET
+        if params is None:
+            charset = self.charset
+            params = Params(self.environ, charset)
+            for name, value in parse_qsl(self.query_string, keep_blank_values=True):
+                dict.setdefault(params, name.decode(charset, 'replace'), []).append(
+                    value.decode(charset, 'replace'))
+            object.__setattr__(self, '_GET', params)
+        return params
+
+    @property
+    def params(self):
+        if self.method in ('GET', 'HEAD'):
+            return self.GET
+        return self.upgrade().params
+
+    @property
+    def cookies(self):
+        cookies = self._cookies
+        if cookies is None:
+            cookies = {}
+            for pair in self.environ.get('HTTP_COOKIE', '').split(';'):
+                name, sep, value = pair.partition('=')
+                name = name.strip()
+                if sep and name:
+                    value = value.strip()
+                    if len(value) > 1 and value[0] == value[-1] == '"':
+                        value = value[1:-1]
+                    cookies[name] = unquote(value).decode(self.charset, 'replace')
+            object.__setattr__(self, '_cookies', cookies)
+        return cookies
+
+    def upgrade(self):
+        """Returns the full webob Request of the environ."""
+        full = self._full
+        if full is None:
+            full = Request(self.environ)
+            full.charset = self.charset
+            if self.route is not None:
+                full.route = self.route
+            object.__setattr__(self, '_full', full)
+            if getattr(serving, 'request', None) is self:
+                serving.request = full
+        return full
+
+    def __getattr__(self, name):
+        return getattr(self.upgrade(), name)
+
+    def __setattr__(self, name, value):
+        if name in ('charset', 'route'):
+            object.__setattr__(self, name, value)
+            if self._full is not None:
+                setattr(self._full, name, value)
+        else:
+            setattr(self.upgrade(), name, value)
+
+
+class FastResponse(object):
+
+    """A status, a content type, an ETag and a str body, see the module
+    doc."""
+
+    __slots__ = ('status', 'content_type', 'etag', 'body', '_full')
+
+    def __init__(self):
+        object.__setattr__(self, 'status', '200 OK')
+        object.__setattr__(self, 'content_type', 'text/html; charset=UTF-8')
+        object.__setattr__(self, 'etag', None)
+        object.__setattr__(self, 'body', '')
+        object.__setattr__(self, '_full', None)
+
+    def _get_status_code(self):
+        return int(self.status.split(' ', 1)[0])
+
+    def _set_status_code(self, code):
+        self.upgrade().status_code = code
+
+    status_code = property(_get_status_code, _set_status_code)
+
+    def _set_text(self, text):
+        self.body = text.encode('utf8')
+
+    text = property(lambda self: self.body.decode('utf8'), _set_text)
+
+    @property
+    def headerlist(self):
+        if self._full is not None:
+            return self._full.headerlist
+        headers = [('Content-Length', str(len(self.body)))]
+        if self.content_type is not None:
+            headers.insert(0, ('Content-Type', self.content_type))
+        if self.etag is not None:
+            headers.append(('ETag', '"%s"' % (self.etag)))
+        return headers
+
+    def upgrade(self):
+        """Returns the full webob Response with the same status, content type
+        and body."""
+        full = self._full
+        if full is None:
+            full = Response(body=self.body, status=self.status)
+            if self.content_type is not None:
+                full.headers['Content-Type'] = self.content_type
+            if self.etag is not None:
+                full.etag = self.etag
+            object.__setattr__(self, '_full', full)
+            # the reads fall through __getattr__ to the full response now
+            for name in ('status', 'content_type', 'etag', 'body'):
+                object.__delattr__(self, name)
+            if getattr(serving, 'response', None) is self:
+                serving.response = full
+        return full
+
+    def __getattr__(self, name):
+        return getattr(self.upgrade(), name)
+
+    def __setattr__(self, name, value):
+        if self._full is not None:
+            setattr(self._full, name, value)
+        elif name in ('status', 'content_type', 'etag', 'body', 'text'):
+            if name == 'body' and type(value) is not str:
+                raise TypeError('You can only set the body to a str')
+            if name == 'status' and isinstance(value, (int, long)):
+                # start_response takes a str status like webob's
+                value = '%d %s' % (value, status_reasons.get(value, 'Unknown'))
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.upgrade(), name, value)
+
+    def __call__(self, environ, start_response):
+        if self._full is not None:
+            return self._full(environ, start_response)
+        body = self.body
+        start_response(self.status, self.headerlist)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        return [body]
+
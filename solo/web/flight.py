@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Single flight of the GET requests.
+
+The concurrent GET requests of a route connected with ``coalesce=True``, or
+a page handler marked with :func:`solo.web.util.coalesce`, wait on the first
+one's handler run and all of them receive its response.
+
+.. code-block:: python
+
+    route.connect('feed', '/feed/{name}', controller=ctl, action='feed',
+                  coalesce=dict(params=['page']))
+"""
+
+from gevent.event import Event
+
+from solo.web.ctx import serving
+from solo.web.cache import CacheEntry, capture
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+class CoalescePolicy(object):
+
+    """Which requests of a route share a handler run.
+
+    The requests with the same method, path and values of the query params
+    named in ``params`` are coalesced, the whole query string counts when
+    ``params`` is None. A waiting request gives up after ``timeout`` seconds
+    and runs the handler itself.
+    """
+
+    __slots__ = ('params', 'timeout')
+
+    def __init__(self, params=None, timeout=None):
+        if isinstance(params, basestring):
+            params = [params]
+        self.params = tuple(params) if params is not None else None
+        self.timeout = timeout
+
+    @classmethod
+    def make(cls, coalesce):
+        """Returns the policy of a ``connect(coalesce=...)`` value: True, a
+        dict of the policy arguments or a policy."""
+        if not coalesce or isinstance(coalesce, cls):
+            return coalesce or None
+        if isinstance(coalesce, dict):
+            return cls(**coalesce)
+        return cls()
+
+    def key(self, name, request):
+        environ = request.environ
+        if self.params is None:
+            selected = environ.get('QUERY_STRING', '')
+        else:
+            get = request.GET.get
+            selected = tuple([get(param) for param in self.params])
+        return (name, environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''), selected)
+
+
+class Flight(object):
+
+    """A handler run the coalesced requests wait on."""
+
+    __slots__ = ('event', 'entry', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = Event()
+        self.entry = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+
+    """The handler runs in flight keyed by :meth:`CoalescePolicy.key`."""
+
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.unshared = 0
+
+    def wrap(self, key, policy, handler):
+        """Wraps the page handler of a coalesced route.
+
+        The request joins the flight of the key in progress when there is
+        one, else it leads a new flight. A response with a streamed body can
+        not be shared, the waiting requests then run the handler themselves.
+        """
+        def run(**kwargs):
+            flight = self.flights.get(key)
+            if flight is None:
+                return self.lead(key, handler, kwargs)
+
+            flight.waiters += 1
+            if not flight.event.wait(policy.timeout):
+                self.timeouts += 1
+                return handler(**kwargs)
+            if flight.error is not None:
+                self.coalesced += 1
+                raise flight.error
+            if flight.entry is None:
+                self.unshared += 1
+                return handler(**kwargs)
+            self.coalesced += 1
+            return flight.entry.replay()
+        return run
+
+    def lead(self, key, handler, kwargs):
+        flight = self.flights[key] = Flight()
+        self.leaders += 1
+        try:
+            body = handler(**kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            if flight.waiters:
+                flight.entry = self.share(body)
+            return body
+        finally:
+            del self.flights[key]
+            flight.event.set()
+
+    def share(self, body):
+        response = serving.response
+        try:
+            captured = capture(response, body)
+        except Exception:
+            LOGGER.exception('Failed to share the response')
+            return None
+        if captured is None:
+            return None
+        # the cookies of the leading client stay with it
+        return CacheEntry(response.status, captured[0], body, 0, (), captured[1])
+
+    def stats(self):
+        return {'in_flight': len(self.flights), 'leaders': self.leaders,
+                'coalesced': self.coalesced, 'timeouts': self.timeouts,
+                'unshared': self.unshared}
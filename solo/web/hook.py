@@ -79,6 +79,48 @@ class Hook(object):
                               for k, v in self.kwargs.items()])))
 
 
+def noop():
+    pass
+
+
+def run_hooks(hooks):
+    """Execute the Hooks in turn, see :meth:`HookMap.run`."""
+    error = None
+    for hook in hooks:
+        # Some hooks are guaranteed to run even if others at
+        # the same hookpoint fail. We will still log the failure,
+        # but proceed on to the next hook. The only way
+        # to stop all processing from one of these hooks is
+        # to raise SystemExit and stop the whole server.
+        if error is None or hook.failsafe:
+            try:
+                hook()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except (exc.HTTPRedirection, exc.HTTPException):
+                error = exc_info()[1]
+            except:
+                error = exc_info()[1]
+                LOGGER.exception("Hook Error: %s", error)
+    if error:
+        raise error
+
+
+def chain_hooks(callbacks):
+    """Returns a callable running the (callback, kwargs) pairs in turn,
+    the first error stops the chain."""
+    def run():
+        try:
+            for callback, kwargs in callbacks:
+                callback(**kwargs)
+        except (KeyboardInterrupt, SystemExit, exc.HTTPException):
+            raise
+        except:
+            LOGGER.exception("Hook Error: %s", exc_info()[1])
+            raise
+    return run
+
+
 class HookMap(dict):
 
     """A map of call points to lists of callbacks (Hook objects)."""
@@ -101,26 +143,26 @@ class HookMap(dict):
 
     def run(self, point):
         """Execute all registered Hooks (callbacks) for the given point."""
-        exc = None
-        hooks = self.get(point, [])
-        for hook in hooks:
-            # Some hooks are guaranteed to run even if others at
-            # the same hookpoint fail. We will still log the failure,
-            # but proceed on to the next hook. The only way
-            # to stop all processing from one of these hooks is
-            # to raise SystemExit and stop the whole server.
-            if exc is None or hook.failsafe:
-                try:
-                    hook()
-                except (KeyboardInterrupt, SystemExit):
-                    raise
-                except (exc.HTTPRedirection, exc.HTTPException):
-                    exc = exc_info()[1]
-                except:
-                    exc = exc_info()[1]
-                    LOGGER.exception("Hook Error: %s", exc)
-        if exc:
-            raise exc
+        run_hooks(self.get(point, []))
+
+    def compile(self, point):
+        """Returns a callable which runs the Hooks of the point like
+        :meth:`run`, a no-op when there is no Hook to run.
+
+        A point without a failsafe Hook gets a tight loop over the callbacks,
+        the others keep the failsafe bookkeeping.
+        """
+        hooks = self.get(point)
+        if not hooks:
+            return noop
+        hooks = hooks[:]
+        if any(hook.failsafe for hook in hooks):
+            return lambda: run_hooks(hooks)
+        return chain_hooks([(hook.callback, hook.kwargs) for hook in hooks])
+
+    def freeze(self, points):
+        """Compile each point, returns a dict of point => callable."""
+        return dict((point, self.compile(point)) for point in points)
 
     def __copy__(self):
         newmap = self.__class__()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The counters, gauges and histograms of an App.
+
+.. code-block:: python
+
+    app = App(metrics=True)
+    app.metrics.connect(app.route(), '/metrics')
+
+The samples are kept in preallocated lists, recording one is a dict lookup
+of the label values and an add, the histogram buckets are found by bisection.
+"""
+
+from bisect import bisect_left
+from time import time
+
+from solo.web.ctx import response
+from solo.web.hook import noop
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = ['%s="%s"' % (name, escape(value)) for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append('%s="%s"' % extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+
+    """A metric family, the samples of each label values are a child."""
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames:
+            self.children[()] = self.child()
+
+    def child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Returns the child of the label values."""
+        try:
+            return self.children[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError('%s takes the labels %s' % (self.name, ', '.join(self.labelnames)))
+            child = self.children[values] = self.child()
+            return child
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self.render_child(values, child))
+        return lines
+
+    def render_child(self, values, child):
+        return ['%s%s %s' % (self.name, format_labels(self.labelnames, values),
+                             format_value(child.value))]
+
+
+class _Value(object):
+
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(Metric):
+
+    kind = 'counter'
+    child = _Value
+
+    def inc(self, amount=1):
+        self.children[()].value += amount
+
+
+class Gauge(Metric):
+
+    kind = 'gauge'
+    child = _Value
+
+    def inc(self, amount=1):
+        self.children[()].value += amount
+
+    def dec(self, amount=1):
+        self.children[()].value -= amount
+
+    def set(self, value):
+        self.children[()].value = value
+
+
+class _Buckets(object):
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # the last one counts the samples over the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+
+    """A histogram of fixed bucket upper bounds."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        Metric.__init__(self, name, help, labelnames)
+
+    def child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def render_child(self, values, child):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), child.counts):
+            total += count
+            lines.append('%s_bucket%s %d' % (self.name, format_labels(self.labelnames, values,
+                                                                     ('le', format_value(float(bound)))), total))
+        labels = format_labels(self.labelnames, values)
+        lines.append('%s_sum%s %s' % (self.name, labels, format_value(child.sum)))
+        lines.append('%s_count%s %d' % (self.name, labels, child.count))
+        return lines
+
+
+class Registry(object):
+
+    """The metrics in the order they were registered."""
+
+    def __init__(self):
+        self.metrics = []
+        self.names = {}
+
+    def register(self, metric):
+        if metric.name in self.names:
+            raise ValueError('The metric %s is already registered' % (metric.name))
+        self.metrics.append(metric)
+        self.names[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name):
+        return self.names.get(name)
+
+    def render(self):
+        """Returns the metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics(object):
+
+    """The request metrics recorded by an App, in a :class:`Registry` the
+    application may add its own metrics to."""
+
+    status_classes = dict((code, '%dxx' % (code // 100)) for code in range(100, 600))
+
+    def __init__(self, registry=None, buckets=DEFAULT_BUCKETS):
+        self.registry = registry = registry or Registry()
+        self.requests = registry.counter('solo_requests_total', 'The requests by route and status class',
+                                         ('route', 'status'))
+        self.handler_seconds = registry.histogram('solo_handler_seconds', 'The page handler latency by route',
+                                                  ('route', ), buckets)
+        self.hook_seconds = registry.histogram('solo_hook_seconds', 'The hook latency by hookpoint',
+                                               ('point', ), buckets)
+        self.in_flight = registry.gauge('solo_requests_in_flight', 'The requests being served')
+        self.asset_bytes = registry.counter('solo_asset_bytes_total', 'The bytes of the asset files sent')
+
+    def start(self):
+        self.in_flight.children[()].value += 1
+
+    def call(self, route, handler, kwargs, clock=time):
+        """Call the page handler of the route, observes its latency."""
+        started = clock()
+        try:
+            return handler(**kwargs)
+        finally:
+            elapsed = clock() - started
+            histogram = self.handler_seconds
+            (histogram.children.get((route, )) or histogram.labels(route)).observe(elapsed)
+
+    def end(self, route, status):
+        """Count a finished request of the route, None when no route matched."""
+        self.in_flight.children[()].value -= 1
+        key = (route or '', self.status_classes.get(status, 'other'))
+        counter = self.requests
+        (counter.children.get(key) or counter.labels(*key)).value += 1
+
+    def instrument(self, chains):
+        """Wraps the hook chains of the hookpoints which have hooks, they
+        observe their latency."""
+        return dict((point, chain if chain is noop else timed(self.hook_seconds.labels(point).observe, chain, time))
+                    for point, chain in chains.items())
+
+    def connect(self, dispatcher, path='/metrics', name='metrics'):
+        """Connect the route of the metrics page."""
+        dispatcher.connect(name, path, controller=self, action='page')
+
+    def page(self):
+        response.content_type = 'text/plain; version=0.0.4; charset=UTF-8'
+        return self.registry.render()
+
+
+def timed(observe, chain, clock):
+    """Wraps a hook chain, observes how long it takes."""
+    def run():
+        started = clock()
+        try:
+            chain()
+        finally:
+            observe(clock() - started)
+    return run
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Host several App instances in one process.
+
+.. code-block:: python
+
+    mount = AppMount()
+    mount.mount('/api', ApiApp())
+    mount.mount('/admin', AdminApp(), host='admin.example.com')
+    mount.asset('/static', '/path/to/static')
+    WebServer(('127.0.0.1', 8080), mount, log=None).start()
+"""
+
+from webob import exc
+
+from solo.web.app import App
+from solo.web.dispatcher import RoutesDispatcher
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+class _Node(object):
+
+    __slots__ = ('children', 'app', 'prefix')
+
+    def __init__(self):
+        self.children = {}
+        self.app = None
+        self.prefix = None
+
+
+class AppMount(object):
+
+    """A WSGI app which passes each request to the App mounted on the longest
+    matching path prefix, the prefix moves from ``PATH_INFO`` to ``SCRIPT_NAME``
+    before the App matches any route.
+
+    The apps are kept in a path segment trie for each host name, the apps
+    mounted without a host serve any host.
+    """
+
+    def __init__(self):
+        self.hosts = {}
+        self.root = _Node()
+
+    def mount(self, prefix, app, host=None):
+        """Mount the WSGI app under the path prefix, and only for the host
+        name when given"""
+        prefix = prefix.rstrip('/')
+        if prefix and not prefix.startswith('/'):
+            raise ValueError('The mount prefix %s shall start with /' % (prefix))
+
+        if host is None:
+            node = self.root
+        else:
+            host = host.lower()
+            node = self.hosts.get(host)
+            if node is None:
+                node = self.hosts[host] = _Node()
+
+        for segment in prefix.split('/')[1:]:
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _Node()
+            node = child
+        if node.app is not None:
+            raise ValueError('%s is already mounted' % (prefix or '/'))
+        node.app = app
+        node.prefix = prefix
+
+    def asset(self, prefix, asset_path, default_filename=None, block_size=None, host=None):
+        """Mount a static directory, its requests skip route matching"""
+        from solo.web.asset import AssetController
+        ctl = AssetController(asset_path, default_filename, block_size)
+        app = App('asset', dispatcher=AssetDispatcher(ctl))
+        self.mount(prefix, app, host)
+        return app
+
+    def find(self, host, path_info):
+        """Returns the mounted node of the longest prefix or None."""
+        if host:
+            node = self.hosts.get(host.split(':', 1)[0].lower())
+            if node is not None:
+                found = self._walk(node, path_info)
+                if found is not None:
+                    return found
+        return self._walk(self.root, path_info)
+
+    def _walk(self, node, path_info):
+        found = node if node.app is not None else None
+        for segment in path_info.split('/')[1:]:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.app is not None:
+                found = node
+        return found
+
+    def __call__(self, environ, start_response):
+        path_info = environ.get('PATH_INFO', '')
+        node = self.find(environ.get('HTTP_HOST'), path_info)
+        if node is None:
+            return exc.HTTPNotFound('Path %s Not Found' % (path_info))(environ, start_response)
+
+        if node.prefix:
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + node.prefix
+            # the bare prefix is the root of the mounted app
+            environ['PATH_INFO'] = path_info[len(node.prefix):] or '/'
+        return node.app(environ, start_response)
+
+
+class AssetDispatcher(RoutesDispatcher):
+
+    """Serves every GET and HEAD request from an AssetController without
+    matching any route"""
+
+    def __init__(self, controller):
+        RoutesDispatcher.__init__(self)
+        self.asset = controller
+
+    def dispatch(self, request, path_info):
+        if request.method not in ('GET', 'HEAD'):
+            return None, None, None, None
+        path = path_info[1:] if path_info.startswith('/') else path_info
+        request.route = {'controller': 'asset', 'action': 'asset', 'path': path}
+        return 'asset', 'asset', self.asset.asset, {'path': path}
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The streaming parser of the multipart/form-data bodies.
+
+The body is read from ``wsgi.input`` in chunks, the fields are kept in
+memory and the files are spooled to temporary files once they grow over
+``spool_size``. A page handler gets an :class:`UploadFile` for each file:
+
+.. code-block:: python
+
+    route.connect('upload', '/upload', controller=ctl, action='upload',
+                  upload=dict(max_body=512 * MB, max_parts=10))
+
+    def upload(self, title, attachment):
+        attachment.save('/var/uploads/' + safe_name(attachment.filename))
+"""
+
+from cgi import parse_header
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+
+from webob import exc
+from webob.multidict import MultiDict
+
+from solo.web.ctx import serving
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+KB = 1024
+MB = 1024 * KB
+
+
+class UploadLimits(object):
+
+    """The limits of the request bodies of a route.
+
+    ``max_body`` bounds any request body, ``max_parts`` the parts of a
+    multipart body and ``max_field`` the size of a field which is not a
+    file. A file is kept in memory up to ``spool_size`` bytes, the body is
+    read ``chunk_size`` bytes at a time.
+    """
+
+    __slots__ = ('max_body', 'max_parts', 'max_field', 'spool_size', 'chunk_size')
+
+    def __init__(self, max_body=100 * MB, max_parts=100, max_field=MB, spool_size=MB, chunk_size=64 * KB):
+        self.max_body = max_body
+        self.max_parts = max_parts
+        self.max_field = max_field
+        self.spool_size = spool_size
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def make(cls, upload):
+        """Returns the limits of a ``connect(upload=...)`` value: a dict of
+        the limit arguments or the limits."""
+        if upload is None or isinstance(upload, cls):
+            return upload
+        return cls(**upload)
+
+    def check_length(self, environ):
+        """Raise a 413 when the Content-Length is over ``max_body``."""
+        length = environ.get('CONTENT_LENGTH')
+        if length and self.max_body is not None and int(length) > self.max_body:
+            raise exc.HTTPRequestEntityTooLarge('The request body is over %d bytes' % (self.max_body))
+
+
+class UploadFile(object):
+
+    """A file of a multipart body, a file object positioned at its start.
+
+    It has the ``name``, ``filename``, ``type``, ``file`` and ``value`` of
+    a ``cgi.FieldStorage``, the file is closed when the request ends.
+    """
+
+    def __init__(self, name, filename, content_type, spool_size):
+        self.name = name
+        self.filename = filename
+        self.type = content_type
+        self.size = 0
+        self.file = SpooledTemporaryFile(max_size=spool_size)
+
+    def write(self, data):
+        self.size += len(data)
+        self.file.write(data)
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def readline(self, *args):
+        return self.file.readline(*args)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def __iter__(self):
+        return iter(self.file)
+
+    @property
+    def value(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def save(self, path):
+        """Copy the file to the path."""
+        self.file.seek(0)
+        with open(path, 'wb') as f:
+            copyfileobj(self.file, f)
+        self.file.seek(0)
+
+    def close(self):
+        self.file.close()
+
+    def __repr__(self):
+        return '<UploadFile %s %r (%d bytes)>' % (self.name, self.filename, self.size)
+
+
+def is_multipart(environ):
+    return environ.get('CONTENT_TYPE', '').startswith('multipart/form-data')
+
+
+def read_chunks(stream, length, limits):
+    """Yields the chunks of the body, the whole body when its length is
+    unknown, up to ``max_body`` bytes."""
+    max_body = limits.max_body
+    chunk_size = limits.chunk_size
+    read = 0
+    while length is None or read < length:
+        size = chunk_size if length is None else min(chunk_size, length - read)
+        chunk = stream.read(size)
+        if not chunk:
+            if length is not None:
+                raise exc.HTTPBadRequest('The request body is truncated')
+            return
+        read += len(chunk)
+        if max_body is not None and read > max_body:
+            raise exc.HTTPRequestEntityTooLarge('The request body is over %d bytes' % (max_body))
+        yield chunk
+
+
+class MultipartParser(object):
+
+    """Parse a multipart/form-data body chunk by chunk, the buffer never
+    holds more than a chunk and a boundary."""
+
+    max_header = 16 * KB
+
+    def __init__(self, chunks, boundary, limits, charset='utf8'):
+        self.chunks = chunks
+        self.boundary = boundary
+        self.limits = limits
+        self.charset = charset
+        self.buffer = ''
+
+    def fill(self):
+        for chunk in self.chunks:
+            self.buffer += chunk
+            return True
+        return False
+
+    def parse(self):
+        """Returns the fields, a ``MultiDict`` of the field values and the
+        :class:`UploadFile` objects in body order, and the files."""
+        params = MultiDict()
+        files = []
+        try:
+            self.parse_parts(params, files)
+        except Exception:
+            for upload in files:
+                upload.close()
+            raise
+        return params, files
+
+    def parse_parts(self, params, files):
+        delimiter = '--' + self.boundary
+        # the preamble
+        self.skip_to(delimiter)
+        separator = '\r\n' + delimiter
+        parts = 0
+        while True:
+            while len(self.buffer) < 2:
+                if not self.fill():
+                    raise exc.HTTPBadRequest('The multipart body is truncated')
+            if self.buffer.startswith('--'):
+                # the epilogue is ignored
+                return
+            if not self.buffer.startswith('\r\n'):
+                raise exc.HTTPBadRequest('Malformed multipart body')
+            self.buffer = self.buffer[2:]
+
+            parts += 1
+            if self.limits.max_parts is not None and parts > self.limits.max_parts:
+                raise exc.HTTPRequestEntityTooLarge('The multipart body has over %d parts'
+                                                    % (self.limits.max_parts))
+            name, filename, content_type = self.read_headers()
+            if filename is not None:
+                value = UploadFile(name, filename, content_type, self.limits.spool_size)
+                files.append(value)
+                self.read_body(separator, value.write)
+                value.seek(0)
+            else:
+                data = []
+                size = [0]
+
+                def write(chunk):
+                    size[0] += len(chunk)
+                    if self.limits.max_field is not None and size[0] > self.limits.max_field:
+                        raise exc.HTTPRequestEntityTooLarge('The field %s is over %d bytes'
+                                                            % (name, self.limits.max_field))
+                    data.append(chunk)
+                self.read_body(separator, write)
+                value = ''.join(data).decode(self.charset, 'replace')
+            params.add(name, value)
+
+    def skip_to(self, delimiter):
+        while True:
+            i = self.buffer.find(delimiter)
+            if i >= 0:
+                self.buffer = self.buffer[i + len(delimiter):]
+                return
+            self.buffer = self.buffer[-len(delimiter):]
+            if not self.fill():
+                raise exc.HTTPBadRequest('The multipart body has no boundary')
+
+    def read_headers(self):
+        while True:
+            i = self.buffer.find('\r\n\r\n')
+            if i >= 0:
+                break
+            if len(self.buffer) > self.max_header:
+                raise exc.HTTPBadRequest('The part headers are too long')
+            if not self.fill():
+                raise exc.HTTPBadRequest('The multipart body is truncated')
+        lines, self.buffer = self.buffer[:i], self.buffer[i + 4:]
+
+        headers = {}
+        for line in lines.split('\r\n'):
+            key, sep, value = line.partition(':')
+            if sep:
+                headers[key.strip().lower()] = value.strip()
+        disposition, options = parse_header(headers.get('content-disposition', ''))
+        if disposition != 'form-data' or 'name' not in options:
+            raise exc.HTTPBadRequest('The part has no form-data name')
+        charset = self.charset
+        name = options['name'].decode(charset, 'replace')
+        filename = options.get('filename')
+        if filename is not None:
+            filename = filename.decode(charset, 'replace')
+        return name, filename, headers.get('content-type', 'text/plain')
+
+    def read_body(self, separator, write):
+        keep = len(separator) - 1
+        while True:
+            i = self.buffer.find(separator)
+            if i >= 0:
+                if i:
+                    write(self.buffer[:i])
+                self.buffer = self.buffer[i + len(separator):]
+                return
+            if len(self.buffer) > keep:
+                # the tail may be the start of the separator
+                write(self.buffer[:-keep])
+                self.buffer = self.buffer[-keep:]
+            if not self.fill():
+                raise exc.HTTPBadRequest('The multipart body is truncated')
+
+
+def parse_multipart(request, limits):
+    """Parse the multipart/form-data body of the request, returns a dict like
+    ``MultiDict.mixed()``. The files are closed when the request ends, see
+    :func:`close_uploads`.
+
+    The fields are cached as webob does, so ``request.POST`` and
+    ``request.params`` never read the consumed body again.
+    """
+    environ = request.environ
+    content_type, options = parse_header(environ.get('CONTENT_TYPE', ''))
+    boundary = options.get('boundary')
+    if not boundary or len(boundary) > 200:
+        raise exc.HTTPBadRequest('The multipart body has no valid boundary')
+    limits.check_length(environ)
+
+    length = environ.get('CONTENT_LENGTH')
+    stream = environ['wsgi.input']
+    chunks = read_chunks(stream, int(length) if length else None, limits)
+    params, files = MultipartParser(chunks, boundary, limits, request.charset or 'utf8').parse()
+    if files:
+        serving.uploads = files
+    environ['webob._parsed_post_vars'] = (params, stream)
+    return params.mixed()
+
+
+def close_uploads():
+    """Close the upload files of the request."""
+    files = serving.pop('uploads')
+    if files:
+        for upload in files:
+            try:
+                upload.close()
+            except Exception:
+                LOGGER.exception('Failed to close the upload %r', upload)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Profile a fraction of the live requests.
+
+.. code-block:: python
+
+    app = App(profiler=Profiler('/var/tmp/solo-profiles', fraction=0.01, mode='sample'))
+
+A request is profiled at random with the probability ``fraction``, or when
+it has the trigger header, ``X-Solo-Profile: 1``. The profiles are merged
+per route and written every ``interval`` seconds, by a greenlet of its own
+so the request that crosses the interval does not wait on the disk:
+
+- ``mode='cprofile'`` profiles with cProfile, one request at a time since
+  cProfile hooks the whole thread, so the greenlets it switches to are in
+  its profile too. It writes ``<route>.pstats``.
+- ``mode='sample'`` samples the stack of the profiled greenlets on the
+  ``SIGPROF`` interval timer, so it only runs in the main thread. It writes
+  ``<route>.collapsed``, the input of flamegraph.pl, and ``<route>.pstats``
+  worked out from the samples.
+"""
+
+import os
+import os.path
+import marshal
+import random
+import signal
+from collections import defaultdict
+from time import time
+
+import cProfile
+import pstats
+
+import gevent
+from greenlet import getcurrent
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+def frame_label(code):
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def stats_key(code):
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class Profiler(object):
+
+    """The profiler of an App, see the module doc."""
+
+    modes = ('cprofile', 'sample')
+
+    def __init__(self, directory, fraction=0.0, header='X-Solo-Profile', mode='cprofile',
+                 interval=60, sample_interval=0.005):
+        if mode not in self.modes:
+            raise ValueError('Unknown profiler mode: %s' % (mode))
+        self.directory = directory
+        self.fraction = fraction
+        self.environ_key = 'HTTP_' + header.upper().replace('-', '_')
+        self.mode = mode
+        self.interval = interval
+        self.sample_interval = sample_interval
+        self.next_dump = time() + interval
+        self.profiled = 0
+        # route => pstats.Stats of the cprofile mode
+        self.stats = {}
+        # route => {stack of code objects: samples} of the sample mode
+        self.samples = defaultdict(lambda: defaultdict(int))
+        # greenlet => its samples of the sample mode
+        self.active = {}
+        self.cprofile = None
+        self.previous_handler = None
+        # the greenlet writing the profiles
+        self.dumper = None
+
+    def start(self, environ):
+        """Returns the session of a profiled request, or None."""
+        if self.environ_key not in environ and (not self.fraction or random.random() >= self.fraction):
+            return None
+        if self.mode == 'cprofile':
+            if self.cprofile is not None:
+                # another request holds the thread profile hook
+                return None
+            self.cprofile = session = cProfile.Profile()
+            session.enable()
+        else:
+            session = defaultdict(int)
+            if not self.active:
+                self.arm()
+            self.active[getcurrent()] = session
+        return session
+
+    def stop(self, session, route):
+        """End the profile of a request and merge it into the route's."""
+        route = route or 'unmatched'
+        if self.mode == 'cprofile':
+            session.disable()
+            self.cprofile = None
+            stats = self.stats.get(route)
+            if stats is None:
+                self.stats[route] = pstats.Stats(session)
+            else:
+                stats.add(session)
+        else:
+            self.active.pop(getcurrent(), None)
+            if not self.active:
+                self.disarm()
+            merged = self.samples[route]
+            for stack, count in session.items():
+                merged[stack] += count
+        self.profiled += 1
+
+        if time() >= self.next_dump and self.dumper is None:
+            self.next_dump = time() + self.interval
+            self.dumper = gevent.spawn(self.dump)
+
+    def arm(self):
+        try:
+            self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+            # restart the system calls the samples interrupt, no EINTR in the I/O
+            signal.siginterrupt(signal.SIGPROF, False)
+            signal.setitimer(signal.ITIMER_PROF, self.sample_interval, self.sample_interval)
+        except ValueError:
+            LOGGER.error('The sample profiler only runs in the main thread')
+
+    def disarm(self):
+        try:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            if self.previous_handler is not None:
+                signal.signal(signal.SIGPROF, self.previous_handler)
+                self.previous_handler = None
+        except ValueError:
+            pass
+
+    def sample(self, signum, frame):
+        session = self.active.get(getcurrent())
+        if session is None:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        session[tuple(stack)] += 1
+
+    def dump(self):
+        """Write the merged profiles of each route to the directory."""
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            for route, stats in self.stats.items():
+                stats.dump_stats(self.path(route, 'pstats'))
+            for route, samples in self.samples.items():
+                with open(self.path(route, 'collapsed'), 'w') as f:
+                    for stack, count in sorted(samples.items()):
+                        f.write('%s %d\n' % (';'.join(frame_label(code) for code in stack), count))
+                with open(self.path(route, 'pstats'), 'wb') as f:
+                    marshal.dump(self.sample_stats(samples), f)
+        except Exception:
+            LOGGER.exception('Failed to write the profiles to %s', self.directory)
+        finally:
+            self.dumper = None
+
+    def path(self, route, ext):
+        name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in route)
+        return os.path.join(self.directory, '%s.%s' % (name, ext))
+
+    def sample_stats(self, samples):
+        """The pstats dict of the samples: a sample is a call, self time
+        goes to the innermost frame and total time to each frame on the
+        stack."""
+        seconds = self.sample_interval
+        calls = defaultdict(int)
+        own = defaultdict(int)
+        total = defaultdict(int)
+        callers = defaultdict(lambda: defaultdict(int))
+        for stack, count in samples.items():
+            keys = [stats_key(code) for code in stack]
+            own[keys[-1]] += count
+            for key in set(keys):
+                total[key] += count
+            for caller, callee in zip(keys, keys[1:]):
+                callers[callee][caller] += count
+            calls[keys[-1]] += count
+        stats = {}
+        for key in total:
+            stats[key] = (calls[key] or 1, calls[key] or 1, own[key] * seconds, total[key] * seconds,
+                          dict(callers[key]))
+        return stats
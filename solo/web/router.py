@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+A compiled route table built from a ``routes.Mapper``.
+
+``routes.Mapper.match`` tries the regular expression of each route in turn,
+so the lookup cost grows with the number of connected routes. The
+:class:`CompiledRouter` indexes the same routes by HTTP method, keeps the
+literal paths in a hash table and the parameterised paths in a segment trie.
+The trie only narrows the candidates down: every candidate is still checked
+with the route's own ``match``, in the order the mapper would try it, so the
+returned match dict is the same one ``routes.Mapper`` returns.
+
+The reverse direction is a :class:`UrlBuilder`, it turns the params of one
+route into its URL with a single string format.
+"""
+
+import logging
+from urllib import quote, urlencode
+
+LOGGER = logging.getLogger('solo.web')
+
+
+class _Node(object):
+
+    """A segment trie node."""
+
+    __slots__ = ('children', 'wild', 'leaves', 'tails')
+
+    def __init__(self):
+        self.children = {}
+        # the child node for a segment holding a single ``:var``
+        self.wild = None
+        # the routes that end exactly at this node
+        self.leaves = []
+        # the routes which can not be indexed deeper than this node
+        self.tails = []
+
+    def insert(self, segments, entry):
+        node = self
+        for segment in segments:
+            if segment is None:
+                # the segment is a plain variable, matches any non empty segment
+                if node.wild is None:
+                    node.wild = _Node()
+                node = node.wild
+            elif segment is _TAIL:
+                node.tails.append(entry)
+                return
+            else:
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = _Node()
+                node = child
+        node.leaves.append(entry)
+
+    def collect(self, segments, i, out):
+        if self.tails:
+            out.extend(self.tails)
+        if i == len(segments):
+            out.extend(self.leaves)
+            return
+        segment = segments[i]
+        child = self.children.get(segment)
+        if child is not None:
+            child.collect(segments, i + 1, out)
+        if self.wild is not None and segment:
+            self.wild.collect(segments, i + 1, out)
+
+
+_TAIL = object()
+
+
+def route_segments(route):
+    """Split a route into trie keys.
+
+    A literal segment is kept as a string, a segment holding a single plain
+    ``:var`` (no requirement) becomes ``None``, and anything the trie can not
+    index (requirements, ``*`` or format variables, mixed segments) ends the
+    key with a tail marker.
+    """
+    if route.minimization:
+        return [_TAIL]
+
+    segments = [[]]
+    for part in route.routelist:
+        if isinstance(part, dict):
+            segments[-1].append(part)
+            continue
+        pieces = part.split('/')
+        segments[-1].append(pieces[0])
+        for piece in pieces[1:]:
+            segments.append([piece])
+
+    keys = []
+    for tokens in segments:
+        tokens = [t for t in tokens if t != '']
+        if all(not isinstance(t, dict) for t in tokens):
+            keys.append(''.join(tokens))
+            continue
+        if len(tokens) == 1:
+            var = tokens[0]
+            if (var['type'] == ':' and var['name'] != 'controller'
+                    and not route.reqs.get(var['name'])):
+                keys.append(None)
+                continue
+        keys.append(_TAIL)
+        break
+    return keys
+
+
+def route_ranks(mapper):
+    """Returns the order in which ``mapper`` tries its routes."""
+    groups = getattr(mapper, '_prefix2routes', None)
+    if groups is None:
+        # older routes releases try the routes in the order they were connected
+        return dict((route, i) for i, route in enumerate(mapper.matchlist))
+
+    # routes >= 2.3 tries the longest static prefix group first
+    ranks = {}
+    for prefix in sorted(groups, key=len, reverse=True):
+        for route in groups[prefix]:
+            ranks[route] = len(ranks)
+    return ranks
+
+
+def route_methods(route):
+    """Returns the methods the route is conditioned on, or None for any."""
+    conditions = route.conditions
+    if not conditions or 'method' not in conditions:
+        return None
+    methods = conditions['method']
+    if isinstance(methods, basestring):
+        return [methods]
+    return list(methods)
+
+
+class _Table(object):
+
+    """The literal path table and the segment trie for one HTTP method."""
+
+    __slots__ = ('static', 'trie')
+
+    def __init__(self):
+        self.static = {}
+        self.trie = _Node()
+
+    def candidates(self, url):
+        if url.endswith('\n'):
+            # ``$`` also matches before a trailing newline
+            url = url[:-1]
+        out = []
+        self.trie.collect(url.split('/'), 0, out)
+        if len(out) > 1:
+            out.sort()
+        return out
+
+
+class CompiledRouter(object):
+
+    """A method-indexed hash table and segment trie over a ``routes.Mapper``.
+
+    The router compiles itself lazily and again whenever routes were
+    connected to the mapper since the last compile.
+    """
+
+    def __init__(self, mapper):
+        self.mapper = mapper
+        self.tables = None
+        self.any_table = None
+        self.size = -1
+
+    def compile(self):
+        mapper = self.mapper
+        mapper.create_regs()
+
+        ranks = route_ranks(mapper)
+        entries = []
+        methods = set()
+        for route in mapper.matchlist:
+            if route.static:
+                continue
+            accepts = route_methods(route)
+            if accepts:
+                methods.update(accepts)
+            entries.append(((ranks[route], route), accepts, route_segments(route)))
+        entries.sort()
+
+        tables = dict((method, _Table()) for method in methods)
+        any_table = _Table()
+        for entry, accepts, segments in entries:
+            if accepts is None:
+                targets = tables.values() + [any_table]
+            else:
+                targets = [tables[method] for method in accepts]
+            for table in targets:
+                table.trie.insert(segments, entry)
+
+        # A literal path goes into the hash table only when no route the
+        # mapper tries before it could match the same path.
+        for method, table in tables.items() + [(None, any_table)]:
+            environ = {'REQUEST_METHOD': method} if method else None
+            for entry, accepts, segments in entries:
+                if None in segments or _TAIL in segments:
+                    continue
+                if accepts is not None and method not in accepts:
+                    continue
+                self._add_static(table, entry, segments, environ)
+
+        self.tables = tables
+        self.any_table = any_table
+        self.size = len(mapper.matchlist)
+        LOGGER.debug('Compiled %d routes for %d methods', len(entries), len(tables))
+
+    def _add_static(self, table, entry, segments, environ):
+        path = '/'.join(segments)
+        if path in table.static:
+            return
+        rank, route = entry
+        for other in table.candidates(path):
+            if other[0] >= rank:
+                break
+            if other[1].regmatch.match(path):
+                return
+
+        result = None
+        mapper = self.mapper
+        if not mapper.sub_domains and not (route.conditions
+                                           and 'function' in route.conditions):
+            # nothing in the match dict depends on the request, keep it
+            result = route.match(path, environ)
+            if not isinstance(result, dict):
+                return
+        table.static[path] = (route, result)
+
+    def match(self, url, environ):
+        """Match a URL, returns the match dict or None like ``Mapper.match``."""
+        result = self.routematch(url, environ)
+        if result is None:
+            return None
+        return result[0]
+
+    def routematch(self, url, environ):
+        """Match a URL, returns a tuple of match dict and route or None."""
+        mapper = self.mapper
+        if mapper.prefix or mapper.always_scan:
+            # rewriting the url or the regexps is the mapper's own business
+            return mapper.routematch(url, environ)
+
+        if self.size != len(mapper.matchlist):
+            self.compile()
+
+        table = self.tables.get(environ['REQUEST_METHOD'], self.any_table)
+        hit = table.static.get(url)
+        if hit is not None:
+            route, result = hit
+            if result is not None:
+                return result.copy(), route
+
+        for _, route in table.candidates(url):
+            result = route.match(url, environ, mapper.sub_domains,
+                                 mapper.sub_domains_ignore, mapper.domain_match)
+            if isinstance(result, dict) or result:
+                return result, route
+        return None
+
+
+def _encode(value, encoding):
+    if isinstance(value, unicode):
+        return value.encode(encoding)
+    if isinstance(value, str):
+        return value
+    return unicode(value).encode(encoding)
+
+
+class UrlBuilder(object):
+
+    """Builds the URL of a route for one set of param names.
+
+    The route path is turned into a ``%(name)s`` format string once, the
+    params that are not part of the path go into the query string.
+    """
+
+    __slots__ = ('route', 'template', 'path_keys', 'query_keys', 'defaults', 'reqs', 'encoding')
+
+    def __init__(self, route, keys):
+        self.route = route
+        self.encoding = route.encoding or 'utf-8'
+        path_keys = [part['name'] for part in route.routelist if isinstance(part, dict)]
+        self.path_keys = tuple(key for key in path_keys if key in keys)
+        self.query_keys = tuple(sorted(key for key in keys if key not in route.maxkeys
+                                       and key not in ('controller', 'action')))
+        self.defaults = {}
+        for key in path_keys:
+            if key in keys:
+                continue
+            if key in route.dotkeys:
+                self.defaults[key] = ''
+            elif route.defaults.get(key) is not None:
+                self.defaults[key] = quote(_encode(route.defaults[key], self.encoding), '/')
+            else:
+                raise ValueError('Route %s needs the %s param' % (route.name, key))
+        self.reqs = tuple((key, route.req_regs[key]) for key in self.path_keys
+                          if key in route.req_regs)
+
+        if route.minimization:
+            # the minimized url depends on the values, leave it to routes
+            self.template = None
+        else:
+            template = route.regpath
+            if not template.startswith('/'):
+                template = '/' + template
+            self.template = template
+
+    def __call__(self, params):
+        if self.template is None:
+            url = self.route.generate(**params)
+            if url is False:
+                raise ValueError('Can not build the url of route %s with %r' % (self.route.name, params))
+            return url
+
+        for key, reg in self.reqs:
+            if not reg.match(unicode(params[key])):
+                raise ValueError('The %s param of route %s does not match %s' % (
+                    key, self.route.name, reg.pattern))
+
+        encoding = self.encoding
+        values = self.defaults.copy()
+        for key in self.path_keys:
+            value = quote(_encode(params[key], encoding), '/')
+            if key in self.route.dotkeys and value:
+                value = '.' + value
+            values[key] = value
+        url = self.template % values
+
+        if self.query_keys:
+            query = []
+            for key in self.query_keys:
+                value = params[key]
+                if isinstance(value, (tuple, list)):
+                    query.extend((key, _encode(v, encoding)) for v in value)
+                else:
+                    query.append((key, _encode(value, encoding)))
+            url += '?' + urlencode(query)
+        return url
@@ -36,8 +36,12 @@ class WebServer(object):
         self.httpd = WSGIServer(*self.args, **self.kwargs)
         self.httpd.serve_forever()
 
-    def stop(self):
-        """Stop the HTTP server."""
+    def stop(self, timeout=None):
+        """Stop the HTTP server, then wait at most ``timeout`` seconds for
+        the deferred tasks of the application."""
         LOGGER.debug('Stoping Gevent WSGI Server...')
         self.ready = False
-        self.httpd.stop()
\ No newline at end of file
+        self.httpd.stop(timeout)
+        shutdown = getattr(self.httpd.application, 'shutdown', None)
+        if shutdown is not None:
+            shutdown(timeout)
\ No newline at end of file
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The Server-Sent Events and their broadcast hub.
+
+.. code-block:: python
+
+    hub = EventHub(buffer_size=64, heartbeat=15)
+
+    class Jobs(object):
+
+        def events(self, job):
+            return hub.stream(['jobs', 'job.' + job])
+
+    hub.publish('job.42', json_encode(status), event='status')
+
+An :class:`EventStream` is detached from its request: the request ends,
+its context, admission slot and in flight count are released once the
+headers are sent, an idle subscriber only costs its connection greenlet
+and its buffer. A subscriber whose buffer is full is dropped, the
+publisher never waits on it.
+"""
+
+from collections import deque
+
+import gevent
+from gevent.event import Event
+from webob import exc
+
+from solo.web.ctx import serving
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+HEARTBEAT = ': ping\n\n'
+
+
+def format_event(data, event=None, id=None, retry=None):
+    """Returns the bytes of an event, a data line for each line of data."""
+    if isinstance(data, unicode):
+        data = data.encode('utf8')
+    lines = []
+    if id is not None:
+        lines.append('id: %s' % (id))
+    if event is not None:
+        lines.append('event: %s' % (event))
+    if retry is not None:
+        lines.append('retry: %d' % (retry))
+    lines.extend('data: ' + line for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStream(object):
+
+    """The body of a subscriber, it waits for the events of its topics.
+
+    It is the ``app_iter`` of the response and is ``detached``, see the
+    module doc.
+    """
+
+    __slots__ = ('hub', 'topics', 'buffer', 'event', 'closed')
+
+    detached = True
+
+    def __init__(self, hub, topics, first):
+        self.hub = hub
+        self.topics = topics
+        # the server sends the headers with the first chunk
+        self.buffer = deque([first])
+        self.event = Event()
+        self.closed = False
+
+    def push(self, message):
+        """Buffer a message, returns False when the buffer is full."""
+        buffer = self.buffer
+        if len(buffer) >= self.hub.buffer_size:
+            return False
+        buffer.append(message)
+        self.event.set()
+        return True
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        buffer = self.buffer
+        while not buffer:
+            if self.closed:
+                raise StopIteration
+            self.event.clear()
+            self.event.wait()
+        return buffer.popleft()
+
+    __next__ = next  # py3
+
+    def end(self):
+        """End the stream once the buffered events are sent."""
+        self.closed = True
+        self.event.set()
+
+    def close(self):
+        self.end()
+        self.hub.unsubscribe(self)
+
+
+class EventHub(object):
+
+    """Broadcast the events of the topics to their subscribers.
+
+    A subscriber buffers ``buffer_size`` events at most, it is dropped when
+    one more comes. The idle subscribers get a heartbeat comment every
+    ``heartbeat`` seconds, so the proxies keep their connection open and a
+    gone client is noticed. ``retry`` is the reconnection delay in
+    milliseconds sent to the clients, at most ``max_subscribers`` may
+    subscribe.
+    """
+
+    def __init__(self, buffer_size=64, heartbeat=15, retry=3000, max_subscribers=None):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self.retry = retry
+        self.max_subscribers = max_subscribers
+        # topic => set of EventStream
+        self.topics = {}
+        self.subscribers = set()
+        self.beater = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, topics):
+        """Returns a new EventStream of the topics."""
+        if isinstance(topics, basestring):
+            topics = [topics]
+        if self.max_subscribers is not None and len(self.subscribers) >= self.max_subscribers:
+            raise exc.HTTPServiceUnavailable('Too many subscribers', headers={'Retry-After': '10'})
+        first = 'retry: %d\n\n' % (self.retry) if self.retry is not None else HEARTBEAT
+        stream = EventStream(self, tuple(topics), first)
+        for topic in stream.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is None:
+                subscribers = self.topics[topic] = set()
+            subscribers.add(stream)
+        self.subscribers.add(stream)
+        if self.beater is None and self.heartbeat:
+            self.beater = gevent.spawn(self.beat)
+        return stream
+
+    def stream(self, topics):
+        """Subscribe the current request to the topics, returns the body of
+        its response."""
+        response = serving.response
+        response.content_type = 'text/event-stream'
+        response.headers['Cache-Control'] = 'no-cache'
+        # the nginx buffering holds the events back
+        response.headers['X-Accel-Buffering'] = 'no'
+        return self.subscribe(topics)
+
+    def unsubscribe(self, stream):
+        if stream not in self.subscribers:
+            return
+        self.subscribers.discard(stream)
+        for topic in stream.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(stream)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def publish(self, topic, data, event=None, id=None):
+        """Send an event to the subscribers of the topic, returns how many
+        got it. The data is formatted once for all of them."""
+        subscribers = self.topics.get(topic)
+        self.published += 1
+        if not subscribers:
+            return 0
+        message = format_event(data, event, id)
+        delivered = 0
+        for stream in list(subscribers):
+            if stream.push(message):
+                delivered += 1
+            else:
+                self.drop(stream)
+        self.delivered += delivered
+        return delivered
+
+    def drop(self, stream):
+        """Drop a slow subscriber, it may reconnect."""
+        self.dropped += 1
+        LOGGER.info('Dropped a slow subscriber of %s', ', '.join(stream.topics))
+        self.unsubscribe(stream)
+        stream.end()
+
+    def beat(self):
+        try:
+            while self.subscribers:
+                gevent.sleep(self.heartbeat)
+                for stream in list(self.subscribers):
+                    if not stream.buffer:
+                        stream.push(HEARTBEAT)
+        finally:
+            self.beater = None
+
+    def close(self):
+        """End all the streams."""
+        for stream in list(self.subscribers):
+            self.unsubscribe(stream)
+            stream.end()
+        if self.beater is not None:
+            self.beater.kill(block=False)
+
+    def stats(self):
+        return {'subscribers': len(self.subscribers), 'topics': len(self.topics),
+                'published': self.published, 'delivered': self.delivered, 'dropped': self.dropped}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The tasks a page handler defers until its response is sent.
+
+.. code-block:: python
+
+    app = App(tasks=TaskQueue(workers=10, max_queue=1000, overflow='drop', timeout=30))
+
+    def update(self, id, title):
+        save(id, title)
+        defer(audit, 'update', id)
+        return 'ok'
+
+The deferred tasks of a request are queued when the request ends and run
+on the worker greenlets of the App's :class:`TaskQueue`. They only run after
+a response below 400: the tasks of a failed request are cancelled, like the
+audit of an update which raised.
+"""
+
+from time import time
+
+import gevent
+from gevent import Timeout
+from gevent.event import Event
+from gevent.queue import Queue, Full
+from webob import exc
+
+from solo.web.ctx import serving
+from solo.web.metrics import Counter, Gauge, Histogram
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+TASK_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+
+def task_name(fn):
+    return getattr(fn, '__name__', fn.__class__.__name__)
+
+
+class TaskQueue(object):
+
+    """A bounded queue of tasks run by ``workers`` greenlets.
+
+    When the ``max_queue`` tasks are waiting the ``overflow`` policy
+    applies to a new task: ``drop`` drops it, ``inline`` runs it right away
+    in the submitting greenlet and ``reject`` makes :func:`defer` raise a
+    503. A task running longer than ``timeout`` seconds is killed.
+    """
+
+    overflows = ('drop', 'inline', 'reject')
+
+    def __init__(self, workers=10, max_queue=1000, overflow='drop', timeout=30, buckets=TASK_BUCKETS):
+        if overflow not in self.overflows:
+            raise ValueError('Unknown task overflow policy: %s' % (overflow))
+        self.workers = workers
+        self.overflow = overflow
+        self.timeout = timeout
+        self.queue = Queue(max_queue)
+        self.greenlets = []
+        # the queued and running tasks, idle is set when there is none
+        self.pending = 0
+        self.idle = Event()
+        self.idle.set()
+        self.closed = False
+
+        self.queued = Gauge('solo_tasks_queued', 'The deferred tasks waiting in the queue')
+        self.tasks = Counter('solo_tasks_total', 'The deferred tasks by outcome', ('outcome', ))
+        self.wait_seconds = Histogram('solo_task_wait_seconds', 'The time the tasks waited in the queue',
+                                      buckets=buckets)
+        self.run_seconds = Histogram('solo_task_seconds', 'The run time of the tasks', buckets=buckets)
+
+    def register(self, registry):
+        """Add the task metrics to a :class:`solo.web.metrics.Registry`."""
+        for metric in (self.queued, self.tasks, self.wait_seconds, self.run_seconds):
+            registry.register(metric)
+
+    def count(self, outcome):
+        counter = self.tasks
+        (counter.children.get((outcome, )) or counter.labels(outcome)).inc()
+
+    def full(self, extra=0):
+        """Whether the queue has no room left for ``extra`` more tasks."""
+        maxsize = self.queue.maxsize
+        return maxsize is not None and self.queue.qsize() + extra >= maxsize
+
+    def submit(self, fn, args=(), kwargs=None):
+        """Queue a task, returns whether it was queued or run. A full queue
+        runs it right away with the inline policy, else drops it."""
+        if self.closed:
+            LOGGER.warning('The task queue is closed, task %s dropped', task_name(fn))
+            self.count('dropped')
+            return False
+        if len(self.greenlets) < self.workers:
+            self.spawn()
+        try:
+            self.queue.put_nowait((fn, args, kwargs or {}, time()))
+        except Full:
+            if self.overflow == 'inline':
+                self.count('inline')
+                self.run(fn, args, kwargs or {})
+                return True
+            if self.overflow == 'reject':
+                # it filled up after defer checked it, the response is sent
+                LOGGER.warning('The task queue is full, task %s rejected after its response', task_name(fn))
+                self.count('rejected')
+            else:
+                LOGGER.warning('The task queue is full, task %s dropped', task_name(fn))
+                self.count('dropped')
+            return False
+        self.pending += 1
+        self.idle.clear()
+        self.queued.inc()
+        return True
+
+    def spawn(self):
+        self.greenlets.append(gevent.spawn(self.work))
+
+    def work(self):
+        queue = self.queue
+        while True:
+            fn, args, kwargs, queued = queue.get()
+            self.queued.dec()
+            self.wait_seconds.observe(time() - queued)
+            try:
+                self.run(fn, args, kwargs)
+            finally:
+                self.pending -= 1
+                if not self.pending:
+                    self.idle.set()
+
+    def run(self, fn, args, kwargs):
+        started = time()
+        timeout = Timeout.start_new(self.timeout) if self.timeout else None
+        try:
+            fn(*args, **kwargs)
+        except Timeout as e:
+            if e is not timeout:
+                raise
+            LOGGER.error('Task %s timed out after %ss', task_name(fn), self.timeout)
+            self.count('timeout')
+        except Exception:
+            LOGGER.exception('Task %s failed', task_name(fn))
+            self.count('failed')
+        else:
+            self.count('done')
+        finally:
+            if timeout is not None:
+                timeout.cancel()
+            self.run_seconds.observe(time() - started)
+
+    def drain(self, timeout=None):
+        """Stop taking tasks and wait for the queued ones to finish, returns
+        whether they all did."""
+        self.closed = True
+        drained = self.idle.wait(timeout)
+        for greenlet in self.greenlets:
+            greenlet.kill(block=False)
+        self.greenlets = []
+        return drained
+
+    def stats(self):
+        outcomes = dict((outcome, child.value) for (outcome, ), child in self.tasks.children.items())
+        return {'queued': self.queue.qsize(), 'pending': self.pending, 'workers': len(self.greenlets),
+                'outcomes': outcomes, 'run_seconds': self.run_seconds.children[()].sum}
+
+
+def defer(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the task queue of the App once the
+    current request ends, the response is already sent by then.
+
+    With the reject policy a queue without room for the tasks of the request
+    raises a 503 right here, while the handler can still answer. The task is
+    cancelled when the response is an error, see the module doc.
+    """
+    app = serving.get('app')
+    if app is None:
+        raise RuntimeError('Tasks are deferred in a request only')
+    tasks = app.tasks
+    deferred = serving.get('deferred')
+    if tasks.overflow == 'reject' and tasks.full(len(deferred) if deferred else 0):
+        tasks.count('rejected')
+        raise exc.HTTPServiceUnavailable('The task queue is full')
+    if deferred is None:
+        deferred = serving.deferred = []
+    deferred.append((fn, args, kwargs))
+
+
+def submit_deferred(tasks):
+    """Queue the tasks the request deferred, or cancel them when its
+    response is an error."""
+    deferred = serving.pop('deferred')
+    if deferred:
+        status = serving.response.status_code
+        if status >= 400:
+            LOGGER.info('The request failed with %d, its %d deferred tasks are cancelled', status, len(deferred))
+            for _ in deferred:
+                tasks.count('cancelled')
+            return
+        for fn, args, kwargs in deferred:
+            try:
+                tasks.submit(fn, args, kwargs)
+            except Exception:
+                LOGGER.exception('Failed to queue the task %s', task_name(fn))
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The phase spans of the requests.
+
+.. code-block:: python
+
+    app = App(tracer=Tracer(threshold=0.5, exporter=JSONFileExporter('/var/tmp/solo.trace.json')))
+
+    def report(self, day):
+        with span('load', {'day': day}):
+            rows = load(day)
+
+A traced request has a span for each phase of :meth:`App.__call__`, the
+routing and the param parsing, each hook, the :func:`solo.web.util.jsonify`
+encoding and :func:`solo.web.util.render_template`, and the spans the page
+handlers open with :func:`span`.
+A request slower than ``threshold`` seconds logs its spans, the exporter
+gets every trace.
+"""
+
+import os
+import json
+from binascii import hexlify
+from functools import wraps
+from itertools import count
+from time import time
+
+from solo.web.ctx import serving
+from solo.web.hook import Hook, HookMap
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+# the environ key of the Trace of a request
+TRACE_KEY = 'solo.trace'
+
+# whether a Tracer was made, span is a no-op until then
+enabled = False
+
+
+class Span(object):
+
+    """A timed phase of a request, a context manager ending it."""
+
+    __slots__ = ('trace', 'name', 'attrs', 'parent', 'start', 'end')
+
+    def __init__(self, trace, name, attrs, parent):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.start = time()
+        self.end = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    @property
+    def duration(self):
+        return (self.end or time()) - self.start
+
+    @property
+    def depth(self):
+        depth, parent = 0, self.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        return depth
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, cls, e, tb):
+        if cls is not None:
+            self.attrs['error'] = cls.__name__
+        self.trace.finish(self)
+
+
+class NoSpan(object):
+
+    """The span of an untraced request."""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, cls, e, tb):
+        pass
+
+
+NOSPAN = NoSpan()
+
+
+def nospan(name, attrs=None):
+    return NOSPAN
+
+
+def nophase(name):
+    pass
+
+
+class Trace(object):
+
+    """The spans of a request, the first one spans the whole request."""
+
+    def __init__(self, name='request', attrs=None):
+        self.id = hexlify(os.urandom(8))
+        self.spans = []
+        self.stack = []
+        self.current_phase = None
+        self.root = self.span(name, attrs)
+
+    def span(self, name, attrs=None):
+        """Open a span in the innermost open one, ``attrs`` is a dict of
+        its attributes."""
+        stack = self.stack
+        span = Span(self, name, attrs or {}, stack[-1] if stack else None)
+        self.spans.append(span)
+        stack.append(span)
+        return span
+
+    def finish(self, span):
+        """End the span and the spans still open in it."""
+        if span.end is not None:
+            return
+        now = time()
+        stack = self.stack
+        while stack:
+            last = stack.pop()
+            last.end = now
+            if last is span:
+                break
+
+    def phase(self, name):
+        """End the current phase of the request and start the next one."""
+        if self.current_phase is not None:
+            self.finish(self.current_phase)
+        self.current_phase = self.span(name)
+
+    def end(self):
+        self.finish(self.root)
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+    def format(self):
+        """The span tree, a line per span."""
+        lines = []
+        for span in self.spans:
+            attrs = ' '.join('%s=%s' % item for item in sorted(span.attrs.items()))
+            lines.append('%s%s %.3fms %s' % ('  ' * span.depth, span.name, span.duration * 1000, attrs))
+        return '\n'.join(line.rstrip() for line in lines)
+
+
+def current():
+    """Returns the Trace of the current request, or None."""
+    if not enabled:
+        return None
+    try:
+        return serving.request.environ.get(TRACE_KEY)
+    except AttributeError:
+        return None
+
+
+def span(name, attrs=None):
+    """Open a span of the current request, use it as a context manager. It
+    is a no-op out of a traced request."""
+    trace = current()
+    if trace is None:
+        return NOSPAN
+    return trace.span(name, attrs)
+
+
+def traced(name, attrs=None):
+    """The decorator runs the function in a span of the current request."""
+    def decorator(f):
+        @wraps(f)
+        def run(*args, **kwargs):
+            with span(name, dict(attrs) if attrs else None):
+                return f(*args, **kwargs)
+        return run
+    return decorator
+
+
+class Tracer(object):
+
+    """Traces the requests of an App.
+
+    A request slower than ``threshold`` seconds, when it is set, logs its
+    span tree. ``exporter`` is an object with an ``export(trace)`` method,
+    like :class:`JSONFileExporter`.
+    """
+
+    def __init__(self, threshold=None, exporter=None):
+        global enabled
+        enabled = True
+        self.threshold = threshold
+        self.exporter = exporter
+        self.traced = 0
+        self.slow = 0
+
+    def begin(self, environ):
+        trace = environ[TRACE_KEY] = Trace('request', {'method': environ.get('REQUEST_METHOD'),
+                                                        'path': environ.get('PATH_INFO')})
+        return trace
+
+    def end(self, trace, route, status):
+        trace.end()
+        trace.root.attrs['route'] = route or ''
+        trace.root.attrs['status'] = status
+        self.traced += 1
+        if self.threshold is not None and trace.duration >= self.threshold:
+            self.slow += 1
+            LOGGER.warning('Slow request %s %s took %.3fms\n%s', trace.root.attrs['method'],
+                           trace.root.attrs['path'], trace.duration * 1000, trace.format())
+        if self.exporter is not None:
+            try:
+                self.exporter.export(trace)
+            except Exception:
+                LOGGER.exception('Failed to export the trace')
+
+    def instrument(self, hooks):
+        """Returns a copy of the HookMap whose hooks run in a span."""
+        instrumented = HookMap()
+        for point, point_hooks in hooks.items():
+            instrumented[point] = [Hook(hook_span(point, hook.callback), hook.failsafe,
+                                        hook.priority, **hook.kwargs) for hook in point_hooks]
+        return instrumented
+
+
+def hook_span(point, callback):
+    name = '%s:%s' % (point, getattr(callback, '__name__', callback.__class__.__name__))
+
+    def run(**kwargs):
+        with span(name):
+            return callback(**kwargs)
+    return run
+
+
+class JSONFileExporter(object):
+
+    """Appends the spans to a file in the Trace Event Format, which
+    chrome://tracing and Perfetto load. Each trace is a thread of the
+    process."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tids = count(1)
+        self.file = None
+
+    def open(self):
+        new = not os.path.exists(self.path) or not os.path.getsize(self.path)
+        self.file = open(self.path, 'a')
+        if new:
+            # the closing bracket of the array is optional in the format
+            self.file.write('[\n')
+
+    def export(self, trace):
+        if self.file is None:
+            self.open()
+        pid = os.getpid()
+        tid = next(self.tids)
+        lines = []
+        for span in trace.spans:
+            args = dict(span.attrs, trace_id=trace.id)
+            lines.append(json.dumps({'name': span.name, 'cat': 'solo', 'ph': 'X',
+                                     'ts': span.start * 1e6, 'dur': span.duration * 1e6,
+                                     'pid': pid, 'tid': tid, 'args': args}, default=str) + ',\n')
+        self.file.write(''.join(lines))
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -17,6 +17,10 @@ from functools import wraps
 from solo.web.ctx import response
 
 from solo.util import json_encode
+from solo.template import render_template as _render_template
+from solo.web.cache import CachePolicy
+from solo.web.flight import CoalescePolicy
+from solo.web.trace import span
 
 def jsonify(f):
     """The decorator will set response content type to application/json; charset=UTF-8,
@@ -24,6 +28,55 @@ def jsonify(f):
     @wraps(f)
     def __(*args, **kwargs):
         response.content_type = 'application/json; charset=UTF-8'
-        return json_encode(f(*args, **kwargs))
+        body = f(*args, **kwargs)
+        with span('json_encode'):
+            return json_encode(body)
+    __.__wrapped__ = f
+    return __
 
-    return __
\ No newline at end of file
+
+def render_template(path, **kwargs):
+    """Render the template like :func:`solo.template.render_template`, in a
+    render_template span of the request trace"""
+    with span('render_template', {'template': path}):
+        return _render_template(path, **kwargs)
+
+
+def raw_body(f):
+    """The decorator marks a page handler which reads the request body itself,
+    the dispatcher then never parses the query string or the POST body, only the
+    route params are passed to it"""
+    f.raw_body = True
+    return f
+
+
+def cached(ttl=60, vary=(), tags=(), statuses=(200, )):
+    """The decorator caches the GET responses of a page handler, see
+    :class:`solo.web.cache.CachePolicy` for the arguments"""
+    policy = CachePolicy(ttl, vary, tags, statuses)
+
+    def decorator(f):
+        f.response_cache = policy
+        return f
+    return decorator
+
+
+def coalesce(params=None, timeout=None):
+    """The decorator lets the concurrent GET requests of a page handler share
+    one run, see :class:`solo.web.flight.CoalescePolicy` for the arguments"""
+    policy = CoalescePolicy(params, timeout)
+
+    def decorator(f):
+        f.coalesce = policy
+        return f
+    return decorator
+
+
+def etag(version):
+    """The decorator sets the ETag of a page handler from a cheap version key,
+    ``version`` is called with the handler arguments. A request which already
+    has the version gets a 304 without running the handler"""
+    def decorator(f):
+        f.etag_version = version
+        return f
+    return decorator
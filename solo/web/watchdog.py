@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# Copyright (C) 2015 Thomas Huang
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The watchdog of the gevent hub.
+
+.. code-block:: python
+
+    app = App(metrics=True, watchdog=HubWatchdog(threshold=0.1))
+
+A greenlet which runs longer than ``threshold`` seconds without switching
+back to the hub, doing CPU work or unpatched blocking I/O, stalls every
+other greenlet. A native thread checks the greenlet switches, it logs the
+stack of the blocking greenlet and the route it serves, and counts the
+blocks and their lag by route.
+"""
+
+import sys
+import atexit
+import traceback
+from collections import deque
+from time import time
+
+import greenlet
+from gevent import get_hub, monkey
+
+from solo.web.ctx import serving
+from solo.web.metrics import Counter, Histogram
+
+import logging
+
+LOGGER = logging.getLogger('solo.web')
+
+
+LAG_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Block(object):
+
+    """A greenlet blocking the hub."""
+
+    __slots__ = ('greenlet', 'started', 'route', 'action', 'stack', 'lag')
+
+    def __init__(self, greenlet, started, route, action, stack):
+        self.greenlet = greenlet
+        self.started = started
+        self.route = route
+        self.action = action
+        self.stack = stack
+        self.lag = None
+
+    def as_dict(self):
+        return {'route': self.route, 'action': self.action, 'lag': self.lag, 'stack': self.stack}
+
+
+class HubWatchdog(object):
+
+    """Watches the hub of the thread it is started in.
+
+    The thread checks every ``interval`` seconds, a quarter of the
+    threshold by default. The last ``history`` blocks are kept with their
+    stacks.
+    """
+
+    def __init__(self, threshold=0.1, interval=None, buckets=LAG_BUCKETS, history=20):
+        self.threshold = threshold
+        self.interval = interval or max(threshold / 4.0, 0.001)
+        self.blocks = Counter('solo_hub_blocks_total', 'The blocks of the gevent hub by route', ('route', ))
+        self.lag = Histogram('solo_hub_lag_seconds', 'The lag of the gevent hub blocks by route',
+                             ('route', ), buckets)
+        self.recent = deque(maxlen=history)
+        self.hub = None
+        self.thread_ident = None
+        self.active = None
+        self.switched = None
+        self.blocking = None
+        self.running = False
+        self.previous_trace = None
+        # held by the thread while it runs
+        self.lock = monkey.get_original('thread', 'allocate_lock')()
+
+    def register(self, registry):
+        """Add the block metrics to a :class:`solo.web.metrics.Registry`."""
+        registry.register(self.blocks)
+        registry.register(self.lag)
+
+    def start(self):
+        if self.running:
+            return
+        self.hub = get_hub()
+        self.thread_ident = monkey.get_original('thread', 'get_ident')()
+        self.active = greenlet.getcurrent()
+        self.switched = time()
+        self.previous_trace = greenlet.settrace(self.trace)
+        self.running = True
+        self.lock.acquire()
+        monkey.get_original('thread', 'start_new_thread')(self.run, ())
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the thread and wait for it to exit."""
+        if not self.running:
+            return
+        self.running = False
+        greenlet.settrace(self.previous_trace)
+        self.previous_trace = None
+        self.lock.acquire()
+        self.lock.release()
+
+    def trace(self, event, args):
+        if event in ('switch', 'throw'):
+            self.active = args[1]
+            self.switched = time()
+        if self.previous_trace is not None:
+            self.previous_trace(event, args)
+
+    def run(self):
+        sleep = monkey.get_original('time', 'sleep')
+        try:
+            while self.running:
+                sleep(self.interval)
+                try:
+                    self.check(time())
+                except Exception:
+                    LOGGER.exception('Hub watchdog error')
+        finally:
+            self.lock.release()
+
+    def check(self, now):
+        active, switched = self.active, self.switched
+        blocking = self.blocking
+        if blocking is not None and (active is not blocking.greenlet or switched != blocking.started):
+            # it switched away at last, within an interval before the last switch
+            self.blocking = None
+            self.end_block(blocking, switched)
+            return
+        if blocking is None and active is not self.hub and now - switched >= self.threshold:
+            self.blocking = self.begin_block(active, switched)
+
+    def begin_block(self, active, switched):
+        route = action = None
+        request = serving.of(active, 'request')
+        if request is not None:
+            match = getattr(request, 'route', None)
+            if match:
+                route, action = match.get('controller'), match.get('action')
+
+        frame = sys._current_frames().get(self.thread_ident)
+        stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+        LOGGER.warning('The greenlet of the route %s blocks the gevent hub for over %.3fs:\n%s',
+                       route or '-', self.threshold, stack)
+        return Block(active, switched, route, action, stack)
+
+    def end_block(self, block, ended):
+        block.lag = ended - block.started
+        route = block.route or ''
+        counter = self.blocks
+        (counter.children.get((route, )) or counter.labels(route)).inc()
+        histogram = self.lag
+        (histogram.children.get((route, )) or histogram.labels(route)).observe(block.lag)
+        self.recent.append(block)
+
+    def stats(self):
+        """Returns the block counts and the lag of each route, and the last
+        blocks with their stacks."""
+        routes = {}
+        for (route, ), child in self.lag.children.items():
+            routes[route] = {'blocks': child.count, 'lag': child.sum}
+        return {'blocks': sum(child.value for child in self.blocks.children.values()),
+                'blocking': self.blocking is not None, 'routes': routes,
+                'recent': [block.as_dict() for block in self.recent]}
@@ -0,0 +1,86 @@
+import unittest
+import gevent
+from webob import Request
+
+from solo.web.app import App
+from solo.web.admission import AdmissionControl, Limiter
+
+
+class LimiterTest(unittest.TestCase):
+
+    def test_aimd(self):
+        limiter = Limiter(4, adaptive=True, target_latency=0.1, max_limit=5)
+        for i in range(4):
+            self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        for i in range(4):
+            limiter.release(0.01)
+        self.assertEqual(limiter.limit, 5)
+        limiter.acquire()
+        limiter.release(1)
+        self.assertEqual(limiter.limit, 4)
+        # one drop per target_latency
+        limiter.acquire()
+        limiter.release(1)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App(admission=AdmissionControl(limit=1, max_queue=1, queue_timeout=0.05, retry_after=3))
+
+        class Slow(object):
+
+            def index(self, delay='0.01'):
+                gevent.sleep(float(delay))
+                return 'done'
+
+        self.app.route().connect('index', '/', controller=Slow(), action='index')
+        self.app.route().connect('report', '/report', controller=Slow(), action='index', max_in_flight=1)
+
+    def get_all(self, *paths):
+        jobs = [gevent.spawn(Request.blank(path).get_response, self.app) for path in paths]
+        gevent.joinall(jobs)
+        return [job.value for job in jobs]
+
+    def test_queue_and_shed(self):
+        first, queued, shed = self.get_all('/', '/', '/')
+        self.assertEqual((first.status_code, queued.status_code, shed.status_code), (200, 200, 503))
+        self.assertEqual(shed.headers['Retry-After'], '3')
+        stats = self.app.admission_stats()
+        self.assertEqual((stats['in_flight'], stats['queued'], stats['rejected']), (0, 0, 1))
+
+    def test_queue_timeout(self):
+        statuses = [res.status_code for res in self.get_all('/?delay=0.1', '/')]
+        self.assertEqual(statuses, [200, 503])
+        self.assertEqual(self.app.admission_stats()['timeouts'], 1)
+
+    def test_deadline_while_queued(self):
+        app = App(deadline=0.05, admission=AdmissionControl(limit=1, max_queue=5, queue_timeout=1))
+
+        class Slow(object):
+
+            def index(self):
+                gevent.sleep(0.1)
+                return 'done'
+
+        app.route().connect('index', '/', controller=Slow(), action='index')
+        self.app = app
+        statuses = [res.status_code for res in self.get_all('/', '/', '/')]
+        self.assertEqual(statuses, [504, 504, 504])
+        stats = app.admission_stats()
+        self.assertEqual((stats['in_flight'], stats['queued']), (0, 0))
+        self.assertEqual(self.get_all('/')[0].status_code, 504)
+        self.assertEqual(app.admission_stats()['in_flight'], 0)
+
+    def test_route_limit(self):
+        self.app.admission = AdmissionControl(max_queue=0)
+        statuses = [res.status_code for res in self.get_all('/report', '/report', '/')]
+        self.assertEqual(statuses, [200, 503, 200])
+        self.assertEqual(self.app.admission_stats()['routes']['report.index']['rejected'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
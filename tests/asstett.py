@@ -32,6 +32,7 @@ class AssetTest(unittest.TestCase):
                           self.asset.check_absolute_path(self.asset.root, self._path('not_exist')))
 
         class DummyRequest(object):
+            script_name = ''
             path_info = 'no_end_with_slash'
         serving.request = DummyRequest()
         self.assertRaises(exc.HTTPSeeOther, lambda:
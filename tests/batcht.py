@@ -0,0 +1,131 @@
+import unittest
+import json
+import time
+import gevent
+from webob import Request
+
+from solo.web.admission import AdmissionControl
+from solo.web.app import App
+from solo.web.batch import Batch
+from solo.web.ctx import serving
+from solo.web.sse import EventHub
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App(compress=True)
+        self.seen = seen = []
+        self.hub = hub = EventHub(heartbeat=0)
+
+        class Api(object):
+
+            def user(self, id):
+                seen.append(serving.request.cookies.get('session'))
+                return 'user %s' % (id)
+
+            def tag(self, id, tag):
+                return '%s %s %s' % (serving.request.method, id, tag)
+
+            def slow(self, delay):
+                gevent.sleep(float(delay))
+                return delay
+
+            def broken(self):
+                raise ValueError('broken')
+
+            def events(self):
+                return hub.stream('jobs')
+
+        route = self.app.route()
+        route.connect('user', '/users/{id}', controller=Api(), action='user')
+        route.connect('tag', '/users/{id}/tags', controller=Api(), action='tag')
+        route.connect('slow', '/slow', controller=Api(), action='slow')
+        route.connect('broken', '/broken', controller=Api(), action='broken')
+        route.connect('events', '/events', controller=Api(), action='events')
+        route.connect('limited', '/limited/{id}', controller=Api(), action='user', max_in_flight=1)
+        batch = Batch(max_requests=6, concurrency=3)
+        batch.connect(route)
+        batch.connect(route, '/short', 'short', deadline=0.05)
+
+    def post(self, specs, path='/batch'):
+        request = Request.blank(path, method='POST', body=json.dumps(specs))
+        request.headers['Cookie'] = 'session=abc'
+        request.headers['Accept-Encoding'] = 'gzip'
+        return request.get_response(self.app)
+
+    def test_batch(self):
+        response = self.post([
+            {'path': '/users/1'},
+            {'method': 'post', 'path': '/users/2/tags', 'params': {'tag': 'admin'}},
+            {'path': '/users/3/tags', 'params': {'tag': 'a'}},
+            {'path': '/users/4/tags?tag=b'},
+            {'path': '/missing'},
+            {'path': '/broken'},
+        ])
+        self.assertEqual(response.status_int, 200)
+        response.decode_content()
+        results = json.loads(response.body)
+        self.assertEqual([result['status'] for result in results], [200, 200, 200, 200, 404, 500])
+        self.assertEqual(results[0]['body'], 'user 1')
+        self.assertEqual(results[1]['body'], 'POST 2 admin')
+        self.assertEqual(results[2]['body'], 'GET 3 a')
+        self.assertEqual(results[3]['body'], 'GET 4 b')
+        # the sub-responses are never compressed
+        self.assertFalse('Content-Encoding' in results[0]['headers'])
+        self.assertEqual(self.seen, ['abc'])
+        self.assertEqual(serving.__local__, {})
+
+    def test_concurrent(self):
+        started = time.time()
+        response = self.post([{'path': '/slow', 'params': {'delay': '0.1'}}] * 3)
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(time.time() - started < 0.25)
+
+    def test_stream(self):
+        response = self.post([{'path': '/slow', 'params': {'delay': '0.1'}},
+                              {'path': '/slow', 'params': {'delay': '0'}}], '/batch?stream=1')
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        response.decode_content()
+        lines = [json.loads(line) for line in response.body.splitlines()]
+        self.assertEqual([(line['index'], line['body']) for line in lines], [(1, '0'), (0, '0.1')])
+
+    def test_admission(self):
+        self.app.admission = AdmissionControl(limit=1, max_queue=1, queue_timeout=0.05)
+        response = self.post([{'path': '/users/1'}, {'path': '/limited/2'}, {'path': '/limited/3'}])
+        self.assertEqual(response.status_int, 200)
+        response.decode_content()
+        self.assertEqual([result['status'] for result in json.loads(response.body)], [200, 200, 200])
+        stats = self.app.admission_stats()
+        self.assertEqual((stats['admitted'], stats['rejected'], stats['in_flight']), (1, 0, 0))
+
+    def test_detached_stream(self):
+        response = self.post([{'path': '/events'}, {'path': '/users/1'}])
+        response.decode_content()
+        self.assertEqual([result['status'] for result in json.loads(response.body)], [400, 200])
+        self.assertEqual(self.hub.stats()['subscribers'], 0)
+
+    def test_deadline(self):
+        started = time.time()
+        self.assertEqual(self.post([{'path': '/slow', 'params': {'delay': '1'}}], '/short').status_int, 504)
+        gevent.sleep(0.01)
+        # the sub-request greenlets are killed
+        self.assertEqual(serving.__local__, {})
+
+        response = self.post([{'path': '/slow', 'params': {'delay': '1'}}, {'path': '/users/1'}],
+                             '/short?stream=1')
+        response.decode_content()
+        lines = [json.loads(line) for line in response.body.splitlines()]
+        self.assertEqual([(line['index'], line['status']) for line in lines], [(1, 200), (0, 504)])
+        self.assertTrue(time.time() - started < 0.5)
+
+    def test_limits(self):
+        self.assertEqual(self.post([{'path': '/users/1'}] * 7).status_int, 413)
+        self.assertEqual(self.post({'path': '/users/1'}).status_int, 400)
+        self.assertEqual(self.post([{'path': 'users'}]).status_int, 400)
+        response = self.post([{'method': 'POST', 'path': '/batch'}])
+        self.assertEqual(json.loads(response.body)[0]['status'], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from webob import Request
+
+from solo.web.app import App
+from solo.web.cache import ResponseCache, CacheEntry
+from solo.web.ctx import request, response
+from solo.web.util import cached, jsonify
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def entry(self, size, tags=(), expires=1e12):
+        return CacheEntry('200 OK', [], 'x' * size, expires, tags, size)
+
+    def test_byte_budget(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.put('a', self.entry(4))
+        cache.put('b', self.entry(4))
+        cache.get('a')
+        cache.put('c', self.entry(4))
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        cache.put('huge', self.entry(11))
+        self.assertNotIn('huge', cache)
+        self.assertEqual(cache.stats()['bytes'], 8)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expiry_and_tags(self):
+        cache = ResponseCache()
+        cache.put('old', self.entry(1, expires=0))
+        self.assertIs(cache.get('old'), None)
+        self.assertEqual(cache.stats()['expirations'], 1)
+        cache.put('a', self.entry(1, ('user:1', 'users')))
+        cache.put('b', self.entry(1, ('users', )))
+        self.assertEqual(cache.invalidate('user:1'), 1)
+        self.assertEqual(cache.invalidate('users'), 1)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+class CachedRouteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        self.calls = calls = []
+
+        class Users(object):
+
+            def user(self, id):
+                calls.append(id)
+                response.headers['X-Lang'] = request.headers.get('Accept-Language', '')
+                return 'user %s %s' % (id, request.GET.get('v', ''))
+
+            @cached(ttl=60)
+            @jsonify
+            def users(self):
+                calls.append('users')
+                return ['a']
+
+            def login(self):
+                calls.append('login')
+                response.set_cookie('sid', '1')
+                return 'login'
+
+            def missing(self):
+                calls.append('missing')
+                response.status = 404
+                return 'missing'
+
+        menu = self.app.route()
+        menu.connect('user', '/users/{id}', controller=Users, action='user',
+                     cache=dict(ttl=60, vary=['Accept-Language'], tags=['user:{id}']))
+        menu.connect('users', '/users', controller=Users(), action='users')
+        menu.connect('login', '/login', controller=Users(), action='login', cache=60)
+        menu.connect('missing', '/missing', controller=Users(), action='missing', cache=60)
+
+    def get(self, path, **headers):
+        return Request.blank(path, headers=headers).get_response(self.app)
+
+    def test_hit_skips_handler(self):
+        for i in range(3):
+            res = self.get('/users/1', **{'Accept-Language': 'en'})
+            self.assertEqual(res.body, 'user 1 ')
+            self.assertEqual(res.headers['X-Lang'], 'en')
+        self.assertEqual(self.calls, ['1'])
+        # one per request: per_request controller only built on a miss
+        self.assertEqual(self.app.controller_stats()['user']['instances'], 1)
+        self.assertEqual(self.app.cache_stats()['hits'], 2)
+
+        self.assertEqual(self.get('/users/1', **{'Accept-Language': 'fr'}).headers['X-Lang'], 'fr')
+        self.assertEqual(self.get('/users/1?v=2').body, 'user 1 2')
+        self.assertEqual(self.get('/users/2').body, 'user 2 ')
+        self.assertEqual(self.calls, ['1', '1', '1', '2'])
+        self.assertEqual(Request.blank('/users/2', method='POST').get_response(self.app).body, 'user 2 ')
+        self.assertEqual(len(self.calls), 5)
+
+    def test_decorator_and_invalidate(self):
+        for i in range(2):
+            res = self.get('/users')
+            self.assertEqual(res.content_type, 'application/json')
+            self.assertEqual(res.body, '["a"]')
+        self.assertEqual(self.calls, ['users'])
+
+        self.get('/users/1')
+        self.get('/users/2')
+        self.assertEqual(self.app.invalidate('user:1'), 1)
+        self.get('/users/1')
+        self.get('/users/2')
+        self.assertEqual(self.calls, ['users', '1', '2', '1'])
+
+    def test_not_cached(self):
+        for i in range(2):
+            self.get('/login')
+            self.assertEqual(self.get('/missing').status_code, 404)
+        self.assertEqual(self.calls, ['login', 'missing'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import zlib
+import gzip
+from StringIO import StringIO
+from webob import Request
+
+from solo.web.app import App
+from solo.web.compress import Compressor, negotiate
+from solo.web.util import jsonify, cached
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=StringIO(data)).read()
+
+
+class CompressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.compressor = Compressor(min_size=100)
+        self.app = App(compress=self.compressor, etag=True)
+
+        class Page(object):
+
+            def html(self):
+                return 'hello ' * 100
+
+            def small(self):
+                return 'hello'
+
+            @jsonify
+            def json(self):
+                return ['x'] * 100
+
+            def png(self):
+                from solo.web.ctx import response
+                response.content_type = 'image/png'
+                return 'x' * 1000
+
+            def stream(self):
+                return ('chunk %d ' % i for i in range(100))
+
+            def buffers(self):
+                return iter([memoryview('view ' * 50), bytearray('array ' * 50)])
+
+            @cached(ttl=60)
+            def cached(self):
+                return 'cached ' * 100
+
+        menu = self.app.route()
+        for action in ['html', 'json', 'png', 'stream', 'buffers', 'cached']:
+            menu.connect(action, '/' + action, controller=Page(), action=action)
+        menu.connect('small', '/small', controller=Page(), action='small', compress=1)
+        menu.connect('raw', '/raw', controller=Page(), action='html', compress=False)
+        menu.connect('any', '/any', controller=Page(), action='png', compress=True)
+
+    def get(self, path, encoding='gzip, deflate'):
+        req = Request.blank(path)
+        if encoding:
+            req.headers['Accept-Encoding'] = encoding
+        res = req.get_response(self.app)
+        res.body
+        return res
+
+    def test_gzip_and_deflate(self):
+        res = self.get('/html')
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gunzip(res.body), 'hello ' * 100)
+        self.assertTrue(res.etag.endswith('-gzip'))
+        # the ETag of the compressed representation validates too
+        req = Request.blank('/html', headers={'If-None-Match': '"%s"' % res.etag, 'Accept-Encoding': 'gzip'})
+        not_modified = req.get_response(self.app)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.etag, res.etag)
+        self.assertEqual(not_modified.headers['Vary'], 'Accept-Encoding')
+
+        res = self.get('/json', 'deflate')
+        self.assertEqual(res.content_encoding, 'deflate')
+        self.assertEqual(zlib.decompress(res.body), '[' + ', '.join(['"x"'] * 100) + ']')
+
+    def test_skipped(self):
+        self.assertIs(self.get('/html', None).content_encoding, None)
+        self.assertIs(self.get('/html', 'gzip;q=0').content_encoding, None)
+        self.assertIs(self.get('/png').content_encoding, None)
+        self.assertIs(self.get('/raw').content_encoding, None)
+        self.assertIs(self.get('/small').content_encoding, None)
+        self.assertEqual(self.get('/any').content_encoding, 'gzip')
+
+    def test_stream(self):
+        res = self.get('/stream')
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(gunzip(res.body), ''.join('chunk %d ' % i for i in range(100)))
+
+    def test_stream_buffers(self):
+        res = self.get('/buffers')
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(gunzip(res.body), 'view ' * 50 + 'array ' * 50)
+
+    def test_compressed_cache(self):
+        for i in range(3):
+            self.assertEqual(gunzip(self.get('/cached').body), 'cached ' * 100)
+        stats = self.app.compress_stats()
+        self.assertEqual(stats['compressed'], 1)
+        self.assertEqual(stats['cache']['hits'], 2)
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate('deflate, gzip'), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0.5, deflate'), 'deflate')
+        self.assertEqual(negotiate('*'), 'gzip')
+        self.assertIs(negotiate('br'), None)
+        self.assertIs(negotiate(''), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os.path
+from hashlib import md5
+from wsgiref.validate import validator
+from webob import Request
+
+from solo.web.app import App
+from solo.web.etag import matches
+from solo.web.util import etag, jsonify
+from solo.template import setup_template, render_template
+
+
+class ETagTest(unittest.TestCase):
+
+    def setUp(self):
+        setup_template([os.path.join(os.path.dirname(__file__), 'templates')])
+        self.calls = calls = []
+
+        class Page(object):
+
+            @jsonify
+            def json(self):
+                calls.append('json')
+                return {'test': 'json'}
+
+            def page(self, name):
+                calls.append('page')
+                return render_template('hello.html', name=name)
+
+            @etag(lambda id: 'user-%s-v1' % id)
+            @jsonify
+            def user(self, id):
+                calls.append('user')
+                return {'id': id}
+
+        self.apps = []
+        for fast in (False, True):
+            app = App(etag=True, fast=fast)
+            menu = app.route()
+            menu.connect('json', '/json', controller=Page(), action='json')
+            menu.connect('page', '/page/{name}', controller=Page(), action='page')
+            menu.connect('user', '/user/{id}', controller=Page(), action='user')
+            self.apps.append(app)
+
+    def get(self, app, path, tag=None, method='GET'):
+        req = Request.blank(path, method=method)
+        if tag is not None:
+            req.headers['If-None-Match'] = tag
+        return req.get_response(app)
+
+    def test_content_etag(self):
+        for app in self.apps:
+            for path, body in [('/json', '{"test": "json"}'), ('/page/solo', 'Hello solo!')]:
+                res = self.get(app, path)
+                self.assertEqual(res.body, body)
+                self.assertEqual(res.etag, md5(body).hexdigest())
+                res = self.get(app, path, '"other", "%s"' % res.etag)
+                self.assertEqual(res.status_code, 304)
+                self.assertEqual(res.body, '')
+                self.assertEqual(self.get(app, path, '"other"').status_code, 200)
+
+    def test_version_key(self):
+        for app in self.apps:
+            del self.calls[:]
+            res = self.get(app, '/user/1')
+            self.assertEqual(res.etag, 'user-1-v1')
+            self.assertEqual(res.content_type, 'application/json')
+            res = self.get(app, '/user/1', '"user-1-v1"')
+            self.assertEqual((res.status_code, res.body, res.etag), (304, '', 'user-1-v1'))
+            self.assertEqual(self.calls, ['user'])
+
+    def test_valid_304(self):
+        for app in self.apps:
+            for path in ['/json', '/user/1']:
+                tag = self.get(app, path).etag
+                environ = Request.blank(path, headers={'If-None-Match': '"%s"' % tag}).environ
+                captured = []
+
+                def start_response(status, headers, exc_info=None):
+                    captured[:] = [status, headers]
+                app_iter = validator(app)(environ, start_response)
+                self.assertEqual(''.join(app_iter), '')
+                app_iter.close()
+                status, headers = captured
+                self.assertEqual(status, '304 Not Modified')
+                self.assertFalse('Content-Type' in dict(headers))
+
+    def test_only_get(self):
+        res = Request.blank('/json', method='POST', headers={'If-None-Match': '*'}).get_response(self.apps[0])
+        self.assertEqual(res.status_code, 200)
+        self.assertIs(res.etag, None)
+
+    def test_matches(self):
+        self.assertTrue(matches('*', 'a'))
+        self.assertTrue(matches('W/"a"', 'a'))
+        self.assertTrue(matches('"b", "a"', 'a'))
+        self.assertFalse(matches('"ab"', 'a'))
+        self.assertFalse(matches(None, 'a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
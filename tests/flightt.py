@@ -0,0 +1,90 @@
+import unittest
+import gevent
+from webob import Request, exc
+
+from solo.web.app import App
+from solo.web.ctx import response
+from solo.web.util import coalesce
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        self.calls = calls = []
+
+        class Feed(object):
+
+            def feed(self, name, page='1', sort=None):
+                calls.append((name, page))
+                gevent.sleep(0.01)
+                response.set_cookie('sid', name)
+                return 'feed %s %s' % (name, page)
+
+            @coalesce()
+            def stream(self):
+                calls.append('stream')
+                gevent.sleep(0.01)
+                return iter(['a', 'b'])
+
+            @coalesce(timeout=0.001)
+            def slow(self):
+                calls.append('slow')
+                gevent.sleep(0.02)
+                return 'slow'
+
+            def fail(self):
+                calls.append('fail')
+                gevent.sleep(0.01)
+                raise exc.HTTPForbidden()
+
+        menu = self.app.route()
+        menu.connect('feed', '/feed/{name}', controller=Feed(), action='feed', coalesce=dict(params=['page']))
+        menu.connect('stream', '/stream', controller=Feed(), action='stream')
+        menu.connect('slow', '/slow', controller=Feed(), action='slow')
+        menu.connect('fail', '/fail', controller=Feed(), action='fail', coalesce=True)
+
+    def get_all(self, *paths, **kw):
+        def get(path):
+            res = Request.blank(path, **kw).get_response(self.app)
+            res.body  # a streamed body ends the request in its greenlet
+            return res
+        jobs = [gevent.spawn(get, path) for path in paths]
+        gevent.joinall(jobs)
+        return [job.value for job in jobs]
+
+    def test_coalesced(self):
+        responses = self.get_all('/feed/a?page=2&sort=x', '/feed/a?page=2', '/feed/a?page=2', '/feed/b', '/feed/a')
+        self.assertEqual([res.body for res in responses],
+                         ['feed a 2'] * 3 + ['feed b 1', 'feed a 1'])
+        self.assertEqual(sorted(self.calls), [('a', '1'), ('a', '2'), ('b', '1')])
+        # the cookie stays with the leading request
+        self.assertIn('Set-Cookie', responses[0].headers)
+        self.assertNotIn('Set-Cookie', responses[1].headers)
+        stats = self.app.coalesce_stats()
+        self.assertEqual((stats['leaders'], stats['coalesced'], stats['in_flight']), (3, 2, 0))
+
+        # a later request runs the handler again
+        self.get_all('/feed/a?page=2')
+        self.assertEqual(len(self.calls), 4)
+
+    def test_method(self):
+        jobs = [gevent.spawn(self.get_all, '/fail', method=method) for method in ('GET', 'HEAD')]
+        gevent.joinall(jobs)
+        self.assertEqual(self.calls, ['fail', 'fail'])
+
+    def test_errors_and_streams(self):
+        self.assertEqual([res.status_code for res in self.get_all('/fail', '/fail')], [403, 403])
+        self.assertEqual(self.calls, ['fail'])
+
+        self.assertEqual([res.body for res in self.get_all('/stream', '/stream')], ['ab', 'ab'])
+        self.assertEqual(self.calls.count('stream'), 2)
+        self.assertEqual(self.app.coalesce_stats()['unshared'], 1)
+
+        self.assertEqual([res.body for res in self.get_all('/slow', '/slow')], ['slow', 'slow'])
+        self.assertEqual(self.calls.count('slow'), 2)
+        self.assertEqual(self.app.coalesce_stats()['timeouts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
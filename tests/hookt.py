@@ -0,0 +1,129 @@
+import unittest
+from webob import exc, Request
+
+from solo.web.app import App
+from solo.web.hook import HookMap, noop
+
+
+class HookMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.hooks = HookMap()
+
+    def record(self, name, error=None):
+        def callback(**kwargs):
+            self.calls.append((name, kwargs))
+            if error is not None:
+                raise error
+        return callback
+
+    def test_empty_point_is_noop(self):
+        self.assertIs(self.hooks.compile('before_handler'), noop)
+
+    def test_chain_priority_and_kwargs(self):
+        self.hooks.attach('p', self.record('late'), priority=80)
+        self.hooks.attach('p', self.record('early'), priority=10, key='value')
+        self.hooks.compile('p')()
+        self.assertEqual(self.calls, [('early', {'key': 'value'}), ('late', {})])
+
+    def test_chain_stops_on_error(self):
+        self.hooks.attach('p', self.record('first', ValueError('boom')), priority=10)
+        self.hooks.attach('p', self.record('second'), priority=20)
+        self.assertRaises(ValueError, self.hooks.compile('p'))
+        self.assertEqual([name for name, _ in self.calls], ['first'])
+
+    def test_failsafe(self):
+        self.hooks.attach('p', self.record('first', exc.HTTPForbidden()), priority=10)
+        self.hooks.attach('p', self.record('skipped'), priority=20)
+        self.hooks.attach('p', self.record('failsafe'), failsafe=True, priority=30)
+        for run in (self.hooks.compile('p'), lambda: self.hooks.run('p')):
+            del self.calls[:]
+            self.assertRaises(exc.HTTPForbidden, run)
+            self.assertEqual([name for name, _ in self.calls], ['first', 'failsafe'])
+
+
+class AppFreezeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        self.calls = []
+
+        class Hello(object):
+            def index(self):
+                return 'index'
+
+        self.app.route().connect('index', '/', controller=Hello(), action='index')
+
+    def test_freeze_on_first_request(self):
+        self.assertIs(self.app.chains, None)
+        self.app.attach('before_handler', lambda: self.calls.append('before_handler'))
+        Request.blank('/').get_response(self.app)
+        self.assertEqual(self.calls, ['before_handler'])
+        self.assertIs(self.app.chains['on_start_resource'], noop)
+
+    def test_attach_after_freeze(self):
+        self.app.freeze()
+        self.app.attach('on_end_request', lambda: self.calls.append('on_end_request'))
+        Request.blank('/').get_response(self.app)
+        self.assertEqual(self.calls, ['on_end_request'])
+
+    def test_hook_http_error(self):
+        def forbidden():
+            raise exc.HTTPForbidden()
+        self.app.attach('before_handler', forbidden)
+        self.assertEqual(Request.blank('/').get_response(self.app).status_code, 403)
+
+
+class ScopedHookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        self.calls = []
+
+        class Hello(object):
+            def index(self):
+                return 'index'
+
+        menu = self.app.route()
+        for name, path in [('index', '/'), ('admin_users', '/admin/users'),
+                           ('admin_roles', '/admin/roles'), ('health', '/health'),
+                           ('administrator', '/administrator')]:
+            menu.connect(name, path, controller=Hello(), action='index')
+
+    def record(self, tag):
+        return lambda: self.calls.append(tag)
+
+    def get(self, path):
+        del self.calls[:]
+        Request.blank(path).get_response(self.app)
+        return sorted(self.calls)
+
+    def test_scopes(self):
+        self.app.attach('before_handler', self.record('global'))
+        self.app.attach('before_handler', self.record('admin'), routes='admin_*')
+        self.app.attach('on_end_request', self.record('admin_prefix'), prefix='/admin/')
+        self.app.attach('before_handler', self.record('index'), routes=['index'])
+        self.assertEqual(self.get('/'), ['global', 'index'])
+        self.assertEqual(self.get('/admin/users'), ['admin', 'admin_prefix', 'global'])
+        self.assertEqual(self.get('/administrator'), ['global'])
+        self.assertEqual(self.get('/health'), ['global'])
+        self.assertEqual(self.get('/missing'), ['global'])
+
+    def test_resolved_once(self):
+        self.app.attach('before_handler', self.record('admin'), routes='admin_*')
+        self.app.freeze()
+        self.assertIs(self.app.route_chains['health'], self.app.chains)
+        self.assertIsNot(self.app.route_chains['admin_users'], self.app.chains)
+
+        # a route connected later is resolved on its first request
+        self.app.route().connect('admin_late', '/admin/late', controller=lambda: 'late')
+        self.assertEqual(self.get('/admin/late'), ['admin'])
+        self.assertIn('admin_late', self.app.route_chains)
+
+    def test_start_resource_can_not_be_scoped(self):
+        self.assertRaises(ValueError, self.app.attach, 'on_start_resource', self.record('x'), routes='index')
+
+
+if __name__ == '__main__':
+    unittest.main()
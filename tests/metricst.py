@@ -0,0 +1,74 @@
+import unittest
+import os.path
+from webob import Request
+
+from solo.web.app import App
+from solo.web.metrics import Registry
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_render(self):
+        registry = Registry()
+        registry.counter('jobs_total', 'The jobs', ('queue', )).labels('a"b').inc(2)
+        gauge = registry.gauge('workers', 'The workers')
+        gauge.set(3)
+        gauge.dec()
+        histogram = registry.histogram('latency_seconds', 'The latency', buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP jobs_total The jobs',
+            '# TYPE jobs_total counter',
+            'jobs_total{queue="a\\"b"} 2',
+            '# HELP workers The workers',
+            '# TYPE workers gauge',
+            'workers 2',
+            '# HELP latency_seconds The latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_sum 2.65',
+            'latency_seconds_count 4',
+        ]) + '\n')
+        self.assertRaises(ValueError, registry.gauge, 'workers', 'again')
+        self.assertRaises(ValueError, registry.get('jobs_total').labels, 'a', 'b')
+
+
+class AppMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App(metrics=True)
+
+        class Hello(object):
+
+            def index(self):
+                return 'index'
+
+        self.app.route().connect('index', '/', controller=Hello(), action='index')
+        self.app.asset('asset', '/static', os.path.join(os.path.dirname(__file__), 'assets'))
+        self.app.metrics.connect(self.app.route())
+        self.app.attach('before_handler', lambda: None)
+
+    def test_request_metrics(self):
+        for path in ['/', '/', '/missing', '/static/index.html']:
+            Request.blank(path).get_response(self.app).body
+        metrics = self.app.metrics
+        self.assertEqual(metrics.requests.labels('index', '2xx').value, 2)
+        self.assertEqual(metrics.requests.labels('', '4xx').value, 1)
+        self.assertEqual(metrics.handler_seconds.labels('index').count, 2)
+        self.assertEqual(metrics.hook_seconds.labels('before_handler').count, 4)
+        self.assertNotIn(('on_start_resource', ), metrics.hook_seconds.children)
+        self.assertEqual(metrics.asset_bytes.children[()].value, len('Hello Asset!'))
+        self.assertEqual(metrics.in_flight.children[()].value, 0)
+
+        res = Request.blank('/metrics').get_response(self.app)
+        self.assertEqual(res.content_type, 'text/plain')
+        self.assertIn('solo_requests_total{route="index",status="2xx"} 2', res.body)
+        self.assertIn('solo_handler_seconds_count{route="index"} 2', res.body)
+        self.assertIn('solo_asset_bytes_total 12', res.body)
+
+
+if __name__ == '__main__':
+    unittest.main()
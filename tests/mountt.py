@@ -0,0 +1,73 @@
+import unittest
+import os.path
+from webob import Request
+
+from solo.web.app import App
+from solo.web.ctx import request
+from solo.web.mount import AppMount
+
+
+class Hello(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def index(self, path):
+        return '%s %s %s' % (self.name, request.script_name, request.path_info)
+
+
+def make_app(name):
+    app = App(name)
+    app.route().connect('index', '/{path:.*}', controller=Hello(name), action='index', path='')
+    return app
+
+
+class AppMountTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mount = AppMount()
+        self.mount.mount('/', make_app('root'))
+        self.mount.mount('/api', make_app('api'))
+        self.mount.mount('/api/v2/', make_app('v2'))
+        self.mount.mount('/admin', make_app('admin'), host='admin.example.com')
+        self.mount.asset('/static', os.path.join(os.path.dirname(__file__), 'assets'), 'index.html')
+
+    def get(self, path, host='localhost'):
+        req = Request.blank(path)
+        req.host = host
+        return req.get_response(self.mount)
+
+    def test_longest_prefix(self):
+        self.assertEqual(self.get('/').body, 'root  /')
+        self.assertEqual(self.get('/apis').body, 'root  /apis')
+        self.assertEqual(self.get('/api').body, 'api /api /')
+        self.assertEqual(self.get('/api/users').body, 'api /api /users')
+        self.assertEqual(self.get('/api/v2/users').body, 'v2 /api/v2 /users')
+
+    def test_host(self):
+        self.assertEqual(self.get('/admin/x', 'admin.example.com:8080').body, 'admin /admin /x')
+        self.assertEqual(self.get('/', 'admin.example.com').body, 'root  /')
+        self.assertEqual(self.get('/admin/x').body, 'root  /admin/x')
+
+    def test_asset(self):
+        res = self.get('/static/index.html')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.body, 'Hello Asset!')
+        res = self.get('/static/dummy_dir')
+        self.assertEqual(res.status_code, 303)
+        self.assertEqual(res.location, 'http://localhost/static/dummy_dir/')
+        res = Request.blank('/static/index.html', method='POST').get_response(self.mount)
+        self.assertEqual(res.status_code, 404)
+
+    def test_not_found(self):
+        mount = AppMount()
+        mount.mount('/api', make_app('api'))
+        self.assertEqual(Request.blank('/other').get_response(mount).status_code, 404)
+
+    def test_mount_twice(self):
+        self.assertRaises(ValueError, self.mount.mount, '/api/', make_app('again'))
+        self.assertRaises(ValueError, self.mount.mount, 'api', make_app('again'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from io import BytesIO
+from webob import Request, exc
+
+from solo.web.app import App
+from solo.web.ctx import serving
+from solo.web.multipart import MultipartParser, UploadLimits, read_chunks
+
+
+BOUNDARY = 'solo-boundary'
+
+
+def encode(fields, files=()):
+    lines = []
+    for name, value in fields:
+        lines.extend(['--' + BOUNDARY, 'Content-Disposition: form-data; name="%s"' % (name), '', value])
+    for name, filename, value in files:
+        lines.extend(['--' + BOUNDARY,
+                      'Content-Disposition: form-data; name="%s"; filename="%s"' % (name, filename),
+                      'Content-Type: application/octet-stream', '', value])
+    lines.extend(['--' + BOUNDARY + '--', ''])
+    return '\r\n'.join(lines)
+
+
+def parse(body, **limits):
+    limits = UploadLimits(**limits)
+    chunks = read_chunks(BytesIO(body), len(body), limits)
+    return MultipartParser(chunks, BOUNDARY, limits).parse()
+
+
+class Unseekable(object):
+
+    def __init__(self, body):
+        self.stream = BytesIO(body)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+class MultipartParserTest(unittest.TestCase):
+
+    def test_parse(self):
+        data = ('\r\n--' + BOUNDARY[:-1]) * 50 + '\x00\xff'
+        body = encode([('title', 'hello'), ('tag', 'a'), ('tag', '')], [('attachment', 'a.bin', data)])
+        for chunk_size in (1, 7, 64 * 1024):
+            params, files = parse(body, chunk_size=chunk_size)
+            self.assertEqual(params['title'], u'hello')
+            self.assertEqual(params.getall('tag'), [u'a', u''])
+            upload = params['attachment']
+            self.assertEqual(files, [upload])
+            self.assertEqual((upload.name, upload.filename, upload.type),
+                             (u'attachment', u'a.bin', 'application/octet-stream'))
+            self.assertEqual(upload.size, len(data))
+            self.assertEqual(upload.read(), data)
+            upload.close()
+
+    def test_spool(self):
+        body = encode([], [('small', 's', 'x' * 10), ('large', 'l', 'x' * 5000)])
+        params, files = parse(body, spool_size=1000, chunk_size=512)
+        self.assertFalse(params['small'].file._rolled)
+        self.assertTrue(params['large'].file._rolled)
+        self.assertEqual(params['large'].value, 'x' * 5000)
+
+    def test_limits(self):
+        body = encode([('a', '1'), ('b', '2'), ('c', '3')])
+        self.assertRaises(exc.HTTPRequestEntityTooLarge, parse, body, max_parts=2)
+        self.assertRaises(exc.HTTPRequestEntityTooLarge, parse, body, max_body=len(body) - 1)
+        self.assertRaises(exc.HTTPRequestEntityTooLarge, parse, encode([('a', 'x' * 100)]), max_field=99)
+        self.assertRaises(exc.HTTPBadRequest, parse, body[:-20])
+        self.assertRaises(exc.HTTPBadRequest, parse, 'no boundary here')
+
+
+class UploadAppTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        self.uploads = uploads = []
+
+        class Upload(object):
+
+            def upload(self, title, attachment):
+                uploads.append(attachment)
+                return '%s %s %d' % (title, attachment.filename, len(attachment.read()))
+
+            def form(self, name):
+                return name
+
+        self.app.route().connect('upload', '/upload', controller=Upload(), action='upload',
+                                 upload=dict(max_body=10000))
+        self.app.route().connect('form', '/form', controller=Upload(), action='form')
+
+    def post(self, path, body, content_type='multipart/form-data; boundary=' + BOUNDARY):
+        request = Request.blank(path, method='POST', body=body)
+        request.content_type = content_type
+        return request.get_response(self.app)
+
+    def test_upload(self):
+        response = self.post('/upload', encode([('title', 'report')], [('attachment', 'r.csv', 'a,b\n' * 100)]))
+        self.assertEqual(response.body, 'report r.csv 400')
+        self.assertTrue(self.uploads[0].file.closed)
+
+    def test_request_post(self):
+        seen = []
+
+        def check():
+            request = serving.request
+            seen.append((request.POST['title'], request.params['attachment'].filename))
+        self.app.attach('before_handler', check)
+
+        body = encode([('title', 'report')], [('attachment', 'r.csv', 'a,b\n')])
+        request = Request.blank('/upload', method='POST')
+        request.content_type = 'multipart/form-data; boundary=' + BOUNDARY
+        request.content_length = len(body)
+        # the server input can not seek back to the start of the body
+        request.environ['wsgi.input'] = Unseekable(body)
+        response = request.get_response(self.app)
+        self.assertEqual(response.body, 'report r.csv 4')
+        self.assertEqual(seen, [(u'report', u'r.csv')])
+
+    def test_too_large(self):
+        response = self.post('/upload', encode([('title', 'report')], [('attachment', 'r.csv', 'x' * 20000)]))
+        self.assertEqual(response.status_int, 413)
+
+    def test_urlencoded(self):
+        self.assertEqual(self.post('/form', 'name=solo', 'application/x-www-form-urlencoded').body, 'solo')
+        self.app.route().upload_limits = UploadLimits(max_body=5)
+        response = self.post('/form', 'name=solo', 'application/x-www-form-urlencoded')
+        self.assertEqual(response.status_int, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
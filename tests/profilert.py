@@ -0,0 +1,107 @@
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+import pstats
+import signal
+from webob import Request
+
+from solo.web.app import App
+from solo.web.profiler import Profiler
+
+
+def busy():
+    total = 0
+    for i in xrange(300000):
+        total += i * i
+    return str(total)
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_app(self, directory=None, **options):
+        profiler = Profiler(directory or self.directory, interval=0, **options)
+        app = App(profiler=profiler)
+
+        class Hello(object):
+
+            def index(self):
+                return busy()
+
+        app.route().connect('index', '/', controller=Hello(), action='index')
+        return app
+
+    def get(self, app, path, **headers):
+        response = Request.blank(path, headers=headers).get_response(app)
+        # wait for the profiles to be written
+        if app.profiler.dumper is not None:
+            app.profiler.dumper.join()
+        return response
+
+    def test_not_profiled(self):
+        app = self.make_app()
+        self.get(app, '/')
+        self.assertEqual(app.profiler.profiled, 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_cprofile_header(self):
+        app = self.make_app()
+        response = self.get(app, '/', **{'X-Solo-Profile': '1'})
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(app.profiler.profiled, 1)
+        self.assertTrue(app.profiler.cprofile is None)
+        stats = pstats.Stats(os.path.join(self.directory, 'index.pstats'))
+        self.assertTrue(any(func[2] == 'busy' for func in stats.stats))
+
+    def test_fraction(self):
+        app = self.make_app(fraction=1.0)
+        self.get(app, '/missing')
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'unmatched.pstats')))
+
+    def test_sample(self):
+        app = self.make_app(fraction=1.0, mode='sample', sample_interval=0.001)
+        previous = signal.signal(signal.SIGPROF, signal.SIG_IGN)
+        try:
+            for _ in range(5):
+                self.get(app, '/')
+            self.assertEqual(signal.getsignal(signal.SIGPROF), signal.SIG_IGN)
+        finally:
+            signal.signal(signal.SIGPROF, previous)
+        self.assertEqual(app.profiler.active, {})
+        with open(os.path.join(self.directory, 'index.collapsed')) as f:
+            collapsed = f.read()
+        self.assertTrue('busy (profilert.py' in collapsed)
+        stats = pstats.Stats(os.path.join(self.directory, 'index.pstats'))
+        self.assertTrue(any(func[2] == 'busy' for func in stats.stats))
+
+    def test_sample_restarts_syscalls(self):
+        app = self.make_app(fraction=1.0, mode='sample')
+        calls = []
+        siginterrupt = signal.siginterrupt
+        signal.siginterrupt = lambda signum, flag: calls.append((signum, flag)) or siginterrupt(signum, flag)
+        try:
+            self.get(app, '/')
+        finally:
+            signal.siginterrupt = siginterrupt
+        # a sample never fails a blocking read with EINTR
+        self.assertEqual(calls, [(signal.SIGPROF, False)])
+
+    def test_dump_failure(self):
+        app = self.make_app('/proc/nope/profiles', fraction=1.0)
+        response = self.get(app, '/')
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(app.profiler.profiled, 1)
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, Profiler, self.directory, mode='trace')
+
+
+if __name__ == '__main__':
+    unittest.main()
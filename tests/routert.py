@@ -0,0 +1,173 @@
+import unittest
+import routes
+from webob import Request
+
+from solo.web.app import App
+from solo.web.dispatcher import RoutesDispatcher
+from solo.web.router import CompiledRouter
+
+
+class CompiledRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mapper = routes.Mapper()
+        self.mapper.controller_scan = lambda: ['ctl']
+        m = self.mapper
+        m.connect('index', '/', controller='ctl', action='index')
+        m.connect('page', '/page/:page', controller='ctl', action='page', conditions=dict(method=['GET']))
+        m.connect('about', '/page/about', controller='ctl', action='about')
+        m.connect('update', '/page/:page', controller='ctl', action='update', conditions=dict(method=['POST', 'PUT']))
+        m.connect('user', '/user/{id:\d+}/profile', controller='ctl', action='user')
+        m.connect('user_posts', '/user/:name/posts/:post', controller='ctl', action='posts')
+        m.connect('file', '/file-:name', controller='ctl', action='file')
+        m.connect('health', '/health', controller='ctl', action='health', conditions=dict(method=['GET']))
+        m.connect('asset', '/static/{path:.*?}', controller='ctl', action='asset', conditions=dict(method=['HEAD', 'GET']))
+        m.connect('static_only', 'http://example.com/', _static=True)
+        self.router = CompiledRouter(self.mapper)
+
+    def assertSameMatch(self, url, method):
+        environ = {'REQUEST_METHOD': method}
+        self.assertEqual(self.router.match(url, environ), self.mapper.match(url, environ))
+
+    def test_same_as_mapper(self):
+        urls = ['/', '', '/page/1', '/page/about', '/page/', '/user/12/profile',
+                '/user/ab/profile', '/user/joe/posts/3', '/file-a', '/health',
+                '/health/', '/health\n', '/static/css/a.css', '/static/', '/missing',
+                '/user//posts/3']
+        for method in ['GET', 'POST', 'PUT', 'HEAD', 'DELETE']:
+            for url in urls:
+                self.assertSameMatch(url, method)
+
+    def test_literal_lookup(self):
+        self.router.compile()
+        self.assertIn('/health', self.router.tables['GET'].static)
+        self.assertNotIn('/health', self.router.any_table.static)
+        self.assertEqual(self.router.match('/health', {'REQUEST_METHOD': 'GET'})['action'], 'health')
+
+    def test_earlier_route_shadows_literal(self):
+        self.mapper.connect('about_ext', '/about{ext:(\.json)?}', controller='ctl', action='about_ext')
+        self.mapper.connect('about_page', '/about', controller='ctl', action='about_page')
+        self.router.compile()
+        # 'about_ext' is tried first and also matches '/about'
+        self.assertNotIn('/about', self.router.any_table.static)
+        self.assertEqual(self.router.match('/about', {'REQUEST_METHOD': 'GET'})['action'], 'about_ext')
+        self.assertSameMatch('/about', 'GET')
+        self.assertSameMatch('/about.json', 'GET')
+
+    def test_recompile_after_connect(self):
+        self.assertEqual(self.router.match('/late', {'REQUEST_METHOD': 'GET'}), None)
+        self.mapper.connect('late', '/late', controller='ctl', action='late')
+        self.assertEqual(self.router.match('/late', {'REQUEST_METHOD': 'GET'})['action'], 'late')
+
+
+class CompiledDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App(dispatcher=RoutesDispatcher(compiled=True))
+
+        class Hello(object):
+
+            def index(self):
+                return 'index'
+
+            def page(self, page):
+                return page
+
+        menu = self.app.route()
+        menu.connect('index', '/', controller=Hello(), action='index')
+        menu.connect('page', '/page/:page', controller=Hello, action='page', conditions=dict(method=["GET"]))
+
+    def test_match(self):
+        res = Request.blank('/').get_response(self.app)
+        self.assertEqual(res.body, 'index')
+        res = Request.blank('/page/2').get_response(self.app)
+        self.assertEqual(res.body, '2')
+        res = Request.blank('/page/2', method='POST').get_response(self.app)
+        self.assertEqual(res.status_code, 404)
+
+
+class MatchCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = RoutesDispatcher(cache_size=2)
+        self.dispatcher.connect('page', '/page/:page', controller=object(), action='page')
+
+    def test_hit_and_miss(self):
+        cache = self.dispatcher.cache
+        self.assertEqual(self.dispatcher.lookup('GET', '/page/1')['page'], '1')
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        result = self.dispatcher.lookup('GET', '/page/1')
+        self.assertEqual(result['page'], '1')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # callers get a copy
+        result['page'] = 'changed'
+        self.assertEqual(self.dispatcher.lookup('GET', '/page/1')['page'], '1')
+
+    def test_bounded_and_no_miss_cached(self):
+        cache = self.dispatcher.cache
+        for i in range(5):
+            self.dispatcher.lookup('GET', '/page/%d' % i)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(self.dispatcher.lookup('GET', '/missing'), None)
+        self.assertNotIn(('GET', '/missing'), cache)
+
+    def test_connect_clears(self):
+        self.dispatcher.lookup('GET', '/page/1')
+        self.dispatcher.connect('index', '/', controller=object(), action='index')
+        self.assertEqual(len(self.dispatcher.cache), 0)
+
+
+class UrlForTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        menu = self.app.route()
+        ctl = object()
+        menu.connect('index', '/', controller=ctl, action='index')
+        menu.connect('page', '/page/:page', controller=ctl, action='page')
+        menu.connect('user', '/user/{id:\d+}/{tab}', controller=ctl, action='user', tab='home')
+        menu.connect('file', '/files/*path', controller=ctl, action='file')
+
+    def test_url_for(self):
+        self.assertEqual(self.app.url_for('index'), '/')
+        self.assertEqual(self.app.url_for('page', page=2), '/page/2')
+        self.assertEqual(self.app.url_for('page', page=u'a b'), '/page/a%20b')
+        self.assertEqual(self.app.url_for('page', page=2, q='x', tags=['a', 'b']), '/page/2?q=x&tags=a&tags=b')
+        self.assertEqual(self.app.url_for('user', id=3), '/user/3/home')
+        self.assertEqual(self.app.url_for('user', id=3, tab='posts'), '/user/3/posts')
+        self.assertEqual(self.app.url_for('file', path='css/a.css'), '/files/css/a.css')
+
+    def test_same_as_routes(self):
+        for name, action, params in [('page', 'page', {'page': '2'}),
+                                     ('user', 'user', {'id': '3', 'tab': 'posts'}),
+                                     ('page', 'page', {'page': 'a/b c', 'q': 'x'})]:
+            route = self.app.route().named_routes[name]
+            self.assertEqual(self.app.url_for(name, **params),
+                             route.generate(controller=name, action=action, **params))
+
+    def test_builders_cached(self):
+        self.app.url_for('page', page=2)
+        builder = self.app.route().url_builders[('page', frozenset(['page']))]
+        self.app.url_for('page', page=3)
+        self.assertIs(self.app.route().url_builders[('page', frozenset(['page']))], builder)
+
+    def test_errors(self):
+        self.assertRaises(KeyError, self.app.url_for, 'missing')
+        self.assertRaises(ValueError, self.app.url_for, 'page')
+        self.assertRaises(ValueError, self.app.url_for, 'user', id='abc')
+
+    def test_template_global(self):
+        from solo.template import template_vars
+
+        class Page(object):
+            def link(self):
+                return template_vars['url_for']('page', page=1)
+
+        self.app.route().connect('link', '/link', controller=Page(), action='link')
+        self.assertEqual(Request.blank('/link').get_response(self.app).body, '/page/1')
+        self.assertEqual(Request.blank('/link', base_url='http://localhost/app').get_response(self.app).body,
+                         '/app/page/1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import gevent
+from webob import Request
+
+from solo.web.app import App
+from solo.web.ctx import serving
+from solo.web.sse import EventHub, format_event
+
+
+class EventHubTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = hub = EventHub(buffer_size=3, heartbeat=0, retry=1000)
+        self.app = App(compress=True, metrics=True)
+
+        class Jobs(object):
+
+            def events(self, job):
+                return hub.stream(['jobs', 'job.' + job])
+
+        self.app.route().connect('events', '/events/{job}', controller=Jobs(), action='events')
+
+    def tearDown(self):
+        self.hub.close()
+
+    def subscribe(self, job='1'):
+        request = Request.blank('/events/' + job)
+        request.headers['Accept-Encoding'] = 'gzip'
+        return request.get_response(self.app)
+
+    def test_format(self):
+        self.assertEqual(format_event(u'a\nb', 'status', 7), 'id: 7\nevent: status\ndata: a\ndata: b\n\n')
+
+    def test_stream(self):
+        response = self.subscribe()
+        self.assertEqual(response.content_type, 'text/event-stream')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(response.content_encoding, None)
+        # the request is over while the stream is open
+        self.assertEqual(serving.__local__, {})
+        self.assertEqual(self.app.metrics.in_flight.children[()].value, 0)
+
+        events = iter(response.app_iter)
+        self.assertEqual(next(events), 'retry: 1000\n\n')
+        self.assertEqual(self.hub.publish('job.1', 'running', event='status'), 1)
+        self.assertEqual(self.hub.publish('job.2', 'running'), 0)
+        self.assertEqual(next(events), 'event: status\ndata: running\n\n')
+
+        waiter = gevent.spawn(next, events)
+        gevent.sleep(0)
+        self.hub.publish('jobs', 'done')
+        self.assertEqual(waiter.get(timeout=1), 'data: done\n\n')
+
+        response.app_iter.close()
+        self.assertEqual(self.hub.stats()['subscribers'], 0)
+        self.assertEqual(self.hub.topics, {})
+
+    def test_drop_slow(self):
+        slow = self.subscribe().app_iter
+        fast = self.subscribe().app_iter
+        next(fast)
+        for i in range(3):
+            self.hub.publish('jobs', str(i))
+            next(fast)
+        self.assertEqual(self.hub.stats()['dropped'], 1)
+        self.assertEqual(self.hub.stats()['subscribers'], 1)
+        # the buffered events are sent, then the stream ends
+        self.assertEqual(len(list(slow)), 3)
+
+    def test_heartbeat(self):
+        self.hub.heartbeat = 0.01
+        events = iter(self.subscribe().app_iter)
+        next(events)
+        self.assertEqual(gevent.spawn(next, events).get(timeout=1), ': ping\n\n')
+
+    def test_many_subscribers(self):
+        self.hub.buffer_size = 10
+        streams = [self.hub.subscribe('jobs') for _ in range(10000)]
+        self.assertEqual(self.hub.publish('jobs', 'tick'), 10000)
+        self.assertEqual(next(streams[-1]), 'retry: 1000\n\n')
+        self.assertEqual(next(streams[-1]), 'data: tick\n\n')
+
+    def test_max_subscribers(self):
+        self.hub.max_subscribers = 1
+        self.subscribe()
+        self.assertEqual(self.subscribe().status_int, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
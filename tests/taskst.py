@@ -0,0 +1,135 @@
+import unittest
+import gevent
+from webob import Request
+
+from solo.web.app import App
+from solo.web.ctx import serving
+from solo.web.tasks import TaskQueue, defer
+
+
+class TaskQueueTest(unittest.TestCase):
+
+    def make_app(self, **options):
+        app = App(metrics=True, tasks=TaskQueue(**options))
+        self.done = done = []
+
+        def audit(action):
+            done.append(action)
+
+        def hang():
+            gevent.sleep(1)
+
+        def fail():
+            raise ValueError('fail')
+
+        class Hello(object):
+
+            def index(self):
+                defer(audit, 'index')
+                return 'index'
+
+            def many(self, count):
+                for _ in range(int(count)):
+                    defer(audit, 'many')
+                return 'many'
+
+            def broken(self):
+                defer(hang)
+                defer(fail)
+                return 'broken'
+
+            def race(self):
+                defer(audit, 'race')
+                # another request fills the queue before this one ends
+                while not serving.app.tasks.full():
+                    serving.app.tasks.submit(audit, ('other', ))
+                return 'race'
+
+            def failed(self):
+                defer(audit, 'failed')
+                raise ValueError('failed')
+
+        app.route().connect('index', '/', controller=Hello(), action='index')
+        app.route().connect('many', '/many/{count}', controller=Hello(), action='many')
+        app.route().connect('broken', '/broken', controller=Hello(), action='broken')
+        app.route().connect('race', '/race', controller=Hello(), action='race')
+        app.route().connect('failed', '/failed', controller=Hello(), action='failed')
+        return app
+
+    def get(self, app, path):
+        response = Request.blank(path).get_response(app)
+        return response, response.body
+
+    def test_defer(self):
+        app = self.make_app()
+        response = Request.blank('/').get_response(app)
+        # queued once the server closes the body
+        self.assertEqual(app.task_stats()['pending'], 0)
+        self.assertEqual(response.body, 'index')
+        self.assertEqual(app.task_stats()['pending'], 1)
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(self.done, ['index'])
+        stats = app.task_stats()
+        self.assertEqual(stats['outcomes'], {'done': 1})
+        self.assertEqual(stats['pending'], 0)
+        self.assertTrue('solo_tasks_total{outcome="done"} 1' in app.metrics.registry.render())
+
+    def test_overflow(self):
+        app = self.make_app(workers=1, max_queue=2)
+        self.get(app, '/many/5')
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(len(self.done), 2)
+        self.assertEqual(app.task_stats()['outcomes'], {'done': 2, 'dropped': 3})
+
+        app = self.make_app(workers=1, max_queue=2, overflow='inline')
+        self.get(app, '/many/5')
+        self.assertEqual(len(self.done), 3)
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(len(self.done), 5)
+
+        app = self.make_app(workers=1, max_queue=2, overflow='reject')
+        self.get(app, '/many/2')
+        response, body = self.get(app, '/many/1')
+        self.assertEqual(response.status_int, 503)
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(app.task_stats()['outcomes'], {'done': 2, 'rejected': 1})
+
+    def test_reject_at_submit(self):
+        app = self.make_app(workers=1, max_queue=2, overflow='reject')
+        response, body = self.get(app, '/race')
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(self.done, ['other', 'other'])
+        self.assertEqual(app.task_stats()['outcomes'], {'done': 2, 'rejected': 1})
+
+        # the tasks deferred by the request count against the room left
+        app = self.make_app(workers=1, max_queue=2, overflow='reject')
+        self.assertEqual(self.get(app, '/many/3')[0].status_int, 503)
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(app.task_stats()['outcomes'], {'rejected': 1, 'cancelled': 2})
+
+    def test_failed_request(self):
+        app = self.make_app()
+        self.assertEqual(self.get(app, '/failed')[0].status_int, 500)
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(self.done, [])
+        self.assertEqual(app.task_stats()['outcomes'], {'cancelled': 1})
+
+    def test_timeout_and_failure(self):
+        app = self.make_app(timeout=0.05)
+        self.get(app, '/broken')
+        self.assertTrue(app.shutdown(1))
+        self.assertEqual(app.task_stats()['outcomes'], {'timeout': 1, 'failed': 1})
+
+    def test_drain_closes(self):
+        app = self.make_app()
+        app.shutdown()
+        self.get(app, '/')
+        self.assertEqual(app.task_stats()['outcomes'], {'dropped': 1})
+
+    def test_out_of_request(self):
+        self.assertRaises(RuntimeError, defer, len, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import os.path
+import json
+import tempfile
+from webob import Request
+
+from solo.web.app import App
+from solo.web.trace import Tracer, JSONFileExporter, NOSPAN, span
+from solo.template import setup_template
+from solo.web.util import jsonify, render_template
+
+
+class Collector(object):
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+class TraceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = Collector()
+        self.app = App(tracer=Tracer(threshold=10, exporter=self.collector))
+
+        class Hello(object):
+
+            @jsonify
+            def index(self, name='solo'):
+                with span('load', {'name': name}) as load:
+                    load.set('rows', 1)
+                return {'name': name}
+
+            def page(self, name='solo'):
+                return render_template('hello.html', name=name)
+
+            def broken(self):
+                with span('load'):
+                    raise ValueError('broken')
+
+        self.app.route().connect('index', '/', controller=Hello(), action='index')
+        self.app.route().connect('page', '/page', controller=Hello(), action='page')
+        self.app.route().connect('broken', '/broken', controller=Hello(), action='broken')
+
+        def check():
+            pass
+        self.app.attach('before_handler', check)
+
+    def spans(self, trace):
+        return dict((span.name, span) for span in trace.spans)
+
+    def test_phases(self):
+        response = Request.blank('/?name=lilac').get_response(self.app)
+        self.assertEqual(response.body, '{"name": "lilac"}')
+        trace, = self.collector.traces
+        spans = self.spans(trace)
+        for name in ['request', 'admission', 'on_start_resource', 'dispatch', 'routing', 'params',
+                     'before_handler', 'before_handler:check', 'handler', 'load', 'json_encode',
+                     'on_end_resource', 'response', 'write']:
+            self.assertTrue(name in spans, name)
+        self.assertTrue(all(span.end is not None for span in trace.spans))
+        self.assertTrue(spans['routing'].parent is spans['dispatch'])
+        self.assertTrue(spans['load'].parent is spans['handler'])
+        self.assertEqual(spans['load'].attrs, {'name': 'lilac', 'rows': 1})
+        self.assertEqual(trace.root.attrs['route'], 'index')
+        self.assertEqual(trace.root.attrs['status'], 200)
+
+    def test_render_template(self):
+        setup_template([os.path.join(os.path.dirname(__file__), 'templates')])
+        response = Request.blank('/page').get_response(self.app)
+        self.assertEqual(response.body, 'Hello solo!')
+        spans = self.spans(self.collector.traces[0])
+        self.assertEqual(spans['render_template'].attrs, {'template': 'hello.html'})
+        self.assertTrue(spans['render_template'].parent is spans['handler'])
+
+    def test_error(self):
+        response = Request.blank('/broken').get_response(self.app)
+        self.assertEqual(response.status_int, 500)
+        trace, = self.collector.traces
+        spans = self.spans(trace)
+        self.assertEqual(spans['load'].attrs['error'], 'ValueError')
+        self.assertEqual(trace.root.attrs['status'], 500)
+
+    def test_slow_log(self):
+        self.app.tracer.threshold = 0
+        Request.blank('/').get_response(self.app).body
+        self.assertEqual(self.app.tracer.slow, 1)
+        lines = self.collector.traces[0].format().splitlines()
+        self.assertTrue(lines[0].startswith('request '))
+        self.assertTrue(any(line.startswith('    routing ') for line in lines))
+
+    def test_no_request(self):
+        self.assertTrue(span('idle') is NOSPAN)
+
+    def test_json_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            exporter = self.app.tracer.exporter = JSONFileExporter(path)
+            Request.blank('/').get_response(self.app).body
+            Request.blank('/').get_response(self.app).body
+            exporter.close()
+            with open(path) as f:
+                events = json.loads(f.read().rstrip(',\n') + ']')
+            self.assertEqual(set(event['tid'] for event in events), set([1, 2]))
+            self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in events))
+            self.assertEqual(events[0]['name'], 'request')
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import time
+import gevent
+from webob import Request
+
+from solo.web.app import App
+from solo.web.watchdog import HubWatchdog
+
+
+def spin(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class HubWatchdogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App(metrics=True, watchdog=HubWatchdog(threshold=0.03, interval=0.005))
+
+        class Hello(object):
+
+            def slow(self):
+                # unpatched, it blocks the hub
+                time.sleep(0.15)
+                return 'slow'
+
+            def busy(self):
+                spin(0.15)
+                return 'busy'
+
+            def fast(self):
+                gevent.sleep(0.15)
+                return 'fast'
+
+        for action in ['slow', 'busy', 'fast']:
+            self.app.route().connect(action, '/' + action, controller=Hello(), action=action)
+
+    def tearDown(self):
+        self.app.watchdog.stop()
+
+    def get(self, path):
+        return gevent.spawn(lambda: Request.blank(path).get_response(self.app).body).get()
+
+    def test_blocks(self):
+        self.assertEqual(self.get('/slow'), 'slow')
+        self.assertEqual(self.get('/busy'), 'busy')
+        self.assertEqual(self.get('/fast'), 'fast')
+        gevent.sleep(0.05)
+
+        stats = self.app.hub_stats()
+        self.assertEqual(stats['blocks'], 2)
+        self.assertEqual(sorted(stats['routes']), ['busy', 'slow'])
+        self.assertTrue(stats['routes']['slow']['lag'] >= 0.1)
+        self.assertTrue('in slow' in stats['recent'][0]['stack'])
+        self.assertTrue('in spin' in stats['recent'][1]['stack'])
+        self.assertEqual(stats['recent'][1]['action'], 'busy')
+        self.assertTrue('solo_hub_blocks_total{route="slow"} 1' in self.app.metrics.registry.render())
+
+    def test_outside_request(self):
+        gevent.spawn(spin, 0.1).join()
+        gevent.sleep(0.05)
+        stats = self.app.hub_stats()
+        self.assertEqual(stats['routes'].keys(), [''])
+        self.assertEqual(stats['recent'][0]['route'], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,12 @@
 import unittest
 from webob import exc
 import os.path
-from solo.web.ctx import serving, response
+from solo.web.ctx import serving, response, request
 from solo.web.app import App
-from webob import Request
+from webob import Request, Response
 from solo.util import json_encode
 
-from solo.web.util import jsonify
+from solo.web.util import jsonify, raw_body
 
 
 class AppTest(unittest.TestCase):
@@ -72,6 +72,204 @@ class AppTest(unittest.TestCase):
         self.assertEqual(res.content_type, 'application/json')
 
 
+class HandlerPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+
+        class Page(object):
+
+            def show(self, page, size=10):
+                return '%s-%s' % (page, size)
+
+            def search(self, **kwargs):
+                return ','.join(sorted(kwargs))
+
+            def fixed(self):
+                return 'fixed'
+
+            @jsonify
+            def json(self, page):
+                return {'page': page}
+
+            def hook(self):
+                return 'hook'
+
+            @raw_body
+            def upload(self, name):
+                return '%s:%s' % (name, request.body)
+
+        menu = self.app.route()
+        menu.connect('hook', '/hook', controller=Page(), action='hook')
+        menu.connect('upload', '/upload/:name', controller=Page(), action='upload')
+        menu.connect('show', '/show/:page', controller=Page, action='show')
+        menu.connect('fixed', '/fixed/:page', controller=Page(), action='fixed')
+        menu.connect('show_qs', '/show', controller=Page(), action='show')
+        menu.connect('search', '/search', controller=Page(), action='search')
+        menu.connect('json', '/json/:page', controller=Page(), action='json')
+
+    def test_plan_built_on_connect(self):
+        plan = self.app.route().plans[('show', 'show')]
+        self.assertEqual(plan.args, frozenset(['page', 'size']))
+        self.assertEqual(plan.required, ('page',))
+        self.assertEqual(plan.defaults, {'size': 10})
+        self.assertFalse(plan.varkw)
+        self.assertTrue(self.app.route().plans[('search', 'search')].varkw)
+        self.assertEqual(self.app.route().plans[('json', 'json')].required, ('page',))
+
+    def test_bind(self):
+        self.assertEqual(Request.blank('/show/2').get_response(self.app).body, '2-10')
+        self.assertEqual(Request.blank('/show/2?size=5').get_response(self.app).body, '2-5')
+        self.assertEqual(Request.blank('/search?a=1&b=2').get_response(self.app).body, 'a,b')
+        self.assertIn('"page": "3"', Request.blank('/json/3').get_response(self.app).body)
+
+    def test_lazy_params(self):
+        class Untouched(object):
+            def read(self, *args):
+                raise AssertionError('wsgi.input was read')
+            readline = read
+
+        req = Request.blank('/hook', method='POST')
+        req.content_type = 'application/x-www-form-urlencoded'
+        req.content_length = 10
+        req.environ['wsgi.input'] = Untouched()
+        res = req.get_response(self.app)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.body, 'hook')
+
+        plan = self.app.route().plans[('hook', 'hook')]
+        self.assertFalse(plan.wants_params({}))
+        self.assertTrue(self.app.route().plans[('show', 'show')].wants_params({'page': '1'}))
+
+    def test_raw_body(self):
+        self.assertTrue(self.app.route().plans[('upload', 'upload')].raw_body)
+        res = Request.blank('/upload/a', POST='x=1&y=2').get_response(self.app)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.body, 'a:x=1&y=2')
+
+    def test_missing(self):
+        res = Request.blank('/show').get_response(self.app)
+        self.assertEqual(res.status_code, 404)
+        self.assertIn('Missing parameters: page', res.body)
+
+    def test_unexpected(self):
+        res = Request.blank('/fixed/1').get_response(self.app)
+        self.assertEqual(res.status_code, 404)
+        res = Request.blank('/show/2', POST={'other': '1'}).get_response(self.app)
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Unexpected body parameters: other', res.body)
+
+
+class ControllerLifecycleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+
+        class Counter(object):
+            made = 0
+
+            def __init__(self):
+                Counter.made += 1
+                self.id = Counter.made
+
+            def index(self):
+                return str(self.id)
+
+            def slow(self):
+                import gevent
+                gevent.sleep(0.01)
+                return str(self.id)
+
+        self.Counter = Counter
+        menu = self.app.route()
+        menu.connect('per_request', '/per_request', controller=Counter, action='index')
+        menu.connect('singleton', '/singleton', controller=Counter, action='index', lifecycle='singleton')
+        menu.connect('pooled', '/pooled', controller=Counter, action='slow', lifecycle='pooled', pool_size=2)
+
+    def test_singleton(self):
+        made = self.Counter.made
+        self.assertEqual(made, 1)
+        bodies = set(Request.blank('/singleton').get_response(self.app).body for _ in range(3))
+        self.assertEqual(bodies, set(['1']))
+        self.assertEqual(self.Counter.made, made)
+
+    def test_per_request(self):
+        for _ in range(3):
+            Request.blank('/per_request').get_response(self.app)
+        self.assertEqual(self.app.controller_stats()['per_request'], {'lifecycle': 'per_request', 'instances': 3})
+
+    def test_pooled(self):
+        import gevent
+        jobs = [gevent.spawn(Request.blank('/pooled').get_response, self.app) for _ in range(5)]
+        gevent.joinall(jobs)
+        self.assertEqual(set(job.value.status_code for job in jobs), set([200]))
+        stats = self.app.controller_stats()['pooled']
+        self.assertEqual(stats['instances'], 2)
+        self.assertEqual(stats['idle'], 2)
+        self.assertEqual(stats['exhausted'], 3)
+
+    def test_unknown_lifecycle(self):
+        self.assertRaises(ValueError, self.app.route().connect, 'bad', '/bad',
+                          controller=self.Counter, action='index', lifecycle='bad')
+        self.assertRaises(ValueError, self.app.route().connect, 'bad', '/bad',
+                          controller=self.Counter(), action='index', lifecycle='pooled')
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App()
+        self.events = []
+        events = self.events
+
+        class Export(object):
+
+            def rows(self):
+                def generate():
+                    for i in range(3):
+                        events.append('chunk')
+                        yield '%s:%d,' % (str(request.path_info), i)
+                return generate()
+
+            def chunks(self):
+                return ['a', 'b']
+
+            def buffer(self):
+                return bytearray('buffer')
+
+            def view(self):
+                return memoryview('view')
+
+        menu = self.app.route()
+        for action in ['rows', 'chunks', 'buffer', 'view']:
+            menu.connect(action, '/' + action, controller=Export(), action=action)
+        self.app.attach('on_end_request', lambda: events.append('end'))
+
+    def test_generator(self):
+        status, headers, app_iter = Request.blank('/rows').call_application(self.app)
+        self.assertEqual(status, '200 OK')
+        self.assertNotIn('Content-Length', dict(headers))
+        self.assertEqual(self.events, [])
+        self.assertEqual(''.join(app_iter), '/rows:0,/rows:1,/rows:2,')
+        app_iter.close()
+        # the context is valid while streaming, the request ends after it
+        self.assertEqual(self.events, ['chunk', 'chunk', 'chunk', 'end'])
+        self.assertRaises(AttributeError, lambda: serving.request)
+
+    def test_iterable(self):
+        res = Request.blank('/chunks').get_response(self.app)
+        self.assertEqual(res.body, 'ab')
+
+    def test_buffers(self):
+        res = Request.blank('/buffer').get_response(self.app)
+        self.assertEqual(res.body, 'buffer')
+        self.assertEqual(res.content_length, 6)
+        res = Request.blank('/view').get_response(self.app)
+        self.assertEqual(res.body, 'view')
+        self.assertEqual(res.content_length, 4)
+        self.assertEqual(self.events, ['end', 'end'])
+
+
 class TestJsonify(unittest.TestCase):
 
     def test_as_json(self):
@@ -97,5 +295,164 @@ class TestJsonify(unittest.TestCase):
         self.assertEqual(response.content_type, 'application/json; charset=UTF-8')
 
 
+class FastPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = App(fast=True)
+        self.seen = seen = {}
+
+        class Hello(object):
+
+            def index(self, name='world', tag=None):
+                seen['types'] = type(serving.request), type(serving.response)
+                return 'hello %s %s' % (name, tag)
+
+            def lazy(self):
+                seen['cookie'] = request.cookies.get('sid')
+                seen['agent'] = request.headers.get('user-agent')
+                seen['types'] = type(serving.request), type(serving.response)
+                return u'lazy'
+
+            def full(self):
+                response.headers['X-Url'] = str(request.url)
+                response.status = 201
+                seen['types'] = type(serving.request), type(serving.response)
+                return 'full'
+
+            @jsonify
+            def json(self):
+                return {'test': 'json'}
+
+            def post(self, title):
+                return title
+
+            def fallback(self):
+                seen['headers'] = sorted(request.headers.items())
+                seen['keys'] = sorted(request.headers)
+                seen['GET'] = request.GET.getone('a'), request.GET.dict_of_lists(), list(request.GET.iteritems())
+                seen['types'] = type(serving.request), type(serving.response)
+                return 'fallback'
+
+            def internal_error(self):
+                raise Exception('internal_error')
+
+        menu = self.app.route()
+        for action in ['index', 'lazy', 'full', 'json', 'post', 'fallback', 'internal_error']:
+            menu.connect(action, '/' + action, controller=Hello(), action=action)
+
+    def test_no_webob_objects(self):
+        from solo.web.fast import FastRequest, FastResponse
+        res = Request.blank('/index?name=solo&tag=a&tag=b').get_response(self.app)
+        self.assertEqual(res.body, "hello solo [u'a', u'b']")
+        self.assertEqual(res.content_type, 'text/html')
+        self.assertEqual(res.content_length, len(res.body))
+        self.assertEqual(self.seen['types'], (FastRequest, FastResponse))
+
+        req = Request.blank('/lazy', headers={'Cookie': 'sid="a%20b"; x=1', 'User-Agent': 'test'})
+        self.assertEqual(req.get_response(self.app).body, 'lazy')
+        self.assertEqual(self.seen['cookie'], 'a b')
+        self.assertEqual(self.seen['agent'], 'test')
+        self.assertEqual(self.seen['types'], (FastRequest, FastResponse))
+
+    def test_fallback(self):
+        from solo.web.fast import FastRequest, FastResponse
+        req = Request.blank('/fallback?a=1&b=2&b=3', headers={'X-Tag': 'solo'})
+        self.assertEqual(req.get_response(self.app).body, 'fallback')
+        self.assertEqual(self.seen['headers'], [('Host', 'localhost:80'), ('X-Tag', 'solo')])
+        self.assertEqual(self.seen['keys'], ['Host', 'X-Tag'])
+        self.assertEqual(self.seen['GET'][:2], (u'1', {u'a': [u'1'], u'b': [u'2', u'3']}))
+        self.assertEqual(sorted(self.seen['GET'][2]), [(u'a', u'1'), (u'b', u'2'), (u'b', u'3')])
+        self.assertEqual(self.seen['types'], (FastRequest, FastResponse))
+
+    def test_params_mutation(self):
+        from solo.web.fast import FastRequest
+        fast = FastRequest(Request.blank('/?a=1&b=2&b=3').environ)
+        full = Request.blank('/?a=1&b=2&b=3')
+        results = []
+        for GET in (fast.GET, full.GET):
+            GET['c'] = 'abc'
+            GET.add('d', 'q')
+            GET.update({'a': '4'})
+            results.append((GET['c'], GET.getall('d'), GET.pop('b'), GET.setdefault('e', 'x'),
+                            type(GET.copy()), sorted(GET.items())))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(fast.GET['a'], '4')
+        self.assertEqual(sorted(fast.upgrade().GET.items()), results[1][-1])
+
+    def test_upgrade(self):
+        res = Request.blank('/full').get_response(self.app)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.body, 'full')
+        self.assertEqual(res.headers['X-Url'], 'http://localhost/full')
+        self.assertEqual(self.seen['types'], (Request, Response))
+
+    def test_json_post_and_errors(self):
+        res = Request.blank('/json').get_response(self.app)
+        self.assertEqual(res.content_type, 'application/json')
+        self.assertEqual(res.body, json_encode({'test': 'json'}))
+        res = Request.blank('/post', POST={'title': 'solo'}).get_response(self.app)
+        self.assertEqual(res.body, 'solo')
+        self.assertEqual(Request.blank('/missing').get_response(self.app).status_code, 404)
+        self.assertEqual(Request.blank('/internal_error').get_response(self.app).status_code, 500)
+        self.assertEqual(Request.blank('/index', method='HEAD').get_response(self.app).body, '')
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        import gevent
+        from solo.web.ctx import remaining
+        self.app = App(deadline=0.05)
+        self.events = events = []
+
+        class Backend(object):
+
+            def slow(self, delay='1'):
+                events.append(remaining())
+                gevent.sleep(float(delay))
+                return 'slow'
+
+            def fast(self):
+                return str(remaining() is None)
+
+            def retry(self):
+                while True:
+                    try:
+                        gevent.sleep(0.1)
+                        return 'retried'
+                    except Exception:
+                        events.append('retry')
+
+        menu = self.app.route()
+        menu.connect('slow', '/slow', controller=Backend(), action='slow')
+        menu.connect('quick', '/quick', controller=Backend(), action='slow', deadline=0.01)
+        menu.connect('fast', '/fast', controller=Backend(), action='fast')
+        menu.connect('retry', '/retry', controller=Backend(), action='retry')
+        self.app.attach('on_end_request', lambda: events.append('end'))
+
+    def test_deadline(self):
+        res = Request.blank('/slow').get_response(self.app)
+        self.assertEqual(res.status_code, 504)
+        self.assertTrue(0 < self.events[0] <= 0.05)
+        self.assertEqual(self.events[1], 'end')
+
+        self.assertEqual(Request.blank('/slow?delay=0').get_response(self.app).body, 'slow')
+        self.assertEqual(Request.blank('/fast').get_response(self.app).body, 'False')
+
+    def test_swallowing_handler(self):
+        res = Request.blank('/retry').get_response(self.app)
+        self.assertEqual(res.status_code, 504)
+        self.assertEqual(self.events, ['end'])
+
+    def test_route_deadline_and_error_page(self):
+        self.app.error_page(504, lambda: 'too slow')
+        res = Request.blank('/quick?delay=0.03').get_response(self.app)
+        self.assertEqual((res.status_code, res.body), (504, 'too slow'))
+        self.assertTrue(self.events[0] <= 0.01)
+
+        self.app.deadline = None
+        self.assertEqual(Request.blank('/fast').get_response(self.app).body, 'True')
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file